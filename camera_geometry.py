@@ -0,0 +1,94 @@
+import math
+
+# --- 1. 配置 (CONFIG) ---
+# ColorCamera 默认 1080P，ISP 输出 1920x1080；预览画面是从 ISP 中心裁出与预览同宽高比的区域再缩放
+ISP_WIDTH = 1920
+ISP_HEIGHT = 1080
+# 读不到标定数据时使用的 ISP 水平视场角 (度)。OAK-D 彩色相机 1080P 约 69 度。
+DEFAULT_ISP_HFOV_DEG = 69.0
+
+
+# --- 2. 像素 -> 角度 (Pixel to Angle) ---
+class PixelAngleMapper:
+    """
+    用相机内参把预览画面上的像素坐标换算成相对光轴的角度 (度)。
+
+    PAN_P_GAIN 这类“度/像素”的手调增益只在画面中心附近近似成立，而且故意取得很小，
+    所以大的偏差要迭代很多次才能收敛。这里按针孔模型 atan((x - cx) / fx) 直接算出角度，
+    偏差大时一步给出绝对的目标角度，剩下的细调仍然交给 P 控制。
+    """
+    def __init__(self, fx, fy, cx, cy):
+        self.fx = fx
+        self.fy = fy
+        self.cx = cx
+        self.cy = cy
+
+    @classmethod
+    def from_intrinsics(cls, matrix, isp_size, preview_size):
+        """
+        matrix: ISP 分辨率下的 3x3 内参矩阵。
+        按预览的方式换算：从 ISP 中心裁出与预览同宽高比的区域，再缩放到预览尺寸。
+        """
+        isp_w, isp_h = isp_size
+        preview_w, preview_h = preview_size
+        scale = max(preview_w / isp_w, preview_h / isp_h)
+        crop_x = (isp_w - preview_w / scale) / 2
+        crop_y = (isp_h - preview_h / scale) / 2
+        return cls(matrix[0][0] * scale, matrix[1][1] * scale,
+                   (matrix[0][2] - crop_x) * scale, (matrix[1][2] - crop_y) * scale)
+
+    @classmethod
+    def from_fov(cls, hfov_deg, isp_size, preview_size):
+        """没有标定数据时，用水平视场角构造一个理想的针孔相机 (主点在中心，方形像素)。"""
+        isp_w, isp_h = isp_size
+        f = isp_w / 2 / math.tan(math.radians(hfov_deg) / 2)
+        return cls.from_intrinsics([[f, 0, isp_w / 2], [0, f, isp_h / 2], [0, 0, 1]], isp_size, preview_size)
+
+    @classmethod
+    def from_device(cls, device, preview_size, isp_size=(ISP_WIDTH, ISP_HEIGHT)):
+        """从设备 EEPROM 读取彩色相机 (CAM_A) 的标定；读不到时退回 DEFAULT_ISP_HFOV_DEG。"""
+        import depthai as dai
+        try:
+            calib = device.readCalibration()
+            # getCameraIntrinsics 会按 ISP 的宽高比处理从标定分辨率到 ISP 的裁剪和缩放
+            matrix = calib.getCameraIntrinsics(dai.CameraBoardSocket.CAM_A, isp_size[0], isp_size[1])
+            mapper = cls.from_intrinsics(matrix, isp_size, preview_size)
+            print(f"相机内参: fx={mapper.fx:.1f} fy={mapper.fy:.1f} cx={mapper.cx:.1f} cy={mapper.cy:.1f} "
+                  f"(预览 {preview_size[0]}x{preview_size[1]})")
+            return mapper
+        except RuntimeError as e:
+            print(f"警告: 读取相机标定失败 ({e})，使用默认视场角 {DEFAULT_ISP_HFOV_DEG} 度。")
+            return cls.from_fov(DEFAULT_ISP_HFOV_DEG, isp_size, preview_size)
+
+    def pixel_to_angle(self, x, y):
+        """预览画面上的像素 (x, y) -> 相对光轴的 (水平角, 垂直角)，单位度。右、下为正。"""
+        return (math.degrees(math.atan((x - self.cx) / self.fx)),
+                math.degrees(math.atan((y - self.cy) / self.fy)))
+
+    def degrees_per_pixel(self):
+        """画面中心附近每个像素对应的角度，可以和 PAN_P_GAIN 对比。"""
+        return math.degrees(1.0 / self.fx), math.degrees(1.0 / self.fy)
+
+
+# --- 3. 主程序：对比 P 控制和一步到位的收敛次数 ---
+if __name__ == "__main__":
+    size = 300
+    mapper = PixelAngleMapper.from_fov(DEFAULT_ISP_HFOV_DEG, (ISP_WIDTH, ISP_HEIGHT), (size, size))
+    deg_x, deg_y = mapper.degrees_per_pixel()
+    hfov = 2 * math.degrees(math.atan(size / 2 / mapper.fx))
+    print(f"{size}x{size} 预览: 水平视场角 {hfov:.1f} 度, 中心处 {deg_x:.3f} 度/像素")
+
+    p_gain = 0.03
+    print("目标在画面中偏离 N 像素时，需要多少次检测才能把误差缩到 5 像素以内:")
+    for offset in (20, 60, 100, 140):
+        # 目标在世界中的方向固定，云台每看一次就按 P 控制转一步 (假设舵机瞬间到位)
+        target_angle = mapper.pixel_to_angle(size / 2 + offset, size / 2)[0]
+        pan = 0.0
+        steps = 0
+        while True:
+            error_px = mapper.fx * math.tan(math.radians(target_angle - pan))
+            if abs(error_px) < 5:
+                break
+            pan += error_px * p_gain
+            steps += 1
+        print(f"  偏离 {offset:3d} px ({target_angle:5.1f} 度): P 控制 {steps:3d} 次, 几何换算 1 次")
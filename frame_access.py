@@ -0,0 +1,68 @@
+import depthai as dai
+
+# --- 1. 配置 (CONFIG) ---
+# 给显示用的画面格式：交错 BGR (HWC)，和 OpenCV 的内存布局完全一样
+DISPLAY_FRAME_TYPE = dai.ImgFrame.Type.BGR888i
+
+
+# --- 2. 设备端格式转换 (On-device Conversion) ---
+def interleaved_output(pipeline, source, width, height):
+    """
+    在设备上用 ImageManip 把平面 BGR (NN 需要的格式) 转成交错 BGR，返回转换后的输出。
+
+    NN 仍然直接接相机/Script 的平面输出；只有发给主机显示的那一路多经过这个节点，
+    主机收到的数据就可以不经转换直接当作 OpenCV 图像使用。
+    """
+    manip = pipeline.create(dai.node.ImageManip)
+    manip.initialConfig.setFrameType(DISPLAY_FRAME_TYPE)
+    manip.setMaxOutputFrameSize(width * height * 3)
+    # 显示跟不上时丢旧帧，不要反过来阻塞上游
+    manip.inputImage.setBlocking(False)
+    manip.inputImage.setQueueSize(1)
+    source.link(manip.inputImage)
+    return manip.out
+
+
+# --- 3. 主机端零拷贝访问 (Zero-copy Access) ---
+def frame_view(in_frame):
+    """
+    把 ImgFrame 当作 (高, 宽, 3) 的 NumPy 数组使用。
+
+    交错 BGR 时直接对 getData() 做 reshape：getData() 返回的数组引用的就是消息里的缓冲区，
+    并且持有这个 ImgFrame 的引用，不复制也不会提前释放。可以直接在上面画框。
+    其它格式 (例如平面 BGR) 退回 getCvFrame()，它每帧都要重新排列并复制一次。
+    """
+    if in_frame.getType() == DISPLAY_FRAME_TYPE:
+        return in_frame.getData().reshape(in_frame.getHeight(), in_frame.getWidth(), 3)
+    return in_frame.getCvFrame()
+
+
+# --- 4. 主程序：每帧访问开销的基准测试 ---
+if __name__ == "__main__":
+    import time
+    import numpy as np
+
+    def make_frame(width, height, frame_type):
+        frame = dai.ImgFrame()
+        frame.setWidth(width)
+        frame.setHeight(height)
+        frame.setType(frame_type)
+        frame.setData(np.random.randint(0, 255, width * height * 3, dtype=np.uint8))
+        return frame
+
+    def measure(fn, frame, n=2000):
+        fn(frame)
+        start = time.perf_counter()
+        for _ in range(n):
+            fn(frame)
+        return (time.perf_counter() - start) / n * 1e6
+
+    print("每帧取得可显示图像的开销 (微秒)")
+    for width, height in ((300, 300), (640, 480)):
+        planar = make_frame(width, height, dai.ImgFrame.Type.BGR888p)
+        interleaved = make_frame(width, height, DISPLAY_FRAME_TYPE)
+        view = frame_view(interleaved)
+        assert np.shares_memory(view, interleaved.getData()), "frame_view 应该不复制数据"
+        print(f"  {width}x{height}: 平面 getCvFrame() {measure(lambda f: f.getCvFrame(), planar):7.1f} us, "
+              f"交错 getCvFrame() {measure(lambda f: f.getCvFrame(), interleaved):7.1f} us, "
+              f"交错 frame_view() {measure(frame_view, interleaved):5.1f} us")
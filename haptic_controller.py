@@ -1,10 +1,17 @@
 import RPi.GPIO as GPIO
+import argparse
 import time
-from board import SCL, SDA
-import busio
-from adafruit_pca9685 import PCA9685
+from pca_arbiter import PcaConflictError, get_arbiter
+from pca_burst import duty_to_regs
 
 # --- 1. 配置 (CONFIG) ---
+# 【新增】马达用的 PCA9685 地址和 PWM 频率。1000Hz 对马达来说是个不错的值，但舵机必须是 50Hz，
+# 一块芯片只有一个预分频器。现在的接线只有一块芯片 (0x40)，所以震动马达的脚本不能和舵机的程序同时运行：
+# 这时 pca_arbiter 会抛出 PcaConflictError。要同时使用，把马达接到第二块 PCA9685 (例如焊上 A0，地址 0x41)，
+# 运行时加上 --address 0x41
+HAPTIC_PCA9685_ADDRESS = 0x40
+HAPTIC_PWM_FREQUENCY_HZ = 1000
+
 # 定义每个马达对应的控制引脚
 # 这个配置完全匹配您描述的接线
 MOTOR_PINS = {
@@ -16,23 +23,35 @@ MOTOR_PINS = {
     # 2: {'in1': 26, 'in2': 21, 'pwm_channel': 4}, 
 }
 
+def parse_haptic_args(description):
+    """震动马达脚本共用的命令行参数：--address 选择马达所在的 PCA9685。"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--address", type=lambda text: int(text, 0), default=HAPTIC_PCA9685_ADDRESS,
+                        help=f"马达所在 PCA9685 的 I2C 地址 (默认 0x{HAPTIC_PCA9685_ADDRESS:02x})；"
+                             "和舵机的程序同时运行时要接到另一块芯片，例如 0x41")
+    return parser.parse_args()
+
 class HapticController:
     """
     一个用于控制L298N和PCA9685驱动的震动马达的类。
     """
-    def __init__(self, motor_config):
+    def __init__(self, motor_config, address=HAPTIC_PCA9685_ADDRESS):
         self.config = motor_config
         self.motor_ids = list(self.config.keys())
         
         # 初始化 I2C 和 PCA9685
         try:
-            self.i2c = busio.I2C(SCL, SDA)
-            self.pca = PCA9685(self.i2c)
-            self.pca.frequency = 1000  # PWM频率，1000Hz对马达来说是个不错的值
+            # 【修改】不再自己新建 busio.I2C 和 PCA9685：从 pca_arbiter 租用马达的 PWM 通道。
+            # 同一块芯片已经被舵机设为 50Hz 时会抛出 PcaConflictError，而不是悄悄改掉舵机的频率
+            channels = [pins['pwm_channel'] for pins in self.config.values()]
+            self.lease = get_arbiter().lease("震动马达", channels, HAPTIC_PWM_FREQUENCY_HZ, address)
             print("PCA9685 初始化成功。")
         except ValueError:
             print("错误: 无法找到I2C设备。请运行 'sudo i2cdetect -y 1' 检查硬件连接。")
             exit()
+        except PcaConflictError as e:
+            print(f"错误: {e}")
+            exit()
             
         # 初始化 GPIO
         GPIO.setmode(GPIO.BCM)
@@ -53,45 +72,61 @@ class HapticController:
         :param motor_id: 马达编号 (例如 0, 1)
         :param intensity: 强度值，从 0.0 (停止) 到 1.0 (最强)
         """
-        if motor_id not in self.motor_ids:
-            print(f"错误: 马达 {motor_id} 不存在。")
-            return
-            
-        if not 0.0 <= intensity <= 1.0:
-            print("错误: 强度值必须在 0.0 和 1.0 之间。")
-            return
+        self.set_vibrations({motor_id: intensity})
 
-        pins = self.config[motor_id]
-        
-        # 只有当强度大于一个很小的值时才启动马达
-        if intensity > 0.01:
-            # 设置 L298N 为正转 (IN1=HIGH, IN2=LOW) 来启动马达
-            # 如果您的马达不转，可以尝试将这里设为 (IN1=LOW, IN2=HIGH)
-            GPIO.output(pins['in1'], GPIO.HIGH)
-            GPIO.output(pins['in2'], GPIO.LOW)
-            
-            # PCA9685 使用 16 位精度 (0-65535) 来控制PWM占空比
-            # 我们将 0.0-1.0 的强度值映射到这个范围
-            duty_cycle = int(intensity * 65535)
-            self.pca.channels[pins['pwm_channel']].duty_cycle = duty_cycle
-        else:
-            # 如果强度为0，则停止马达
-            GPIO.output(pins['in1'], GPIO.LOW)
-            GPIO.output(pins['in2'], GPIO.LOW)
-            self.pca.channels[pins['pwm_channel']].duty_cycle = 0
+    def set_vibrations(self, intensities):
+        """
+        【新增】同时设置几个马达的震动强度。
+
+        :param intensities: {马达编号: 强度值}
+        所有马达的 PWM 占空比一起写入：PWM 通道相邻时 (默认 2 和 3) 只用一次 I2C 传输，
+        几个马达同时开始、同时停止。
+        """
+        regs = {}
+        for motor_id, intensity in intensities.items():
+            if motor_id not in self.motor_ids:
+                print(f"错误: 马达 {motor_id} 不存在。")
+                continue
+
+            if not 0.0 <= intensity <= 1.0:
+                print("错误: 强度值必须在 0.0 和 1.0 之间。")
+                continue
+
+            pins = self.config[motor_id]
+
+            # 只有当强度大于一个很小的值时才启动马达
+            if intensity > 0.01:
+                # 设置 L298N 为正转 (IN1=HIGH, IN2=LOW) 来启动马达
+                # 如果您的马达不转，可以尝试将这里设为 (IN1=LOW, IN2=HIGH)
+                GPIO.output(pins['in1'], GPIO.HIGH)
+                GPIO.output(pins['in2'], GPIO.LOW)
+
+                # PCA9685 使用 16 位精度 (0-65535) 来控制PWM占空比
+                # 我们将 0.0-1.0 的强度值映射到这个范围
+                duty_cycle = int(intensity * 65535)
+            else:
+                # 如果强度为0，则停止马达
+                GPIO.output(pins['in1'], GPIO.LOW)
+                GPIO.output(pins['in2'], GPIO.LOW)
+                duty_cycle = 0
+            regs[pins['pwm_channel']] = duty_to_regs(duty_cycle)
+
+        if regs:
+            self.lease.write(regs)
 
     def cleanup(self):
         """在程序结束时调用，用于安全地停止所有马达并清理GPIO资源。"""
         print("\n正在停止所有马达并清理资源...")
-        for motor_id in self.motor_ids:
-            self.set_vibration(motor_id, 0)
+        self.set_vibrations({motor_id: 0 for motor_id in self.motor_ids})
+        self.lease.release()
         GPIO.cleanup()
         print("清理完成。")
 
 # --- 3. 主程序：演示如何使用控制器 ---
 if __name__ == "__main__":
+    args = parse_haptic_args("震动马达控制器演示")
     # 创建 HapticController 的实例
-    haptics = HapticController(MOTOR_PINS)
+    haptics = HapticController(MOTOR_PINS, args.address)
     
     try:
         print("\n--- 测试开始 ---")
@@ -109,11 +144,9 @@ if __name__ == "__main__":
         print("测试3: 两个马达同时进行脉冲震动...")
         for i in range(5):
             print(f"  脉冲第 {i+1} 次")
-            haptics.set_vibration(0, 1.0)
-            haptics.set_vibration(1, 1.0)
+            haptics.set_vibrations({0: 1.0, 1: 1.0})
             time.sleep(0.2)
-            haptics.set_vibration(0, 0)
-            haptics.set_vibration(1, 0)
+            haptics.set_vibrations({0: 0, 1: 0})
             time.sleep(0.2)
             
         print("测试4: 马达 0 强度从 0 到 100% (呼吸灯效果)...")
@@ -1,67 +1,13 @@
-import RPi.GPIO as GPIO
 import time
-from board import SCL, SDA
-import busio
-from adafruit_pca9685 import PCA9685
 import readchar
+# 【修改】HapticController 和 MOTOR_PINS 统一用 haptic_controller.py 里的版本：
+# 通过 pca_arbiter 租用马达通道，不再各自新建 busio.I2C、改写 PCA9685 的频率
+from haptic_controller import HapticController, MOTOR_PINS, parse_haptic_args
 
-# --- 1. 配置 (CONFIG) ---
-# (这里的配置和您之前的 haptic_controller.py 保持一致)
-MOTOR_PINS = {
-    0: {'in1': 5,  'in2': 6,  'pwm_channel': 2},
-    1: {'in1': 13, 'in2': 19, 'pwm_channel': 3},
-}
-
-# --- 2. HapticController 类 ---
-# (这个类和您之前的 haptic_controller.py 完全一样)
-class HapticController:
-    def __init__(self, motor_config):
-        self.config = motor_config
-        self.motor_ids = list(self.config.keys())
-        try:
-            self.i2c = busio.I2C(SCL, SDA)
-            self.pca = PCA9685(self.i2c)
-            self.pca.frequency = 1000
-            print("PCA9685 初始化成功。")
-        except ValueError:
-            print("错误: 无法找到I2C设备。请运行 'sudo i2cdetect -y 1' 检查硬件连接。")
-            exit()
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
-        for motor_id in self.motor_ids:
-            pins = self.config[motor_id]
-            GPIO.setup(pins['in1'], GPIO.OUT)
-            GPIO.setup(pins['in2'], GPIO.OUT)
-            GPIO.output(pins['in1'], GPIO.LOW)
-            GPIO.output(pins['in2'], GPIO.LOW)
-        print("GPIO 初始化成功。")
-
-    def set_vibration(self, motor_id, intensity):
-        if motor_id not in self.motor_ids:
-            print(f"错误: 马达 {motor_id} 不存在。")
-            return
-        intensity = max(0.0, min(1.0, intensity)) # 确保强度值在0-1之间
-        pins = self.config[motor_id]
-        if intensity > 0.01:
-            GPIO.output(pins['in1'], GPIO.HIGH)
-            GPIO.output(pins['in2'], GPIO.LOW)
-            duty_cycle = int(intensity * 65535)
-            self.pca.channels[pins['pwm_channel']].duty_cycle = duty_cycle
-        else:
-            GPIO.output(pins['in1'], GPIO.LOW)
-            GPIO.output(pins['in2'], GPIO.LOW)
-            self.pca.channels[pins['pwm_channel']].duty_cycle = 0
-
-    def cleanup(self):
-        print("\n正在停止所有马达并清理资源...")
-        for motor_id in self.motor_ids:
-            self.set_vibration(motor_id, 0)
-        GPIO.cleanup()
-        print("清理完成。")
-
-# --- 3. 主程序：实时震动强度调谐器 ---
+# --- 主程序：实时震动强度调谐器 ---
 if __name__ == "__main__":
-    haptics = HapticController(MOTOR_PINS)
+    args = parse_haptic_args("实时震动强度调谐器")
+    haptics = HapticController(MOTOR_PINS, args.address)
     
     # 初始化控制变量
     current_motor_id = 0
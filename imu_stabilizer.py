@@ -0,0 +1,213 @@
+import math
+import threading
+
+# --- 1. 配置 (CONFIG) ---
+# 陀螺仪采样率 (Hz)。BMI270 支持 25/33/50/100/200/400，BNO085 最高 400 (RAW)。
+IMU_RATE_HZ = 400
+# 每批最少几个采样就发给主机，批越小延迟越低
+IMU_BATCH_REPORT_THRESHOLD = 1
+IMU_MAX_BATCH_REPORTS = 10
+# 陀螺仪的哪一个轴对应云台的 pan / tilt 转动，以及符号。
+# 符号要让“舵机角度增大”对应正的角速度。装好后手动转动云台头部、
+# 用 --imu-log 记录一段数据看看哪个轴在动，再修改这里。
+GYRO_PAN_AXIS = 1
+GYRO_PAN_SIGN = 1.0
+GYRO_TILT_AXIS = 0
+GYRO_TILT_SIGN = 1.0
+# 开始时静止采集多少个样本来估计陀螺仪零偏 (400 Hz 下 0.5 秒)
+BIAS_SAMPLES = 200
+# 角速度低通滤波的时间常数 (秒)。太大会让前馈滞后，太小会把噪声送给舵机。
+GYRO_FILTER_TAU_S = 0.004
+# 舵机从收到指令到开始转有延迟，前馈按角加速度把基座角速度往前外推这么久 (秒)。
+# 约等于舵机响应延迟 (servo_model.SERVO_COMMAND_LATENCY_S)；用回放测试调出来的值。
+FEEDFORWARD_LEAD_S = 0.01
+# 扣除舵机自身转动后，基座角速度小于这个值 (度/秒) 时不做前馈，避免零偏残差让云台慢慢漂移
+BASE_RATE_DEADBAND_DEG_S = 2.0
+# 前馈增益：1.0 表示完全抵消估计出的基座转动
+FEEDFORWARD_GAIN = 1.0
+
+
+# --- 2. IMU 前馈稳定 (IMU Feedforward Stabilizer) ---
+class ImuStabilizer:
+    """
+    用相机里的陀螺仪估计“基座”的转动，在两次检测之间用前馈抵消。
+
+    相机装在云台上，陀螺仪测到的是 基座转动 + 舵机转动。舵机转动由 GimbalModel
+    根据指令历史估计出来，相减后剩下的就是振动、手持晃动等外部运动。
+    控制线程每个周期调用 feedforward(dt)，把 -基座角速度 * dt 加到舵机角度上。
+
+    on_imu() 在 depthai 的回调线程里执行，feedforward() 在控制线程里执行，所以加锁。
+    """
+    def __init__(self, gimbal, log_path=None):
+        self.gimbal = gimbal
+        self.lock = threading.Lock()
+        self.bias = [0.0, 0.0]
+        self.bias_sum = [0.0, 0.0]
+        self.bias_count = 0
+        self.base_rate = [0.0, 0.0]
+        self.base_accel = [0.0, 0.0]
+        self.last_time = None
+        self.log = open(log_path, "w") if log_path else None
+        if self.log:
+            self.log.write("t,gx,gy,gz\n")
+        # 统计
+        self.samples = 0
+        self.max_base_rate = 0.0
+
+    @property
+    def calibrated(self):
+        return self.bias_count >= BIAS_SAMPLES
+
+    def on_imu(self, msg):
+        """ "imu" 流的回调：一条 IMUData 里可能有好几个采样。"""
+        for packet in msg.packets:
+            gyro = packet.gyroscope
+            self.add_gyro(gyro.getTimestamp().total_seconds(), gyro.x, gyro.y, gyro.z)
+
+    def add_gyro(self, t, gx, gy, gz):
+        """加入一个陀螺仪采样。t 与检测结果同一个时钟 (秒)，角速度单位 rad/s。"""
+        if self.log:
+            self.log.write(f"{t:.6f},{gx:.6f},{gy:.6f},{gz:.6f}\n")
+        gyro = (gx, gy, gz)
+        head_rate = (math.degrees(gyro[GYRO_PAN_AXIS]) * GYRO_PAN_SIGN,
+                     math.degrees(gyro[GYRO_TILT_AXIS]) * GYRO_TILT_SIGN)
+
+        with self.lock:
+            self.samples += 1
+            if not self.calibrated:
+                # 启动时云台静止，这段时间的平均值就是零偏
+                self.bias_sum[0] += head_rate[0]
+                self.bias_sum[1] += head_rate[1]
+                self.bias_count += 1
+                if self.calibrated:
+                    self.bias = [s / self.bias_count for s in self.bias_sum]
+                self.last_time = t
+                return
+
+            dt = t - self.last_time if self.last_time is not None else 0.0
+            self.last_time = t
+            if dt <= 0:
+                return
+            # 舵机自己在这个采样间隔内的平均转速 (度/秒)。差分窗口必须和陀螺仪的采样间隔一致，
+            # 否则前馈引起的舵机转动扣不干净，会通过陀螺仪形成正反馈。
+            now_pan, now_tilt = self.gimbal.angles_at(t)
+            before_pan, before_tilt = self.gimbal.angles_at(t - dt)
+            command_rate = ((now_pan - before_pan) / dt, (now_tilt - before_tilt) / dt)
+            alpha = 1.0 - math.exp(-dt / GYRO_FILTER_TAU_S)
+            for i in range(2):
+                base = head_rate[i] - self.bias[i] - command_rate[i]
+                previous = self.base_rate[i]
+                self.base_rate[i] += (base - self.base_rate[i]) * alpha
+                accel = (self.base_rate[i] - previous) / dt
+                self.base_accel[i] += (accel - self.base_accel[i]) * alpha
+                self.max_base_rate = max(self.max_base_rate, abs(self.base_rate[i]))
+
+    def feedforward(self, dt):
+        """返回这个控制周期要加到 (pan, tilt) 上的角度 (度)。"""
+        with self.lock:
+            rates = [rate + accel * FEEDFORWARD_LEAD_S for rate, accel in zip(self.base_rate, self.base_accel)]
+        return tuple(0.0 if abs(rate) < BASE_RATE_DEADBAND_DEG_S else -rate * FEEDFORWARD_GAIN * dt
+                     for rate in rates)
+
+    def close(self):
+        if self.log:
+            self.log.close()
+            self.log = None
+
+    def stats(self):
+        state = "零偏 (%.2f, %.2f) 度/秒" % tuple(self.bias) if self.calibrated else "零偏未标定"
+        return f"陀螺仪采样 {self.samples} 个, {state}, 最大基座角速度 {self.max_base_rate:.1f} 度/秒"
+
+
+# --- 3. 主程序：用合成数据或记录的 CSV 回放，不需要硬件 ---
+if __name__ == "__main__":
+    import argparse
+    import csv
+    from servo_model import GimbalModel
+
+    parser = argparse.ArgumentParser(description="IMU 前馈稳定的离线回放测试")
+    parser.add_argument("--csv", help="用 --imu-log 记录的陀螺仪数据 (t,gx,gy,gz, rad/s)，"
+                                      "当作基座运动回放；不给则使用合成的振动")
+    args = parser.parse_args()
+
+    control_rate = 100.0
+    if args.csv:
+        with open(args.csv) as f:
+            rows = [(float(r["t"]), float(r["gx"]), float(r["gy"]), float(r["gz"])) for r in csv.DictReader(f)]
+        t0 = rows[0][0]
+        rows = [(t - t0, gx, gy, gz) for t, gx, gy, gz in rows]
+        # 从角速度积分出基座角度 (按 pan / tilt 映射)
+        base = []
+        pan = tilt = 0.0
+        for i, (t, *gyro) in enumerate(rows):
+            dt = t - rows[i - 1][0] if i > 0 else 0.0
+            pan += math.degrees(gyro[GYRO_PAN_AXIS]) * GYRO_PAN_SIGN * dt
+            tilt += math.degrees(gyro[GYRO_TILT_AXIS]) * GYRO_TILT_SIGN * dt
+            base.append((t, pan, tilt))
+        duration = rows[-1][0]
+
+        def base_angles(t):
+            # 取不晚于 t 的最后一个采样
+            lo, hi = 0, len(base) - 1
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if base[mid][0] <= t:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            return base[lo][1], base[lo][2]
+        print(f"回放 {args.csv}: {len(rows)} 个采样, {duration:.1f} 秒")
+    else:
+        duration = 5.0
+
+        def base_angles(t):
+            # 静止 1 秒 (标定零偏)，之后 pan 3 Hz / 2 度、tilt 5 Hz / 1 度 的振动，再加一段缓慢的转动
+            if t < 1.0:
+                return 0.0, 0.0
+            s = t - 1.0
+            return (2.0 * math.sin(2 * math.pi * 3 * s) + 5.0 * min(s, 2.0),
+                    1.0 * math.sin(2 * math.pi * 5 * s))
+        print("合成数据: pan 3 Hz / 2 度振动 + 5 度/秒转动, tilt 5 Hz / 1 度振动")
+
+    def simulate(use_imu):
+        plant = GimbalModel(90.0, 54.0)   # “真实”的舵机
+        model = GimbalModel(90.0, 54.0)   # 控制线程记录的指令历史
+        stabilizer = ImuStabilizer(model)
+        command = [90.0, 54.0]
+        errors = []
+        dt_imu = 1.0 / IMU_RATE_HZ
+        next_control = 0.0
+        t = 0.0
+        previous = None
+        while t < duration:
+            # 陀螺仪测到的是基座 + 舵机的转动；按设定的轴和符号反推出原始三轴数据
+            base_pan, base_tilt = base_angles(t)
+            servo_pan, servo_tilt = plant.angles_at(t)
+            head = (base_pan + servo_pan, base_tilt + servo_tilt)
+            if previous is not None:
+                gyro = [0.0, 0.0, 0.0]
+                gyro[GYRO_PAN_AXIS] = math.radians((head[0] - previous[0]) / dt_imu) * GYRO_PAN_SIGN
+                gyro[GYRO_TILT_AXIS] = math.radians((head[1] - previous[1]) / dt_imu) * GYRO_TILT_SIGN
+                stabilizer.add_gyro(t, *gyro)
+            previous = head
+
+            if t >= next_control:
+                if use_imu:
+                    d_pan, d_tilt = stabilizer.feedforward(1.0 / control_rate)
+                    command[0] += d_pan
+                    command[1] += d_tilt
+                plant.command(t, command[0], command[1])
+                model.command(t, command[0], command[1])
+                next_control += 1.0 / control_rate
+            if t > 1.0:
+                # 相机在世界坐标中的指向偏离了多少
+                errors.append((head[0] - 90.0, head[1] - 54.0))
+            t += dt_imu
+        rms = [math.sqrt(sum(e[i] ** 2 for e in errors) / len(errors)) for i in range(2)]
+        return rms, stabilizer
+
+    for use_imu in (False, True):
+        rms, stabilizer = simulate(use_imu)
+        label = "有前馈" if use_imu else "无前馈"
+        print(f"  {label}: 相机指向偏差 RMS pan {rms[0]:.3f} 度, tilt {rms[1]:.3f} 度")
+    print(f"  {stabilizer.stats()}")
@@ -7,7 +7,10 @@ import os
 VENV_PYTHON = os.path.join(os.environ.get("VIRTUAL_ENV", "."), "bin", "python3")
 
 # 定义两个“士兵”脚本的路径
-VIDEO_SCRIPT = os.path.expanduser("~/oakd_final_project/depthai-python/examples/ColorCamera/rgb_preview.py")
+# 【修改】视频改用设备端 MJPEG 编码的视频流：USB 上只传压缩数据，
+# 本地窗口之外还可以用浏览器打开 http://<树莓派IP>:8080/ 同时观看
+VIDEO_SCRIPT = os.path.expanduser("~/oakd_final_project/mjpeg_stream.py")
+VIDEO_ARGS = "--show"
 CONTROL_SCRIPT = os.path.expanduser("~/oakd_final_project/wasd_controller.py")
 # ----------------
 
@@ -24,7 +27,7 @@ if not os.path.exists(CONTROL_SCRIPT):
 
 # 定义启动命令
 # 'gnome-terminal' 是树莓派桌面默认的终端程序
-launch_video_cmd = ['lxterminal', '-e', f'bash -c "{VENV_PYTHON} {VIDEO_SCRIPT}; exec bash"']
+launch_video_cmd = ['lxterminal', '-e', f'bash -c "{VENV_PYTHON} {VIDEO_SCRIPT} {VIDEO_ARGS}; exec bash"']
 launch_control_cmd = ['lxterminal', '-e', f'bash -c "{VENV_PYTHON} {CONTROL_SCRIPT}; exec bash"']
 video_process = None
 control_process = None
@@ -39,6 +42,7 @@ try:
 
     print("\n控制系统已启动！")
     print("您现在应该能看到一个视频窗口和另一个控制器终端。")
+    print("其他设备可以用浏览器打开 http://<树莓派IP>:8080/ 观看同一路视频。")
     print("请在'WASD控制器'终端中按键来控制云台。")
     print("要关闭所有程序，请关闭本'总指挥'终端窗口，或按 Ctrl+C。")
 
@@ -0,0 +1,56 @@
+# --- 1. 配置 (CONFIG) ---
+# 每个流最多缓存多少条等待配对的消息。NN 推理通常比画面晚几帧到达，8 条足够。
+MAX_BUFFERED_MESSAGES = 8
+
+
+# --- 2. 按序列号同步 (Sequence-number Sync) ---
+class SequenceSync:
+    """
+    按 getSequenceNum() 把来自不同流的消息配成一组。
+
+    同一帧画面在设备上产生的 ImgFrame 和 ImgDetections 序列号相同。
+    add() 收到某个序列号在所有流上都到齐时，返回按 streams 顺序排列的消息元组；
+    比它更早、永远配不上的消息 (孤儿) 会被丢掉。这里只保存消息对象的引用，不复制图像数据。
+
+    统计:
+      matched  - 成功配对的组数
+      dropped  - 因为配不上或缓存满而丢掉的消息数
+      late     - 到达时它的序列号已经被跳过的消息数 (也会被丢掉)
+    """
+    def __init__(self, streams, max_buffered=MAX_BUFFERED_MESSAGES):
+        self.streams = tuple(streams)
+        self.max_buffered = max_buffered
+        self.buffers = {name: {} for name in self.streams}
+        self.last_matched_seq = -1
+        self.matched = 0
+        self.dropped = 0
+        self.late = 0
+
+    def add(self, name, msg):
+        seq = msg.getSequenceNum()
+        if seq <= self.last_matched_seq:
+            self.late += 1
+            return None
+
+        buffer = self.buffers[name]
+        buffer[seq] = msg
+        if len(buffer) > self.max_buffered:
+            del buffer[min(buffer)]
+            self.dropped += 1
+
+        if not all(seq in self.buffers[other] for other in self.streams):
+            return None
+
+        group = tuple(self.buffers[other].pop(seq) for other in self.streams)
+        self.matched += 1
+        self.last_matched_seq = seq
+        # 比这一组更早的消息再也不可能配上了
+        for other in self.streams:
+            stale = [s for s in self.buffers[other] if s < seq]
+            for s in stale:
+                del self.buffers[other][s]
+            self.dropped += len(stale)
+        return group
+
+    def stats(self):
+        return f"配对 {self.matched}, 丢弃 {self.dropped}, 迟到 {self.late}"
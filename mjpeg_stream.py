@@ -0,0 +1,179 @@
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import depthai as dai
+import numpy as np
+
+# --- 1. 配置 (CONFIG) ---
+# ISP 1920x1080 缩小到 1/3 = 640x360，保留完整视场。VideoEncoder 需要 NV12 输入，用 video 输出。
+ISP_SCALE = (1, 3)
+STREAM_FPS = 30
+# MJPEG 质量 (0-100)。80 时 640x360 每帧大约 20-40 KB，原始 BGR 是 691 KB。
+JPEG_QUALITY = 80
+# HTTP 服务端口：浏览器打开 http://<树莓派IP>:8080/ 即可观看，可以同时开多个
+STREAM_PORT = 8080
+# 每隔多少秒打印一次码率
+REPORT_INTERVAL_S = 10.0
+
+
+# --- 2. 管道设置 (Pipeline Setup) ---
+def create_pipeline():
+    """
+    画面在设备上编码成 MJPEG，USB 上只传压缩后的数据。
+    选 MJPEG 而不是 H.264：每一帧都能单独解码，新加入的观看者不用等关键帧，浏览器也能直接显示。
+    """
+    pipeline = dai.Pipeline()
+
+    cam_rgb = pipeline.create(dai.node.ColorCamera)
+    cam_rgb.setResolution(dai.ColorCameraProperties.SensorResolution.THE_1080_P)
+    cam_rgb.setIspScale(*ISP_SCALE)
+    cam_rgb.setFps(STREAM_FPS)
+
+    encoder = pipeline.create(dai.node.VideoEncoder)
+    encoder.setDefaultProfilePreset(STREAM_FPS, dai.VideoEncoderProperties.Profile.MJPEG)
+    encoder.setQuality(JPEG_QUALITY)
+    cam_rgb.video.link(encoder.input)
+
+    xout_mjpeg = pipeline.create(dai.node.XLinkOut)
+    xout_mjpeg.setStreamName("mjpeg")
+    encoder.bitstream.link(xout_mjpeg.input)
+    return pipeline
+
+
+# --- 3. 多个观看者共享的最新一帧 (Shared Latest Frame) ---
+class LatestFrame:
+    """
+    保存最新的一帧 JPEG。设备线程每收到一帧就 publish()，
+    每个观看者在自己的线程里 wait() 下一帧；慢的观看者只会跳帧，不会拖慢别人。
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.jpeg = None
+        self.seq = 0
+
+    def publish(self, jpeg):
+        with self.condition:
+            self.jpeg = jpeg
+            self.seq += 1
+            self.condition.notify_all()
+
+    def wait(self, last_seq, timeout=1.0):
+        """等到比 last_seq 新的一帧，返回 (seq, jpeg)；超时返回 (last_seq, None)。"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.seq != last_seq, timeout):
+                return last_seq, None
+            return self.seq, self.jpeg
+
+
+latest = LatestFrame()
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    """/ 或 /stream 是 multipart MJPEG 流，/snapshot.jpg 是最新的一张图。直接转发设备编码好的数据。"""
+    def do_GET(self):
+        if self.path == "/snapshot.jpg":
+            _, jpeg = latest.wait(-1)
+            if jpeg is None:
+                self.send_error(503, "还没有画面")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(jpeg)))
+            self.end_headers()
+            self.wfile.write(jpeg)
+            return
+        if self.path not in ("/", "/stream"):
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        seq = 0
+        try:
+            while True:
+                seq, jpeg = latest.wait(seq)
+                if jpeg is None:
+                    continue
+                self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n")
+                self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # 观看者关掉了页面
+            pass
+
+    def log_message(self, format, *args):
+        # 不为每个请求打印一行日志
+        pass
+
+
+# --- 4. 本地解码 (Local Decode) ---
+def create_decoder():
+    """
+    只有本地要开窗口显示时才需要解码。优先用 venv 里的 PyTurboJPEG (libjpeg-turbo)，
+    直接解码成 BGR；没有安装 libturbojpeg 时退回 OpenCV。
+    """
+    try:
+        from turbojpeg import TurboJPEG
+        jpeg = TurboJPEG()
+        print("本地显示使用 TurboJPEG 解码。")
+        return jpeg.decode
+    except (ImportError, OSError, RuntimeError) as e:
+        print(f"警告: TurboJPEG 不可用 ({e})，使用 OpenCV 解码。")
+        return lambda data: cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+# --- 5. 主程序 (Main Program) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OAK-D MJPEG 视频流 (设备端编码，多个观看者共享)")
+    parser.add_argument("--show", action="store_true", help="同时在本地开窗口显示 (只有这时主机才解码)")
+    parser.add_argument("--port", type=int, default=STREAM_PORT, help=f"HTTP 端口，默认 {STREAM_PORT}")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("", args.port), StreamHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"视频流已启动: http://<本机IP>:{args.port}/  (快照: /snapshot.jpg)")
+
+    decode = create_decoder() if args.show else None
+    width = 1920 * ISP_SCALE[0] // ISP_SCALE[1]
+    height = 1080 * ISP_SCALE[0] // ISP_SCALE[1]
+    raw_bytes_per_frame = width * height * 3
+
+    with dai.Device(create_pipeline()) as device:
+        q_mjpeg = device.getOutputQueue(name="mjpeg", maxSize=4, blocking=False)
+        encoded_bytes = 0
+        frames = 0
+        last_report = time.perf_counter()
+        try:
+            while True:
+                packet = q_mjpeg.get()
+                # getData() 是零拷贝的视图，转成 bytes 后才能安全地交给其他线程
+                jpeg = packet.getData().tobytes()
+                latest.publish(jpeg)
+                encoded_bytes += len(jpeg)
+                frames += 1
+
+                if decode is not None:
+                    cv2.imshow("OAK-D MJPEG", decode(jpeg))
+                    if cv2.waitKey(1) == ord('q'):
+                        break
+
+                now = time.perf_counter()
+                if now - last_report > REPORT_INTERVAL_S:
+                    wall = now - last_report
+                    print(f"[视频流] {frames / wall:.1f} fps, USB 码率 {encoded_bytes / wall / 1e6:.2f} MB/s "
+                          f"(原始 BGR 约 {raw_bytes_per_frame * frames / wall / 1e6:.1f} MB/s)")
+                    encoded_bytes = frames = 0
+                    last_report = now
+        except KeyboardInterrupt:
+            print("\n检测到手动中断。")
+
+    server.shutdown()
+    if decode is not None:
+        cv2.destroyAllWindows()
+    print("程序已退出。")
@@ -0,0 +1,141 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# --- 1. 配置 (CONFIG) ---
+# 代价 = (1 - IoU) + CENTROID_WEIGHT * 中心点距离 (归一化坐标)。
+# 快速移动的小脸 IoU 可能为 0，中心点距离让它们仍然能被关联上。
+CENTROID_WEIGHT = 1.0
+# 代价超过这个值的配对不接受，检测结果会成为一个新目标
+MAX_ASSOCIATION_COST = 1.2
+# 一个目标连续多少帧没有匹配到检测结果后被删除
+MAX_MISSED_FRAMES = 10
+
+
+# --- 2. 向量化的代价矩阵 (Vectorized Cost Matrix) ---
+def iou_matrix(a, b):
+    """a: (N, 4), b: (M, 4)，格式 [xmin, ymin, xmax, ymax]。返回 (N, M) 的 IoU。"""
+    ix_min = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy_min = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix_max = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy_max = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix_max - ix_min, 0, None) * np.clip(iy_max - iy_min, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+def cost_matrix(tracks, detections):
+    """IoU 和中心点距离组合成的关联代价，形状 (目标数, 检测数)。"""
+    track_centers = (tracks[:, :2] + tracks[:, 2:]) / 2
+    det_centers = (detections[:, :2] + detections[:, 2:]) / 2
+    distance = np.linalg.norm(track_centers[:, None, :] - det_centers[None, :, :], axis=2)
+    return (1.0 - iou_matrix(tracks, detections)) + CENTROID_WEIGHT * distance
+
+
+# --- 3. 多目标追踪器 (Multi-target Tracker) ---
+class MultiTargetTracker:
+    """
+    在主机上给每张人脸分配一个持久的 ID，并锁定其中一个作为云台追踪的目标。
+
+    NN 每帧输出的检测顺序并不固定，直接用 detections[0] 会让云台在两张脸之间来回跳。
+    这里用匈牙利算法按代价矩阵做最优匹配，锁定的 ID 只要还存在就不会换目标。
+    """
+    def __init__(self, max_missed_frames=MAX_MISSED_FRAMES):
+        self.max_missed_frames = max_missed_frames
+        self.boxes = np.zeros((0, 4))
+        self.ids = np.zeros(0, dtype=int)
+        self.missed = np.zeros(0, dtype=int)
+        self.next_id = 0
+        self.locked_id = None
+
+    def update(self, detections):
+        """
+        detections: (M, 4) 的数组，归一化的 [xmin, ymin, xmax, ymax]。
+        返回 detections 中每一行对应的目标 ID。
+        """
+        detections = np.asarray(detections, dtype=float).reshape(-1, 4)
+        det_ids = np.full(len(detections), -1, dtype=int)
+        matched_tracks = np.zeros(len(self.ids), dtype=bool)
+
+        if len(self.ids) > 0 and len(detections) > 0:
+            cost = cost_matrix(self.boxes, detections)
+            rows, cols = linear_sum_assignment(cost)
+            keep = cost[rows, cols] <= MAX_ASSOCIATION_COST
+            rows, cols = rows[keep], cols[keep]
+            self.boxes[rows] = detections[cols]
+            det_ids[cols] = self.ids[rows]
+            matched_tracks[rows] = True
+
+        # 没匹配上的目标：丢失计数加一，超过阈值就删掉
+        self.missed[matched_tracks] = 0
+        self.missed[~matched_tracks] += 1
+        alive = self.missed <= self.max_missed_frames
+        self.boxes = self.boxes[alive]
+        self.ids = self.ids[alive]
+        self.missed = self.missed[alive]
+
+        # 没匹配上的检测结果：成为新目标
+        new = det_ids < 0
+        n_new = int(new.sum())
+        if n_new > 0:
+            new_ids = np.arange(self.next_id, self.next_id + n_new)
+            self.next_id += n_new
+            det_ids[new] = new_ids
+            self.boxes = np.vstack([self.boxes, detections[new]])
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.missed = np.concatenate([self.missed, np.zeros(n_new, dtype=int)])
+
+        if self.locked_id is not None and self.locked_id not in self.ids:
+            self.locked_id = None
+        return det_ids
+
+    def lock(self, priority=None):
+        """
+        返回当前锁定的目标 ID；如果还没有锁定，就从这一帧看得到的目标中选一个。
+
+        priority: 与 self.ids 等长的数组，值越大越优先。默认选画面中最大 (通常最近) 的脸。
+        """
+        if self.locked_id is None:
+            visible = self.missed == 0
+            if not visible.any():
+                return None
+            if priority is None:
+                priority = (self.boxes[:, 2] - self.boxes[:, 0]) * (self.boxes[:, 3] - self.boxes[:, 1])
+            priority = np.where(visible, priority, -np.inf)
+            self.locked_id = int(self.ids[np.argmax(priority)])
+        return self.locked_id
+
+    def box_of(self, track_id):
+        """返回目标在这一帧匹配到的检测框；这一帧没看到它则返回 None。"""
+        index = np.flatnonzero(self.ids == track_id)
+        if len(index) == 0 or self.missed[index[0]] > 0:
+            return None
+        return self.boxes[index[0]]
+
+
+# --- 4. 主程序：关联速度基准测试 (Benchmark) ---
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    n_frames = 2000
+
+    print("多目标关联基准测试 (每帧包括代价矩阵、匈牙利匹配和目标增删)")
+    for n_faces in (1, 2, 5, 10, 20, 50):
+        centers = rng.uniform(0.1, 0.9, size=(n_faces, 2))
+        sizes = rng.uniform(0.03, 0.15, size=(n_faces, 1))
+        velocities = rng.normal(0, 0.003, size=(n_faces, 2))
+        tracker = MultiTargetTracker()
+        timings = []
+        for _ in range(n_frames):
+            centers = np.clip(centers + velocities, 0.05, 0.95)
+            boxes = np.hstack([centers - sizes / 2, centers + sizes / 2])
+            # 模拟 NN 每帧打乱输出顺序
+            boxes = boxes[rng.permutation(n_faces)]
+            start = time.perf_counter()
+            tracker.update(boxes)
+            tracker.lock()
+            timings.append(time.perf_counter() - start)
+        timings = np.array(timings[10:]) * 1e6
+        print(f"  {n_faces:3d} 张脸: 平均 {timings.mean():7.1f} us, "
+              f"p99 {np.percentile(timings, 99):7.1f} us, 产生的 ID 数 {tracker.next_id}")
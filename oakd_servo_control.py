@@ -1,7 +1,12 @@
 import cv2
-import depthai as dai
-from adafruit_servokit import ServoKit
 import time
+from frame_access import frame_view
+from pipeline_factory import DeviceBoot, PipelineConfig, StartupTimer, get_pipeline
+from pca_arbiter import PcaConflictError
+from servo_driver import ActuatorThread, ServoDriver, lease_servos
+from trajectory import AxisLimits, TrajectoryFollower
+
+startup = StartupTimer()
 
 # --- 您可以修改这里的“魔法数字” ---
 
@@ -16,33 +21,42 @@ PAN_CENTER_ANGLE = 90.0
 # 每次按键，舵机转动的角度 (步进大小)
 STEP_SIZE = 1.0
 
+# 【新增】舵机的运动限制：每次按键不再一步跳 STEP_SIZE 度，而是沿 S 形曲线平滑地走过去
+# (见 trajectory.py)。两个轴同时到达，速度与主循环的频率无关。
+MOTION_MAX_SPEED_DEG_S = 90.0
+MOTION_MAX_ACCEL_DEG_S2 = 600.0
+MOTION_MAX_JERK_DEG_S3 = 6000.0
+
+# --- 初始化OAK-D相机 ---
+# 【修改】管道由 pipeline_factory 统一构建。设备启动 (上传固件和管道要几秒) 放到后台，
+# 和下面的舵机初始化同时进行。这里没有NN，相机直接输出交错 BGR，主机端不用再每帧转换格式。
+print("正在初始化OAK-D相机 (后台启动)...")
+config = PipelineConfig(preview_size=(640, 480), interleaved=True)
+boot = DeviceBoot(get_pipeline(config))
+
 # --- 初始化舵机 ---
 print("正在初始化PCA9685舵机控制器...")
-kit = ServoKit(channels=16)
-tilt_servo = kit.servo[TILT_CHANNEL]
-pan_servo = kit.servo[PAN_CHANNEL]
-# 设置脉宽以确保180度运动
-tilt_servo.set_pulse_width_range(500, 2500)
-pan_servo.set_pulse_width_range(500, 2500)
+# 【修改】用 ServoDriver 代替 ServoKit (脉宽同样是 500-2500 微秒，180 度)：
+# 每一帧都会发送角度，计数值没变化时不写 I2C。写入在执行线程里按 PWM 周期完成，主循环不等 I2C。
+try:
+    servos = ServoDriver(lease_servos((TILT_CHANNEL, PAN_CHANNEL)))
+except ValueError:
+    print("错误: 无法找到I2C设备。请运行 'sudo i2cdetect -y 1' 检查硬件连接。")
+    exit()
+except PcaConflictError as e:
+    print(f"错误: {e}")
+    exit()
+actuator = ActuatorThread(servos)
+actuator.start()
 
 # 将舵机移动到初始中心位置
 current_tilt_angle = TILT_CENTER_ANGLE
 current_pan_angle = PAN_CENTER_ANGLE
-tilt_servo.angle = current_tilt_angle
-pan_servo.angle = current_pan_angle
+actuator.post({TILT_CHANNEL: current_tilt_angle, PAN_CHANNEL: current_pan_angle})
+follower = TrajectoryFollower((current_pan_angle, current_tilt_angle),
+                              AxisLimits(MOTION_MAX_SPEED_DEG_S, MOTION_MAX_ACCEL_DEG_S2, MOTION_MAX_JERK_DEG_S3))
 print("舵机已归中。")
-
-# --- 初始化OAK-D相机 ---
-print("正在初始化OAK-D相机...")
-pipeline = dai.Pipeline()
-# 创建彩色相机节点
-cam_rgb = pipeline.create(dai.node.ColorCamera)
-cam_rgb.setPreviewSize(640, 480)
-cam_rgb.setInterleaved(False)
-# 创建输出队列
-xout_rgb = pipeline.create(dai.node.XLinkOut)
-xout_rgb.setStreamName("rgb")
-cam_rgb.preview.link(xout_rgb.input)
+startup.mark("舵机归中")
 
 # --- 主程序 ---
 print("OAK-D手动云台控制台已启动！")
@@ -54,16 +68,20 @@ print("     [Q] - 退出")
 print("---------------------------------")
 print("请确保OAK-D视频窗口处于激活状态以接收键盘指令。")
 
-# 连接并启动设备
-with dai.Device(pipeline) as device:
-    q_rgb = device.getOutputQueue(name="rgb", maxSize=4, blocking=False)
+# 等待后台启动的设备
+with boot.result() as device:
+    startup.mark("设备就绪")
+    q_rgb = device.getOutputQueue(name="rgb", maxSize=config.rgb_queue_size, blocking=False)
 
     while True:
         # 从OAK-D获取一帧图像
         in_rgb = q_rgb.tryGet()
 
         if in_rgb is not None:
-            frame = in_rgb.getCvFrame()
+            # 零拷贝：直接把消息里的数据当作 OpenCV 图像
+            frame = frame_view(in_rgb)
+            if startup.mark_once("第一帧画面"):
+                startup.report()
             # 显示图像
             cv2.imshow("OAK-D 云台控制台", frame)
 
@@ -107,10 +125,15 @@ with dai.Device(pipeline) as device:
         current_pan_angle = max(0, min(180, current_pan_angle))
         current_tilt_angle = max(0, min(180, current_tilt_angle))
 
-        # 发送最终指令给舵机
-        pan_servo.angle = current_pan_angle
-        tilt_servo.angle = current_tilt_angle
+        # 发送最终指令给舵机：目标变化时重新规划轨迹，每一帧按当前时间在轨迹上取样
+        now = time.monotonic()
+        follower.set_target((current_pan_angle, current_tilt_angle), now)
+        pan, tilt = follower.sample(now)
+        actuator.post({PAN_CHANNEL: pan, TILT_CHANNEL: tilt})
 
 # 结束时关闭所有窗口
+actuator.stop()
 cv2.destroyAllWindows()
+print(f"[舵机] {servos.stats()}")
+print(f"[执行线程] {actuator.stats()}")
 print("程序已退出。")
@@ -1,9 +1,26 @@
+import argparse
+import json
+import queue
+import threading
 import cv2
 import depthai as dai
+import numpy as np
 import time
-from board import SCL, SDA
-import busio
-from adafruit_servokit import ServoKit
+from camera_geometry import PixelAngleMapper
+from frame_access import frame_view, interleaved_output
+from imu_stabilizer import ImuStabilizer, IMU_RATE_HZ, IMU_BATCH_REPORT_THRESHOLD, IMU_MAX_BATCH_REPORTS
+from message_sync import SequenceSync
+from pipeline_factory import DeviceBoot, PipelineConfig, StartupTimer, get_pipeline
+from multi_target_tracker import MultiTargetTracker
+from pid_controller import DEFAULT_TUNING_RULE, TUNING_RULES, RelayAutoTuner, load_gains, save_gains
+from reacquisition import ReacquisitionSearch
+from roi_detection import RoiProjector, roi_nn_input
+from pca_arbiter import PcaConflictError
+from servo_driver import ActuatorThread, ServoDriver, lease_servos
+from servo_model import GimbalModel
+from target_filter import TargetEstimator, ESTIMATORS, gate_error
+from trajectory import (AxisLimits, TrajectoryFollower, run_to, SERVO_MAX_ACCEL_DEG_S2, SERVO_MAX_JERK_DEG_S3,
+                        SERVO_MAX_SPEED_DEG_S, TRACKING_MAX_ACCEL_DEG_S2, TRACKING_MAX_SPEED_DEG_S)
 
 # --- 1. 配置 (CONFIG) ---
 # [修改] 画面尺寸现在与AI模型的输入尺寸完全匹配
@@ -17,162 +34,1189 @@ PAN_MIN_ANGLE = 10
 PAN_MAX_ANGLE = 170
 TILT_MIN_ANGLE = 30
 TILT_MAX_ANGLE = 100
+# 没有 pid_controller.py 整定结果 (pid_gains.json) 时使用的 P 增益
 PAN_P_GAIN = 0.03
 TILT_P_GAIN = 0.04
 CONFIDENCE_THRESHOLD = 0.5
+NN_BLOB_PATH = "face-detection-retail-0004_openvino_2022.1_4shave.blob"
 # 【新增/修改】从校准脚本中获得的精确中心点
 PAN_CENTER_ANGLE = 90.0
 TILT_CENTER_ANGLE = 54.0
-SMOOTHING_FACTOR = 0.15
-# 【新增】误差死区，单位：像素。这是解决抖动的关键！
-# 意思是如果人脸中心离画面中心的距离小于5个像素，我们就忽略不计
-ERROR_DEADBAND_PIXELS = 20
+# 【新增】舵机控制线程的固定频率 (Hz)，与摄像头/NN的帧率无关
+CONTROL_RATE_HZ = 100
+# 【修改】控制线程不再用指数平滑 (时间常数约 0.2 秒) 逼近目标，而是按 trajectory.py 规划
+# 有速度、加速度限制的轨迹：到达时间确定、不超调，两个轴同时到达。
+# 平时的追踪用较低的限制，检测结果的噪声不会让云台猛冲；模拟 (pid_controller.py) 中
+# 原 P 控制的阶跃稳定时间从 3.3 秒缩短到 0.6 秒。
+TRACKING_LIMITS = AxisLimits(TRACKING_MAX_SPEED_DEG_S, TRACKING_MAX_ACCEL_DEG_S2)
+# 每隔多少秒打印一次控制线程的周期抖动
+JITTER_REPORT_INTERVAL_S = 10.0
+# 【修改】原来固定 20 像素的误差死区 (ERROR_DEADBAND_PIXELS) 换成了基于方差的死区：
+# 预测误差小于 GATE_SIGMA 倍估计标准差时视为 0。估计稳定时死区只有几个像素。
+GATE_SIGMA = 2.0
+# 目标估计器："kalman" (匀速卡尔曼) 或 "alphabeta"，见 target_filter.py
+ESTIMATOR = "kalman"
+# 控制线程拿到新目标平均还要等半个周期，预测时再向前推这么多
+PREDICTION_LEAD_S = 0.5 / CONTROL_RATE_HZ
 
-# 【新增】目标丢失多少帧后才开始复位。这是一个“宽限期”。
-# 假设摄像头约30fps，30帧就意味着目标消失1秒后才复位。
-TARGET_LOST_THRESHOLD_FRAMES = 60
+# 【新增】扫视 (saccade)：目标偏离光轴超过这个角度 (度) 时，按相机内参直接算出绝对目标角度，
+# 一次转过去；小于这个角度时仍由 P 控制做细调。见 camera_geometry.py。
+SACCADE_THRESHOLD_DEG = 8.0
+# 扫视时用舵机的极限速度和 S 形曲线 (加速度连续变化)，比平时的 TRACKING_LIMITS 快得多
+SACCADE_LIMITS = AxisLimits(SERVO_MAX_SPEED_DEG_S, SERVO_MAX_ACCEL_DEG_S2, SERVO_MAX_JERK_DEG_S3)
+# 舵机离扫视目标小于这个角度 (度)，或者超过 SACCADE_TIMEOUT_S 秒，扫视结束，交回 P 控制
+SACCADE_SETTLE_DEG = 1.0
+SACCADE_TIMEOUT_S = 0.5
+
+# 【修改】目标丢失多少帧后开始重新捕获搜索 (原来是等 60 帧后直接复位)。
+# 先沿目标离开的方向追，再做有界扫描，搜索超时后才复位到中心，见 reacquisition.py。
+REACQUIRE_START_FRAMES = 5
+# 目标速度超过这个值 (像素/秒) 才按速度方向去追；否则按目标最后所在的一侧
+REACQUIRE_MIN_VELOCITY_PX_S = 30.0
+# 目标最后离中心超过这个距离 (像素) 才认为它是从这一侧离开的
+REACQUIRE_MIN_OFFSET_PIXELS = FRAME_WIDTH / 6
+
+# 【新增】空闲省电：目标丢失超过这么多帧、并且搜索已经结束复位之后，进入空闲状态。
+IDLE_THRESHOLD_FRAMES = 150
+# 搜索超时、发出复位到中心的目标之后，至少再等这么多帧才进入空闲 (释放舵机)，
+# 让云台先回到中心。和原来一样：60 帧复位，150 帧空闲，中间留 90 帧 (30fps 约 3 秒)
+IDLE_AFTER_RESET_FRAMES = 90
+# 空闲时设备上只放行每 N 帧中的一帧给NN和主机 (30fps / 6 = 5fps)
+IDLE_FRAME_DIVIDER = 6
+# 空闲时是否让舵机停止输出脉冲 (angle=None)。停止后云台没有保持力矩，但不再发热。
+IDLE_RELEASE_SERVOS = True
+
+# 【新增】设备端目标追踪 (--device-tracker)：NN 每隔几帧才推理一次，
+# 中间的帧由设备上的 ObjectTracker 根据画面补上，主机直接收到带稳定ID的 tracklets。
+DEVICE_TRACKER_NN_DECIMATION = 3
+# face-detection-retail-0004 的输出里，标签 1 是人脸 (0 是背景)
+FACE_LABEL = 1
+
+# 【新增】设备端算误差 (--device-script)：Script 节点选目标、算归一化误差并做死区，
+# 每帧只发几个字节给主机。死区用归一化单位 (画面半宽 = 1.0)，0.1 约等于原来的 15 像素。
+SCRIPT_ERROR_DEADBAND = 0.1
+# 上一帧目标中心附近多大范围内 (归一化坐标) 的脸被认为是同一个目标
+SCRIPT_LOCK_RADIUS = 0.15
+
+# 【新增】双目深度 (--spatial)：每个检测结果带有 XYZ 坐标 (毫米)
+SPATIAL_DEPTH_MIN_MM = 100
+SPATIAL_DEPTH_MAX_MM = 5000
+# 按距离调度 P 增益的倍数：(距离 mm, 增益倍数)，中间线性插值，两端取端点值。
+# 近处的脸稍有移动就是很大的像素误差，增益小一点避免过冲；远处的脸增益大一点收敛更快。
+DISTANCE_GAIN_SCHEDULE = [(500, 0.6), (1500, 1.0), (3000, 1.5)]
+
+# 【新增】IMU 前馈 (--imu)：等待陀螺仪零偏标定完成的最长时间 (秒)，标定期间舵机保持静止
+IMU_CALIBRATION_TIMEOUT_S = 3.0
+
+# 事件驱动模式下，等待一条新的检测结果的最长时间 (秒)。
+# 超时只意味着设备暂时没有输出，此时按“没有目标”处理一次。
+NN_WAIT_TIMEOUT_S = 0.5
+# 【新增】画面显示的帧率上限 (fps)，与控制频率无关。显示在单独的线程里，跟不上就丢帧。
+DISPLAY_FPS = 10.0
+# 【新增】舵机归中后至少等这么久 (秒) 再开始追踪。这段时间和设备启动并行，通常不会额外等待。
+SERVO_SETTLE_S = 1.0
+# 追踪管道的配置，见 pipeline_factory.py。NN 需要平面 BGR 输入。
+TRACKER_PIPELINE_CONFIG = PipelineConfig(preview_size=(FRAME_WIDTH, FRAME_HEIGHT), interleaved=False,
+                                         nn_blob=NN_BLOB_PATH, nn_threads=2, confidence=CONFIDENCE_THRESHOLD)
+# 每隔多少秒打印一次主机CPU占用
+CPU_REPORT_INTERVAL_S = 10.0
 
 # --- 2. 舵机控制类 (Servo Controller Class) ---
 class ServoController:
     # ... (这个类非常完美，无需任何改动) ...
     def __init__(self, channels, pan_ch, tilt_ch):
         try:
-            self.i2c = busio.I2C(SCL, SDA)
-            self.kit = ServoKit(channels=channels, i2c=self.i2c)
+            # 【修改】不再通过 ServoKit 写角度：ServoDriver 换算成 12 位计数值，没变化就不写 I2C。
+            # I2C 句柄和 PCA9685 由 pca_arbiter 统一管理，这里只租用 pan/tilt 两个通道
+            self.driver = ServoDriver(lease_servos((pan_ch, tilt_ch)))
             print("PCA9685 初始化成功。")
         except ValueError:
             print("错误: 无法找到I2C设备。请运行 'sudo i2cdetect -y 1' 检查硬件连接。")
             exit()
-        self.pan_servo = self.kit.servo[pan_ch]
-        self.tilt_servo = self.kit.servo[tilt_ch]
-        self.pan_servo.set_pulse_width_range(500, 2500)
-        self.tilt_servo.set_pulse_width_range(500, 2500)
+        except PcaConflictError as e:
+            print(f"错误: {e}")
+            exit()
+        self.pan_ch = pan_ch
+        self.tilt_ch = tilt_ch
+        # 【新增】I2C 写入交给执行线程，每个 PWM 周期 (20 ms) 写一次最新的角度，调用方不会被总线阻塞
+        self.actuator = ActuatorThread(self.driver)
+        self.actuator.start()
         self.current_pan_angle = PAN_CENTER_ANGLE
         self.current_tilt_angle = TILT_CENTER_ANGLE
     def center_all(self):
-        self.set_pan(PAN_CENTER_ANGLE)
-        self.set_tilt(TILT_CENTER_ANGLE)
+        self.set_angles(PAN_CENTER_ANGLE, TILT_CENTER_ANGLE)
         print("舵机已归中。")
-    def set_pan(self, angle):
-        self.current_pan_angle = max(PAN_MIN_ANGLE, min(PAN_MAX_ANGLE, angle))
-        self.pan_servo.angle = self.current_pan_angle
-    def set_tilt(self, angle):
-        self.current_tilt_angle = max(TILT_MIN_ANGLE, min(TILT_MAX_ANGLE, angle))
-        self.tilt_servo.angle = self.current_tilt_angle
+    def move_to(self, pan_angle, tilt_angle, limits=TRACKING_LIMITS):
+        """【新增】沿有速度、加速度限制的轨迹转到指定角度，阻塞到到达为止 (用于退出前的归中)。"""
+        follower = TrajectoryFollower((self.current_pan_angle, self.current_tilt_angle), limits)
+        run_to(follower, (pan_angle, tilt_angle), lambda angles: self.set_angles(*angles))
+    def set_angles(self, pan_angle, tilt_angle):
+        """【新增】同时设置两个轴，一次 I2C 传输写完 (pan/tilt 通道相邻)，两个轴同时更新。"""
+        self.current_pan_angle = max(PAN_MIN_ANGLE, min(PAN_MAX_ANGLE, pan_angle))
+        self.current_tilt_angle = max(TILT_MIN_ANGLE, min(TILT_MAX_ANGLE, tilt_angle))
+        self.actuator.post({self.pan_ch: self.current_pan_angle, self.tilt_ch: self.current_tilt_angle})
+    def release(self):
+        """停止输出脉冲，舵机不再保持位置。current_*_angle 保留最后一次的角度。"""
+        self.actuator.post({self.pan_ch: None, self.tilt_ch: None})
+    def record_writes(self, gimbal):
+        """指令真正写到 PCA9685 时 (而不是交给执行线程时) 记录到舵机位置模型里。"""
+        def on_flush(angles):
+            # 用和检测结果时间戳相同的时钟记录；停止输出 (None) 不改变模型里的角度
+            gimbal.command(dai.Clock.now().total_seconds(), angles.get(self.pan_ch), angles.get(self.tilt_ch))
+        self.actuator.on_flush = on_flush
+    def close(self):
+        """停止执行线程，先把最后的指令写出去。"""
+        self.actuator.stop()
 
 # --- 3. OAK-D 管道设置 (OAK-D Pipeline Setup) ---
-pipeline = dai.Pipeline()
+def create_pipeline(config=TRACKER_PIPELINE_CONFIG, headless=False, device_tracker=False, nn_decimation=DEVICE_TRACKER_NN_DECIMATION,
+                    device_script=False, spatial=False, imu=False, roi=False):
+    """
+    创建追踪用的管道。预览尺寸、NN 模型、推理线程数和置信度阈值来自 config。
+
+    headless=True 时不创建 "rgb" 的 XLinkOut，画面不会通过USB传到主机，
+    主机只收到 "nn" 里的检测结果。否则 "rgb" 里是设备上转换好的交错 BGR，
+    主机用 frame_view() 直接当作 OpenCV 图像，不需要每帧重新排列。
+
+    device_tracker=True 时在检测网络后面接一个 ObjectTracker：一个 Script 节点
+    只把每 nn_decimation 帧中的一帧送给NN，追踪器在每一帧上运行，
+    "nn" 流里发给主机的是 Tracklets (带稳定ID和 NEW/TRACKED/LOST 状态) 而不是 ImgDetections。
+
+    device_script=True 时检测结果先进入一个 Script 节点，由它选目标、算 pan/tilt 误差，
+    "nn" 流里每帧只有一个几十字节的 Buffer: "误差x 误差y 置信度"。
+
+    spatial=True 时加上左右单目相机和 StereoDepth，检测网络换成
+    MobileNetSpatialDetectionNetwork，每个检测结果 (和 tracklet) 都带有 spatialCoordinates。
+
+    imu=True 时加上 IMU 节点，以 IMU_RATE_HZ 把陀螺仪原始数据通过 "imu" 流发给主机。
+
+    roi=True 时 NN 在锁定小目标后改看全分辨率 ISP 画面里的一个局部窗口，
+    每帧用的窗口通过 "roi" 流发给主机，见 roi_detection.py。
+    """
+    pipeline = dai.Pipeline()
+
+    cam_rgb = pipeline.create(dai.node.ColorCamera)
+    # 预览从 1080P 的 ISP 画面中心裁剪缩放而来，camera_geometry.py 按这个分辨率换算内参
+    cam_rgb.setResolution(dai.ColorCameraProperties.SensorResolution.THE_1080_P)
+    # [修改] 设置预览尺寸以匹配AI模型
+    cam_rgb.setPreviewSize(*config.preview_size)
+    cam_rgb.setInterleaved(config.interleaved)
+    cam_rgb.setColorOrder(dai.ColorCameraProperties.ColorOrder.BGR)
+
+    # [修改] 使用正确、更高级的 MobileNetDetectionNetwork 节点
+    if spatial:
+        detection_nn = pipeline.create(dai.node.MobileNetSpatialDetectionNetwork)
+    else:
+        detection_nn = pipeline.create(dai.node.MobileNetDetectionNetwork)
+    detection_nn.setBlobPath(config.nn_blob)
+    # 这个高级节点拥有 setConfidenceThreshold 方法，我们可以再次使用它！
+    detection_nn.setConfidenceThreshold(config.confidence)
+    detection_nn.setNumInferenceThreads(config.nn_threads)
+    detection_nn.input.setBlocking(False)
+
+    if spatial:
+        mono_left = pipeline.create(dai.node.MonoCamera)
+        mono_left.setResolution(dai.MonoCameraProperties.SensorResolution.THE_400_P)
+        mono_left.setBoardSocket(dai.CameraBoardSocket.CAM_B)
+        mono_right = pipeline.create(dai.node.MonoCamera)
+        mono_right.setResolution(dai.MonoCameraProperties.SensorResolution.THE_400_P)
+        mono_right.setBoardSocket(dai.CameraBoardSocket.CAM_C)
+
+        stereo = pipeline.create(dai.node.StereoDepth)
+        stereo.setDefaultProfilePreset(dai.node.StereoDepth.PresetMode.HIGH_DENSITY)
+        # 深度图对齐到彩色相机，检测框才能直接对应到深度
+        stereo.setDepthAlign(dai.CameraBoardSocket.CAM_A)
+        stereo.setOutputSize(mono_left.getResolutionWidth(), mono_left.getResolutionHeight())
+        mono_left.out.link(stereo.left)
+        mono_right.out.link(stereo.right)
+
+        detection_nn.setBoundingBoxScaleFactor(0.5)
+        detection_nn.setDepthLowerThreshold(SPATIAL_DEPTH_MIN_MM)
+        detection_nn.setDepthUpperThreshold(SPATIAL_DEPTH_MAX_MM)
+        stereo.depth.link(detection_nn.inputDepth)
+
+    # 帧门控：所有预览帧先经过这个 Script 节点。主机通过 "gate" 流发来一个分频系数，
+    # 空闲时只放行每 N 帧中的一帧，NN推理和USB传输都随之降下来；
+    # device_tracker 时，放行的帧里再每 nn_decimation 帧送一帧给NN。
+    nn_every = nn_decimation if device_tracker else 1
+    send_frames = device_tracker or not headless
+    frame_gate = pipeline.create(dai.node.Script)
+    frame_gate.setScript(f"""
+nn_every = {nn_every}
+send_frames = {send_frames}
+divider = 1
+n = 0
+while True:
+    ctrl = node.io['ctrl'].tryGet()
+    if ctrl is not None:
+        divider = max(1, ctrl.getData()[0])
+    frame = node.io['in'].get()
+    n += 1
+    if n % divider != 0:
+        continue
+    if send_frames:
+        node.io['frames'].send(frame)
+    if (n // divider) % nn_every == 0:
+        node.io['nn'].send(frame)
+""")
+    frame_gate.inputs['in'].setBlocking(False)
+    frame_gate.inputs['in'].setQueueSize(1)
+    frame_gate.inputs['ctrl'].setBlocking(False)
+    frame_gate.inputs['ctrl'].setQueueSize(1)
+    cam_rgb.preview.link(frame_gate.inputs['in'])
+    if roi:
+        roi_dets = roi_nn_input(pipeline, cam_rgb, frame_gate.outputs['nn'], detection_nn.input, config.preview_size)
+        detection_nn.out.link(roi_dets)
+    else:
+        frame_gate.outputs['nn'].link(detection_nn.input)
+    gated_frames = frame_gate.outputs['frames']
+
+    xin_gate = pipeline.create(dai.node.XLinkIn)
+    xin_gate.setStreamName("gate")
+    xin_gate.out.link(frame_gate.inputs['ctrl'])
+
+    if device_tracker:
+        object_tracker = pipeline.create(dai.node.ObjectTracker)
+        object_tracker.setDetectionLabelsToTrack([FACE_LABEL])
+        # KCF 是短时追踪器，可以在两次NN推理之间根据画面本身更新目标位置
+        object_tracker.setTrackerType(dai.TrackerType.SHORT_TERM_KCF)
+        object_tracker.setTrackerIdAssignmentPolicy(dai.TrackerIdAssignmentPolicy.SMALLEST_ID)
+        object_tracker.inputTrackerFrame.setBlocking(False)
+        object_tracker.inputTrackerFrame.setQueueSize(2)
+
+        gated_frames.link(object_tracker.inputTrackerFrame)
+        detection_nn.passthrough.link(object_tracker.inputDetectionFrame)
+        detection_nn.out.link(object_tracker.inputDetections)
+        target_out = object_tracker.out
+    else:
+        target_out = detection_nn.out
+
+    if device_script:
+        # 优先选离上一帧目标最近的脸 (在 LOCK_RADIUS 内)，否则按置信度选
+        error_script = pipeline.create(dai.node.Script)
+        error_script.setScript(f"""
+DEADBAND = {SCRIPT_ERROR_DEADBAND}
+LOCK_RADIUS = {SCRIPT_LOCK_RADIUS}
+last = None
+while True:
+    dets = node.io['dets'].get()
+    best = None
+    best_score = None
+    for d in dets.detections:
+        cx = (d.xmin + d.xmax) / 2
+        cy = (d.ymin + d.ymax) / 2
+        if last is not None and abs(cx - last[0]) < LOCK_RADIUS and abs(cy - last[1]) < LOCK_RADIUS:
+            score = 2.0 - abs(cx - last[0]) - abs(cy - last[1])
+        else:
+            score = d.confidence
+        if best is None or score > best_score:
+            best, best_score = (cx, cy, d.confidence), score
+    if best is None:
+        ex = ey = conf = 0.0
+        last = None
+    else:
+        last = (best[0], best[1])
+        ex = (best[0] - 0.5) * 2
+        ey = (best[1] - 0.5) * 2
+        conf = best[2]
+        if abs(ex) < DEADBAND:
+            ex = 0.0
+        if abs(ey) < DEADBAND:
+            ey = 0.0
+    data = ("%.4f %.4f %.3f" % (ex, ey, conf)).encode()
+    buf = Buffer(len(data))
+    buf.setData(data)
+    buf.setSequenceNum(dets.getSequenceNum())
+    buf.setTimestamp(dets.getTimestamp())
+    node.io['error'].send(buf)
+""")
+        target_out.link(error_script.inputs['dets'])
+        target_out = error_script.outputs['error']
+
+    if not headless:
+        # NN 和 ObjectTracker 仍然用平面格式，只有发给主机显示的这一路转成交错格式
+        xout_rgb = pipeline.create(dai.node.XLinkOut)
+        xout_rgb.setStreamName("rgb")
+        interleaved_output(pipeline, gated_frames, *config.preview_size).link(xout_rgb.input)
+
+    xout_nn = pipeline.create(dai.node.XLinkOut)
+    xout_nn.setStreamName("nn")
+    target_out.link(xout_nn.input)
+
+    if imu:
+        imu_node = pipeline.create(dai.node.IMU)
+        imu_node.enableIMUSensor(dai.IMUSensor.GYROSCOPE_RAW, IMU_RATE_HZ)
+        # 每个采样都尽快发出，前馈需要的是低延迟而不是大批量
+        imu_node.setBatchReportThreshold(IMU_BATCH_REPORT_THRESHOLD)
+        imu_node.setMaxBatchReports(IMU_MAX_BATCH_REPORTS)
+        xout_imu = pipeline.create(dai.node.XLinkOut)
+        xout_imu.setStreamName("imu")
+        imu_node.out.link(xout_imu.input)
+
+    return pipeline
+
+# --- 4. 追踪逻辑与性能统计 (Tracking Logic & Stats) ---
+def distance_gain_scale(distance_mm):
+    """按 DISTANCE_GAIN_SCHEDULE 对距离做线性插值，得到 P 增益的倍数。"""
+    points = DISTANCE_GAIN_SCHEDULE
+    if distance_mm <= points[0][0]:
+        return points[0][1]
+    for (d0, g0), (d1, g1) in zip(points, points[1:]):
+        if distance_mm <= d1:
+            return g0 + (g1 - g0) * (distance_mm - d0) / (d1 - d0)
+    return points[-1][1]
+
+class CpuUsageMeter:
+    """
+    统计本进程在主机上的CPU占用，单位是“单核百分比” (100% = 占满一个核)。
+    同时累计从 "rgb" 流收到的字节数，用来对比有画面和无头模式的USB流量。
+    """
+    def __init__(self):
+        self.reset()
+    def reset(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.rgb_bytes = 0
+    def percent(self):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        return 100.0 * cpu / wall if wall > 0 else 0.0
+    def rgb_megabytes_per_second(self):
+        wall = time.perf_counter() - self.wall_start
+        return self.rgb_bytes / wall / 1e6 if wall > 0 else 0.0
+
+class ControlThread(threading.Thread):
+    """
+    以固定频率运行的舵机控制线程。
+
+    视觉部分只负责通过 set_target() 给出最新的目标角度；这个线程每个周期
+    读取最新目标，目标变化时从当前的位置和速度重新规划轨迹 (trajectory.TrajectoryFollower)，
+    然后按当前时刻在轨迹上取样、写舵机。
+    这样舵机的运动只由速度、加速度限制决定，和摄像头帧率、控制频率无关。
+    """
+    def __init__(self, servos, rate_hz=CONTROL_RATE_HZ, stabilizer=None):
+        super().__init__(daemon=True)
+        self.servos = servos
+        # IMU 前馈：每个周期叠加抵消基座转动的角度
+        self.stabilizer = stabilizer
+        self.period = 1.0 / rate_hz
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.target_pan_angle = servos.current_pan_angle
+        self.target_tilt_angle = servos.current_tilt_angle
+        self.limits = TRACKING_LIMITS
+        # 只在这个线程里使用，不需要加锁
+        self.follower = TrajectoryFollower((servos.current_pan_angle, servos.current_tilt_angle), TRACKING_LIMITS)
+        # release() 之后不再写舵机，直到下一次 set_target()
+        self.released = False
+        self.reset_jitter_stats()
+
+    def set_target(self, pan_angle, tilt_angle, limits=TRACKING_LIMITS):
+        """limits 决定朝这个目标移动的快慢，扫视时用 SACCADE_LIMITS。"""
+        # 先限幅，否则超出范围的目标永远“到不了”，控制线程会一直重复写
+        pan_angle = max(PAN_MIN_ANGLE, min(PAN_MAX_ANGLE, pan_angle))
+        tilt_angle = max(TILT_MIN_ANGLE, min(TILT_MAX_ANGLE, tilt_angle))
+        with self.lock:
+            self.target_pan_angle = pan_angle
+            self.target_tilt_angle = tilt_angle
+            self.limits = limits
+            self.released = False
+
+    def release(self):
+        """让舵机停止输出，直到有新的目标。"""
+        with self.lock:
+            self.released = True
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+    def reset_jitter_stats(self):
+        self.cycles = 0
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+        self.overruns = 0
+
+    def report_jitter(self):
+        if self.cycles == 0:
+            return
+        mean_ms = self.jitter_sum / self.cycles * 1000
+        print(f"[控制线程] {1.0 / self.period:.0f} Hz, 周期抖动 平均 {mean_ms:.2f} ms, "
+              f"最大 {self.jitter_max * 1000:.2f} ms, 超时 {self.overruns} 次 / {self.cycles} 个周期")
+
+    def run(self):
+        self.servos_released = False
+        # 假装上一个周期刚好在一个周期前，这样第一次的 dt 不会被算成抖动
+        last_time = time.perf_counter() - self.period
+        next_deadline = last_time + 2 * self.period
+        last_report = last_time
+
+        while not self.stop_event.is_set():
+            now = time.perf_counter()
+            dt = now - last_time
+            last_time = now
+
+            # 记录实际周期与期望周期的偏差
+            jitter = abs(dt - self.period)
+            self.cycles += 1
+            self.jitter_sum += jitter
+            self.jitter_max = max(self.jitter_max, jitter)
+
+            with self.lock:
+                target_pan = self.target_pan_angle
+                target_tilt = self.target_tilt_angle
+                released = self.released
+                limits = self.limits
+
+            if released:
+                if not self.servos_released:
+                    self.servos.release()
+                    self.servos_released = True
+            else:
+                # 刚从释放状态恢复时，不管是否到位都要写一次，让舵机重新输出脉冲
+                force_write = self.servos_released
+                self.servos_released = False
+                if self.stabilizer is not None:
+                    # 前馈不经过轨迹规划，整条轨迹直接平移；目标也一起平移，
+                    # 视觉的 P 控制下一帧会以平移后的角度为基准
+                    d_pan, d_tilt = self.stabilizer.feedforward(dt)
+                    if d_pan or d_tilt:
+                        with self.lock:
+                            target_pan = max(PAN_MIN_ANGLE, min(PAN_MAX_ANGLE, self.target_pan_angle + d_pan))
+                            target_tilt = max(TILT_MIN_ANGLE, min(TILT_MAX_ANGLE, self.target_tilt_angle + d_tilt))
+                            self.target_pan_angle = target_pan
+                            self.target_tilt_angle = target_tilt
+                        self.follower.shift((d_pan, d_tilt))
+                # 目标没变时沿原来的轨迹继续走；按真实时间取样，总的运动轨迹与循环频率无关
+                self.follower.set_target((target_pan, target_tilt), now, limits)
+                new_pan, new_tilt = self.follower.sample(now)
+                # 轨迹正好停在目标上，到位后角度不再变化，也就不再写。set_angles 只是把角度交给执行线程，
+                # 不会阻塞；执行线程每个 PWM 周期用一次 I2C 传输写出两个轴的最新角度
+                if (force_write or new_pan != self.servos.current_pan_angle
+                        or new_tilt != self.servos.current_tilt_angle):
+                    self.servos.set_angles(new_pan, new_tilt)
+
+            if now - last_report > JITTER_REPORT_INTERVAL_S:
+                self.report_jitter()
+                self.reset_jitter_stats()
+                last_report = now
+
+            # 按绝对截止时间睡眠，避免误差累积；如果已经落后一个周期以上就重新对齐
+            sleep_time = next_deadline - time.perf_counter()
+            if sleep_time > 0:
+                self.stop_event.wait(sleep_time)
+                next_deadline += self.period
+            else:
+                self.overruns += 1
+                next_deadline = time.perf_counter() + self.period
+
+class PowerManager:
+    """
+    空闲省电：没有目标时通过 "gate" 流让设备降低NN和画面的帧率，并 (可选) 释放舵机；
+    一旦重新看到人脸就立刻恢复全速。
+    """
+    def __init__(self, device, control):
+        self.q_gate = device.getInputQueue("gate")
+        self.control = control
+        self.idle = False
+
+    def set_frame_divider(self, divider):
+        buf = dai.Buffer()
+        buf.setData([divider])
+        self.q_gate.send(buf)
+
+    def enter_idle(self):
+        if self.idle:
+            return
+        self.idle = True
+        self.set_frame_divider(IDLE_FRAME_DIVIDER)
+        if IDLE_RELEASE_SERVOS:
+            self.control.release()
+        print("目标长时间未出现，进入空闲省电模式。")
+
+    def wake(self):
+        if not self.idle:
+            return
+        self.idle = False
+        self.set_frame_divider(1)
+        print("发现目标，恢复全速追踪。")
+
+class FaceTracker:
+    """每收到一次检测结果就执行一次的视觉逻辑：选目标、算误差，把目标角度交给控制线程。"""
+    def __init__(self, servos, control, estimator=ESTIMATOR, spatial=False, power=None, mapper=None,
+                 saccade=True, gimbal=None, autotune_rule=None, roi=None):
+        self.servos = servos
+        self.control = control
+        self.power = power
+        self.spatial = spatial
+        # --roi 时把局部窗口里的检测框换算回全画面坐标 (RoiProjector)
+        self.roi = roi
+        # 像素 -> 角度的几何换算；为 None 时不做扫视，也不做自身运动补偿
+        self.mapper = mapper
+        self.saccade = saccade and mapper is not None
+        # 舵机位置模型：估计每一帧拍摄时云台的实际角度，用来扣掉相机自身运动造成的画面移动
+        self.gimbal = gimbal if mapper is not None else None
+        self.saccade_target = None
+        self.saccade_deadline = 0.0
+        self.saccades = 0
+        self.estimator = TargetEstimator(estimator)
+        # 【新增】每个轴一个 PID；没有整定结果时只有 P 项，和原来的 PAN_P_GAIN / TILT_P_GAIN 一样
+        self.pan_pid = load_gains("pan", PAN_P_GAIN)
+        self.tilt_pid = load_gains("tilt", TILT_P_GAIN)
+        # --autotune：先用继电器实验代替 PID，测完后按 autotune_rule 算出增益并保存
+        self.autotune_rule = autotune_rule
+        self.autotuners = (RelayAutoTuner(), RelayAutoTuner()) if autotune_rule else None
+        if self.autotuners:
+            self.saccade = False
+        # 给每张脸分配持久 ID，并锁定其中一个，避免NN输出顺序变化时云台来回跳
+        self.targets = MultiTargetTracker()
+        # 估计器当前跟踪的是哪个 ID；换目标时要重置估计器
+        self.estimated_id = None
+        self.target_pan_angle = PAN_CENTER_ANGLE
+        self.target_tilt_angle = TILT_CENTER_ANGLE
+        # 目标丢失帧数计数器
+        self.frames_since_target_lost = 0
+        # 搜索超时 (复位到中心) 时 frames_since_target_lost 的值；没有搜索过时为 0
+        self.search_ended_frame = 0
+        # 目标丢失后的重新捕获搜索
+        self.search = ReacquisitionSearch(PAN_CENTER_ANGLE, TILT_CENTER_ANGLE,
+                                          (PAN_MIN_ANGLE, PAN_MAX_ANGLE), (TILT_MIN_ANGLE, TILT_MAX_ANGLE))
+        self.last_seen_time = None
+        self.last_error = (0.0, 0.0)
+        # 最近一次看到的所有目标 [(xmin, ymin, xmax, ymax, id), ...]，只在有画面时用来绘制
+        self.last_boxes = []
+        self.locked_id = None
+        self.locked_bbox = None
+        self.locked_distance = None
+        self.predicted_point = None
+
+    def process(self, msg):
+        """
+        处理 "nn" 流里的一条消息：ImgDetections (主机端关联)、Tracklets (设备端追踪)
+        或者 Script 节点发来的误差 Buffer (设备端算误差)。
+        """
+        timestamp = msg.getTimestamp().total_seconds()
+        if isinstance(msg, dai.ImgDetections):
+            detections = msg.detections if self.roi is None else self.roi.project(msg)
+            if detections is not None:
+                self.update(detections, timestamp)
+        elif isinstance(msg, dai.Tracklets):
+            self.update_tracklets(msg.tracklets, timestamp)
+        else:
+            error_pan, error_tilt, confidence = (float(v) for v in bytes(msg.getData()).split())
+            self.update_error(error_pan, error_tilt, confidence)
+
+    def update(self, detections, timestamp):
+        """timestamp 是这条检测结果在设备时钟上的时间 (秒)，即 getTimestamp()。"""
+        track_ids = self.targets.update([[d.xmin, d.ymin, d.xmax, d.ymax] for d in detections])
+        distances = {}
+        priority = None
+        if self.spatial:
+            # 有深度时优先锁定最近的脸；没有有效深度 (z = 0) 的脸排在最后
+            distances = {track_id: d.spatialCoordinates.z for d, track_id in zip(detections, track_ids)}
+            priority = np.full(len(self.targets.ids), -1e9)
+            for track_id, z in distances.items():
+                if z > 0:
+                    priority[self.targets.ids == track_id] = -z
+        locked_id = self.targets.lock(priority)
+        bbox = self.targets.box_of(locked_id) if locked_id is not None else None
+
+        self.last_boxes = [(d.xmin, d.ymin, d.xmax, d.ymax, track_id) for d, track_id in zip(detections, track_ids)]
+        self.follow(locked_id, bbox, timestamp, distances.get(locked_id))
+
+    def update_tracklets(self, tracklets, timestamp):
+        """
+        设备上的 ObjectTracker 已经给了稳定的 ID，主机只需要决定锁定哪一个。
+        锁定的 ID 只要没有被 REMOVED 就保持；LOST 状态的帧按“这一帧没看到”处理。
+        """
+        status = dai.Tracklet.TrackingStatus
+        boxes = {}
+        distances = {}
+        alive = set()
+        for t in tracklets:
+            if t.status == status.REMOVED:
+                continue
+            alive.add(t.id)
+            if t.status in (status.NEW, status.TRACKED):
+                top_left, bottom_right = t.roi.topLeft(), t.roi.bottomRight()
+                boxes[t.id] = (top_left.x, top_left.y, bottom_right.x, bottom_right.y)
+                distances[t.id] = t.spatialCoordinates.z
+
+        locked_id = self.locked_id if self.locked_id in alive else None
+        if locked_id is None and boxes:
+            if self.spatial and any(z > 0 for z in distances.values()):
+                # 有深度时选最近的脸
+                locked_id = min((i for i in boxes if distances[i] > 0), key=lambda i: distances[i])
+            else:
+                # 没有锁定目标时，选画面里最大 (通常最近) 的脸
+                locked_id = max(boxes, key=lambda i: (boxes[i][2] - boxes[i][0]) * (boxes[i][3] - boxes[i][1]))
+
+        self.last_boxes = [box + (track_id,) for track_id, box in boxes.items()]
+        self.follow(locked_id, boxes.get(locked_id), timestamp, distances.get(locked_id) if self.spatial else None)
+
+    def follow(self, locked_id, bbox, timestamp, distance_mm=None):
+        """
+        根据锁定目标这一帧的检测框 (没看到则为 None) 更新云台的目标角度。
+        distance_mm 是目标的深度 (--spatial 时才有)，用来调度增益。
+        """
+        self.locked_id = locked_id
+        self.locked_bbox = bbox
+        self.locked_distance = distance_mm
+
+        if bbox is not None:
+            # --- 如果找到了锁定的目标 ---
+            self.frames_since_target_lost = 0
+            if locked_id != self.estimated_id:
+                self.estimator.reset()
+                self.estimated_id = locked_id
+
+            # 检测结果已经是几十毫秒前的了：先用它的时间戳更新估计器，
+            # 再把目标位置预测到现在 (即将发出舵机指令的时刻)
+            target_x = (bbox[0] + bbox[2]) * FRAME_WIDTH / 2
+            target_y = (bbox[1] + bbox[3]) * FRAME_HEIGHT / 2
+            if self.gimbal is not None:
+                # 云台在转动时，整个画面也在移动。把像素位置换算到“云台在中心角度”时的画面里，
+                # 估计器就只看到目标自己的运动 (+pan 让画面里的目标向 +x 移动，tilt 同理)
+                pan_at_frame, tilt_at_frame = self.gimbal.angles_at(timestamp)
+                target_x -= (pan_at_frame - PAN_CENTER_ANGLE) * self.pixels_per_degree[0]
+                target_y -= (tilt_at_frame - TILT_CENTER_ANGLE) * self.pixels_per_degree[1]
+            self.estimator.update(timestamp, target_x, target_y)
+            command_time = dai.Clock.now().total_seconds() + PREDICTION_LEAD_S
+            predicted_x, predicted_y, var_x, var_y = self.estimator.predict(command_time)
+            if self.gimbal is not None:
+                # 再换算回当前指令角度下的画面，P 控制的误差就是相对于 current_*_angle 的
+                predicted_x += (self.servos.current_pan_angle - PAN_CENTER_ANGLE) * self.pixels_per_degree[0]
+                predicted_y += (self.servos.current_tilt_angle - TILT_CENTER_ANGLE) * self.pixels_per_degree[1]
+            self.predicted_point = (predicted_x, predicted_y)
 
-cam_rgb = pipeline.create(dai.node.ColorCamera)
-# [修改] 设置预览尺寸以匹配AI模型
-cam_rgb.setPreviewSize(FRAME_WIDTH, FRAME_HEIGHT)
-cam_rgb.setInterleaved(False)
-cam_rgb.setColorOrder(dai.ColorCameraProperties.ColorOrder.BGR)
+            error_pan = gate_error(predicted_x - (FRAME_WIDTH / 2), var_x, GATE_SIGMA)
+            error_tilt = gate_error(predicted_y - (FRAME_HEIGHT / 2), var_y, GATE_SIGMA)
+            gain_scale = distance_gain_scale(distance_mm) if distance_mm else 1.0
+            self.steer(error_pan, error_tilt, gain_scale)
+        else:
+            self.steer(None, None)
 
-# [修改] 使用正确、更高级的 MobileNetDetectionNetwork 节点
-detection_nn = pipeline.create(dai.node.MobileNetDetectionNetwork)
-detection_nn.setBlobPath("face-detection-retail-0004_openvino_2022.1_4shave.blob")
-# 这个高级节点拥有 setConfidenceThreshold 方法，我们可以再次使用它！
-detection_nn.setConfidenceThreshold(CONFIDENCE_THRESHOLD)
-detection_nn.setNumInferenceThreads(2)
-detection_nn.input.setBlocking(False)
+    def no_target(self):
+        """
+        这一帧没有任何检测结果可用 (等待超时)。和追踪模式无关：只当作没看到目标，
+        不改变 locked_id，也不让主机端的多目标追踪把目标算作消失。
+        """
+        self.last_boxes = []
+        self.locked_bbox = None
+        self.steer(None, None)
 
-cam_rgb.preview.link(detection_nn.input)
+    def update_error(self, error_pan, error_tilt, confidence):
+        """
+        --device-script 模式：设备已经选好目标、算好归一化误差 (-1 ~ 1) 并做了死区，
+        主机只需要换算成像素误差。confidence 为 0 表示这一帧没有目标。
+        """
+        self.last_boxes = []
+        self.locked_bbox = None
+        if confidence > 0:
+            error_pan *= FRAME_WIDTH / 2
+            error_tilt *= FRAME_HEIGHT / 2
+            self.predicted_point = (FRAME_WIDTH / 2 + error_pan, FRAME_HEIGHT / 2 + error_tilt)
+            self.steer(error_pan, error_tilt)
+        else:
+            self.predicted_point = None
+            self.steer(None, None)
 
-xout_rgb = pipeline.create(dai.node.XLinkOut)
-xout_rgb.setStreamName("rgb")
-cam_rgb.preview.link(xout_rgb.input)
+    def steer(self, error_pan, error_tilt, gain_scale=1.0):
+        """用像素误差更新云台的目标角度；误差为 None 表示这一帧没有看到目标。"""
+        if error_pan is not None:
+            # --- 如果找到了目标 ---
+            self.frames_since_target_lost = 0
+            self.search_ended_frame = 0
+            self.last_seen_time = time.monotonic()
+            self.last_error = (error_pan, error_tilt)
+            self.search.found(self.last_seen_time)
+            if self.power is not None:
+                self.power.wake()
 
-xout_nn = pipeline.create(dai.node.XLinkOut)
-xout_nn.setStreamName("nn")
-detection_nn.out.link(xout_nn.input)
+            if self.saccading(self.last_seen_time):
+                # 扫视还在进行，画面里的目标位置是转动途中拍到的，先不修正
+                return
+            if self.start_saccade(error_pan, error_tilt):
+                return
 
-# --- 4. 主程序 (Main Program) ---
+            now = self.last_seen_time
+            if self.autotuners:
+                pan_adjustment = self.autotuners[0].update(now, error_pan)
+                tilt_adjustment = self.autotuners[1].update(now, error_tilt)
+                self.finish_autotune()
+            else:
+                # 上一次的目标角度已经超出限位时，积分不再朝同一方向累积
+                pan_saturated = not PAN_MIN_ANGLE <= self.target_pan_angle <= PAN_MAX_ANGLE
+                tilt_saturated = not TILT_MIN_ANGLE <= self.target_tilt_angle <= TILT_MAX_ANGLE
+                pan_adjustment = self.pan_pid.update(now, error_pan, pan_saturated) * gain_scale
+                tilt_adjustment = self.tilt_pid.update(now, error_tilt, tilt_saturated) * gain_scale
+
+            # 更新追踪的目标角度
+            self.target_pan_angle = self.servos.current_pan_angle - pan_adjustment
+            self.target_tilt_angle = self.servos.current_tilt_angle - tilt_adjustment
+        else:
+            # --- 如果没有找到目标 ---
+            self.saccade_target = None
+            # 重新看到目标时，积分和微分从头开始
+            self.pan_pid.reset()
+            self.tilt_pid.reset()
+            if self.autotuners and any(tuner.switch_times for tuner in self.autotuners):
+                # 继电器实验被打断：丢失目标的这段时间会被算进振荡周期，只能重新开始
+                print("[自动整定] 目标丢失，继电器实验重新开始")
+                for tuner in self.autotuners:
+                    tuner.reset()
+            self.frames_since_target_lost += 1
+            now = time.monotonic()
+            # 开机后还没见过目标时不搜索，只有“丢失”了目标才去找
+            if self.frames_since_target_lost == REACQUIRE_START_FRAMES and self.last_seen_time is not None:
+                self.predicted_point = None
+                pan_direction, tilt_direction = self.search_direction()
+                self.search.start(now, self.servos.current_pan_angle, self.servos.current_tilt_angle,
+                                  pan_direction, tilt_direction, self.last_seen_time)
+            if self.search.active:
+                # 搜索图案按时间生成，每次只算出此刻的目标角度，不会阻塞检测循环
+                search_target = self.search.step(now)
+                if search_target is not None:
+                    self.target_pan_angle, self.target_tilt_angle = search_target
+                else:
+                    # 搜索超时，复位到中心
+                    self.target_pan_angle = PAN_CENTER_ANGLE
+                    self.target_tilt_angle = TILT_CENTER_ANGLE
+                    self.search_ended_frame = self.frames_since_target_lost
+
+        # 搜索超时的那一帧 frames_since_target_lost 早已超过 IDLE_THRESHOLD_FRAMES，
+        # 所以还要从复位那一帧再数 IDLE_AFTER_RESET_FRAMES 帧，先把中心目标交给控制线程
+        if (self.power is not None and self.frames_since_target_lost > IDLE_THRESHOLD_FRAMES
+                and not self.search.active
+                and self.frames_since_target_lost - self.search_ended_frame > IDLE_AFTER_RESET_FRAMES):
+            # 空闲时已经复位到中心，不再给控制线程发新目标 (否则会重新给舵机上电)
+            self.power.enter_idle()
+            return
+
+        # 轨迹规划和写舵机都交给固定频率的控制线程
+        self.control.set_target(self.target_pan_angle, self.target_tilt_angle)
+
+    def finish_autotune(self):
+        """两个轴的继电器实验都完成后，计算并保存增益，之后改用新的 PID 追踪。"""
+        if not all(tuner.done for tuner in self.autotuners):
+            return
+        gains = {}
+        for axis, tuner in zip(("pan", "tilt"), self.autotuners):
+            ku, tu = tuner.result()
+            gains[axis] = tuner.gains(self.autotune_rule)
+            print(f"[自动整定] {axis}: Ku = {ku:.4f} 度/像素, Tu = {tu:.3f} 秒")
+        save_gains(gains)
+        self.pan_pid = load_gains("pan", PAN_P_GAIN)
+        self.tilt_pid = load_gains("tilt", TILT_P_GAIN)
+        self.autotuners = None
+
+    @property
+    def pixels_per_degree(self):
+        deg_x, deg_y = self.mapper.degrees_per_pixel()
+        return 1.0 / deg_x, 1.0 / deg_y
+
+    def start_saccade(self, error_pan, error_tilt):
+        """偏差足够大时，按几何关系一次算出绝对目标角度并快速转过去。返回是否开始了扫视。"""
+        if not self.saccade:
+            return False
+        angle_pan, angle_tilt = self.mapper.pixel_to_angle(FRAME_WIDTH / 2 + error_pan, FRAME_HEIGHT / 2 + error_tilt)
+        if max(abs(angle_pan), abs(angle_tilt)) <= SACCADE_THRESHOLD_DEG:
+            return False
+        # 与 P 控制的方向一致：目标在右 (下) 边时 pan (tilt) 角度减小
+        self.target_pan_angle = self.servos.current_pan_angle - angle_pan
+        self.target_tilt_angle = self.servos.current_tilt_angle - angle_tilt
+        self.saccade_target = (self.target_pan_angle, self.target_tilt_angle)
+        self.saccade_deadline = self.last_seen_time + SACCADE_TIMEOUT_S
+        self.saccades += 1
+        self.pan_pid.reset()
+        self.tilt_pid.reset()
+        self.control.set_target(self.target_pan_angle, self.target_tilt_angle, SACCADE_LIMITS)
+        return True
+
+    def saccading(self, now):
+        """扫视是否还在进行：舵机还没到位并且没有超时。"""
+        if self.saccade_target is None:
+            return False
+        # 目标角度可能超出限位，按控制线程限幅后的角度判断是否到位
+        pan = max(PAN_MIN_ANGLE, min(PAN_MAX_ANGLE, self.saccade_target[0]))
+        tilt = max(TILT_MIN_ANGLE, min(TILT_MAX_ANGLE, self.saccade_target[1]))
+        settled = (abs(self.servos.current_pan_angle - pan) < SACCADE_SETTLE_DEG
+                   and abs(self.servos.current_tilt_angle - tilt) < SACCADE_SETTLE_DEG)
+        if settled or now > self.saccade_deadline:
+            self.saccade_target = None
+            return False
+        return True
+
+    def search_direction(self):
+        """
+        目标离开的方向 -> 云台应该转的方向 (-1/0/1，角度增大为 1)。
+        优先用估计器给出的速度，速度太小时用目标最后所在的一侧。
+        误差为正 (目标在右/下) 时角度要减小，所以方向取反。
+        """
+        vx, vy = self.estimator.velocity() if self.estimator.initialized else (0.0, 0.0)
+        directions = []
+        for velocity, error in ((vx, self.last_error[0]), (vy, self.last_error[1])):
+            if abs(velocity) > REACQUIRE_MIN_VELOCITY_PX_S:
+                directions.append(-1 if velocity > 0 else 1)
+            elif abs(error) > REACQUIRE_MIN_OFFSET_PIXELS:
+                directions.append(-1 if error > 0 else 1)
+            else:
+                directions.append(0)
+        return directions
+
+    def overlay(self):
+        """
+        拷贝一份画叠加信息需要的状态。显示线程只用这份快照，
+        不会读到追踪线程正在修改的检测框和角度。
+        """
+        return {
+            "boxes": list(self.last_boxes),
+            "locked_id": self.locked_id,
+            "locked_bbox": tuple(self.locked_bbox) if self.locked_bbox is not None else None,
+            "locked_distance": self.locked_distance,
+            "predicted_point": self.predicted_point,
+            "pan": self.servos.current_pan_angle,
+            "tilt": self.servos.current_tilt_angle,
+        }
+
+def draw_overlay(frame, overlay):
+    """把 FaceTracker.overlay() 的快照画到画面上。在显示线程里调用。"""
+    for xmin, ymin, xmax, ymax, track_id in overlay["boxes"]:
+        if track_id != overlay["locked_id"]:
+            cv2.rectangle(frame, (int(xmin*FRAME_WIDTH), int(ymin*FRAME_HEIGHT)),
+                                 (int(xmax*FRAME_WIDTH), int(ymax*FRAME_HEIGHT)), (128, 128, 128), 1)
+
+    bbox = overlay["locked_bbox"]
+    if bbox is not None:
+        target_x = int((bbox[0] + bbox[2]) * FRAME_WIDTH / 2)
+        target_y = int((bbox[1] + bbox[3]) * FRAME_HEIGHT / 2)
+        cv2.rectangle(frame, (int(bbox[0]*FRAME_WIDTH), int(bbox[1]*FRAME_HEIGHT)),
+                             (int(bbox[2]*FRAME_WIDTH), int(bbox[3]*FRAME_HEIGHT)), (255, 0, 0), 2)
+        cv2.circle(frame, (target_x, target_y), 5, (0, 255, 0), -1)
+        label = f"ID {overlay['locked_id']}"
+        if overlay["locked_distance"]:
+            label += f" {overlay['locked_distance'] / 1000:.2f}m"
+        cv2.putText(frame, label, (int(bbox[0]*FRAME_WIDTH), int(bbox[1]*FRAME_HEIGHT) - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 0), 1)
+
+    predicted_point = overlay["predicted_point"]
+    if predicted_point is not None:
+        cv2.circle(frame, (int(predicted_point[0]), int(predicted_point[1])), 3, (0, 255, 255), -1)
+
+    cv2.putText(frame, f"Pan: {int(overlay['pan'])} Tilt: {int(overlay['tilt'])}",
+                (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+class DisplayThread(threading.Thread):
+    """
+    在单独的线程里画叠加信息、显示画面。
+
+    追踪循环只调用 submit() 把最新的一帧放进容量为 1 的槽里，从不等待显示；
+    这个线程按 DISPLAY_FPS 取走槽里最新的一帧，其余的帧直接丢掉。
+    X 服务器再慢也只会让显示掉帧，不会拖慢舵机控制。
+    OpenCV 的窗口函数 (imshow / waitKey) 只在这个线程里调用。
+    """
+    def __init__(self, fps=DISPLAY_FPS):
+        super().__init__(daemon=True)
+        self.period = 1.0 / fps
+        self.slot = queue.Queue(maxsize=1)
+        self.stop_event = threading.Event()
+        # 用户在窗口里按了 'q'
+        self.quit_requested = threading.Event()
+        self.shown = 0
+        self.dropped = 0
+
+    def submit(self, frame, overlay):
+        """放入最新的一帧 (和它的叠加信息)。如果上一帧还没被显示，就把它丢掉。"""
+        try:
+            self.slot.get_nowait()
+            self.dropped += 1
+        except queue.Empty:
+            pass
+        self.slot.put_nowait((frame, overlay))
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+    def stats(self):
+        return f"显示 {self.shown} 帧, 丢弃 {self.dropped} 帧 (上限 {1.0 / self.period:.0f} fps)"
+
+    def run(self):
+        next_deadline = time.perf_counter() + self.period
+        while not self.stop_event.is_set():
+            # waitKey 既处理窗口事件，又把显示频率限制在 DISPLAY_FPS
+            wait_ms = max(1, int((next_deadline - time.perf_counter()) * 1000))
+            if cv2.waitKey(wait_ms) == ord('q'):
+                self.quit_requested.set()
+            next_deadline = max(next_deadline + self.period, time.perf_counter())
+
+            try:
+                frame, overlay = self.slot.get_nowait()
+            except queue.Empty:
+                continue
+            draw_overlay(frame, overlay)
+            cv2.imshow("RGB Camera", frame)
+            self.shown += 1
+        cv2.destroyAllWindows()
+
+def report_usage(mode, cpu_meter, sync=None):
+    print(f"[{mode}] 主机CPU占用: {cpu_meter.percent():.1f}%, "
+          f"RGB XLink 流量: {cpu_meter.rgb_megabytes_per_second():.2f} MB/s")
+    if sync is not None:
+        print(f"[{mode}] 画面/检测同步: {sync.stats()}")
+
+def report_first_detection(startup):
+    """第一条检测结果处理完 (第一条追踪指令已经交给控制线程) 时打印启动计时。"""
+    if startup is not None and startup.mark_once("第一条检测结果"):
+        startup.report()
+
+def frame_bytes(in_rgb):
+    # 预览是 3 通道 8 位图像；用尺寸计算，不去碰图像数据本身
+    return in_rgb.getWidth() * in_rgb.getHeight() * 3
+
+def run_polling(device, tracker, cpu_meter, display=None, config=TRACKER_PIPELINE_CONFIG, startup=None):
+    """
+    原来的轮询循环：不停地 tryGet()，即使没有新数据也会占满一个CPU核。保留用于对比。
+    display 为 None 时是无头模式。startup 不为 None 时，处理第一条检测结果后打印启动计时。
+    """
+    q_rgb = None if display is None else device.getOutputQueue(name="rgb", maxSize=config.rgb_queue_size,
+                                                               blocking=False)
+    q_nn = device.getOutputQueue(name="nn", maxSize=config.nn_queue_size, blocking=False)
+    # 有画面时，只处理序列号能配上的 (画面, 检测结果)，保证画的框属于这一帧
+    sync = None if display is None else SequenceSync(("rgb", "nn"))
+    last_report = time.perf_counter()
+
+    while True:
+        in_nn = q_nn.tryGet()
+        if sync is None:
+            # 每条检测结果只处理一次：丢失目标的帧数等计数按帧累计，而不是按循环次数
+            if in_nn is not None:
+                tracker.process(in_nn)
+                report_first_detection(startup)
+        else:
+            matched = None
+            in_rgb = q_rgb.tryGet()
+            if in_rgb is not None:
+                cpu_meter.rgb_bytes += frame_bytes(in_rgb)
+                matched = sync.add("rgb", in_rgb)
+            if in_nn is not None:
+                matched = sync.add("nn", in_nn) or matched
+            if matched is not None:
+                in_rgb, in_nn = matched
+                tracker.process(in_nn)
+                report_first_detection(startup)
+                display.submit(frame_view(in_rgb), tracker.overlay())
+
+            if display.quit_requested.is_set():
+                break
+
+        if time.perf_counter() - last_report > CPU_REPORT_INTERVAL_S:
+            report_usage("轮询模式", cpu_meter, sync)
+            last_report = time.perf_counter()
+
+    return sync
+
+def run_event_driven(device, tracker, cpu_meter, display=None, config=TRACKER_PIPELINE_CONFIG, startup=None):
+    """
+    事件驱动循环：只有当设备送来新的 ImgDetections 时才醒来。
+
+    depthai 在自己的线程里调用回调，回调只把最新的一条消息放进一个
+    容量为 1 的队列；主线程在这个队列上阻塞等待 (带超时)，所以没有新数据时不占CPU。
+    画面交给 display 线程显示，display 为 None 时是无头模式。
+    startup 不为 None 时，处理第一条检测结果后打印启动计时。
+    """
+    q_rgb = None if display is None else device.getOutputQueue(name="rgb", maxSize=config.rgb_queue_size,
+                                                               blocking=False)
+    q_nn = device.getOutputQueue(name="nn", maxSize=config.nn_queue_size, blocking=False)
+    sync = None if display is None else SequenceSync(("rgb", "nn"))
+    nn_events = queue.Queue(maxsize=1)
+
+    def on_nn(msg):
+        # 只保留最新的一条：如果主线程还没取走上一条，就把旧的丢掉
+        try:
+            nn_events.get_nowait()
+        except queue.Empty:
+            pass
+        nn_events.put_nowait(msg)
+
+    q_nn.addCallback(on_nn)
+    last_report = time.perf_counter()
+
+    while True:
+        try:
+            in_nn = nn_events.get(timeout=NN_WAIT_TIMEOUT_S)
+        except queue.Empty:
+            in_nn = None
+
+        if in_nn is None:
+            # 等不到任何检测结果 (例如 NN 卡顿)，按“这一帧没看到目标”处理一次。
+            # 不经过主机端的多目标关联，锁定的 ID 保持不变，恢复后还是跟原来的人
+            tracker.no_target()
+        elif sync is None:
+            tracker.process(in_nn)
+            report_first_detection(startup)
+        else:
+            # 画面通常比对应的检测结果先到，把已经到达的画面都放进同步器再配对
+            matched = None
+            for in_rgb in q_rgb.tryGetAll():
+                cpu_meter.rgb_bytes += frame_bytes(in_rgb)
+                matched = sync.add("rgb", in_rgb) or matched
+            matched = sync.add("nn", in_nn) or matched
+            if matched is not None:
+                in_rgb, in_nn = matched
+                tracker.process(in_nn)
+                report_first_detection(startup)
+                display.submit(frame_view(in_rgb), tracker.overlay())
+
+        if display is not None and display.quit_requested.is_set():
+            break
+
+        if time.perf_counter() - last_report > CPU_REPORT_INTERVAL_S:
+            report_usage("事件驱动模式", cpu_meter, sync)
+            last_report = time.perf_counter()
+
+    return sync
+
+# --- 5. 主程序 (Main Program) ---
 if __name__ == "__main__":
-    # 确保顶部的配置区已经定义了 TARGET_LOST_THRESHOLD_FRAMES = 30
-    
+    parser = argparse.ArgumentParser(description="OAK-D 人脸追踪云台")
+    parser.add_argument("--poll", action="store_true",
+                        help="使用原来的 tryGet() 轮询循环 (用于对比CPU占用)")
+    parser.add_argument("--headless", action="store_true",
+                        help="无头模式：不传输RGB画面、不绘制、不开窗口，只用检测结果驱动舵机 (Ctrl+C 退出)")
+    device_mode = parser.add_mutually_exclusive_group()
+    device_mode.add_argument("--device-tracker", action="store_true",
+                             help="在设备上用 ObjectTracker 追踪目标，NN 降频运行")
+    device_mode.add_argument("--device-script", action="store_true",
+                             help="在设备上用 Script 节点选目标并算误差，只把误差发给主机")
+    device_mode.add_argument("--roi", action="store_true",
+                             help="两级检测：锁定远处的小目标后，NN 改看全分辨率画面里目标周围的局部窗口")
+    parser.add_argument("--nn-decimation", type=int, default=DEVICE_TRACKER_NN_DECIMATION,
+                        help=f"--device-tracker 时每几帧运行一次NN，默认 {DEVICE_TRACKER_NN_DECIMATION}")
+    parser.add_argument("--spatial", action="store_true",
+                        help="使用双目深度：优先追踪最近的人脸，并按距离调整增益")
+    parser.add_argument("--dump-pipeline", metavar="PATH",
+                        help="只构建管道并把序列化结果写入 PATH (JSON)，不连接设备和舵机，用于离线检查")
+    parser.add_argument("--estimator", choices=sorted(ESTIMATORS), default=ESTIMATOR,
+                        help=f"目标位置估计器，默认 {ESTIMATOR}")
+    parser.add_argument("--control-rate", type=float, default=CONTROL_RATE_HZ,
+                        help=f"舵机控制线程的频率 (Hz)，默认 {CONTROL_RATE_HZ}")
+    parser.add_argument("--display-fps", type=float, default=DISPLAY_FPS,
+                        help=f"画面显示的帧率上限，默认 {DISPLAY_FPS:.0f} (显示跟不上时丢帧，不影响控制)")
+    parser.add_argument("--no-saccade", action="store_true",
+                        help="不使用相机内参做大角度扫视，只用 P 控制 (用于对比捕获时间)")
+    parser.add_argument("--no-ego-motion", action="store_true",
+                        help="不扣除云台自身转动造成的画面移动 (用于对比振荡)")
+    parser.add_argument("--imu", action="store_true",
+                        help="使用相机里的陀螺仪，在两次检测之间用前馈抵消基座的振动和转动")
+    parser.add_argument("--imu-log", metavar="PATH",
+                        help="--imu 时把陀螺仪原始数据记录到 CSV，可以用 imu_stabilizer.py --csv 回放")
+    parser.add_argument("--autotune", nargs="?", const=DEFAULT_TUNING_RULE, choices=sorted(TUNING_RULES),
+                        help="对着一张静止的脸做继电器实验，整定 PID 并写入 pid_gains.json (云台会来回摆动几秒)，"
+                             f"之后用新增益继续追踪。可选整定规则，默认 {DEFAULT_TUNING_RULE}")
+    args = parser.parse_args()
+    if args.roi and args.spatial:
+        # 局部窗口的检测框和对齐到全画面的深度图对不上
+        parser.error("--roi 不能和 --spatial 一起使用")
+
+    startup = StartupTimer()
+    config = TRACKER_PIPELINE_CONFIG
+    pipeline = get_pipeline(config, create_pipeline, headless=args.headless, device_tracker=args.device_tracker,
+                            nn_decimation=args.nn_decimation, device_script=args.device_script,
+                            spatial=args.spatial, imu=args.imu, roi=args.roi)
+    startup.mark("管道构建")
+    if args.dump_pipeline:
+        with open(args.dump_pipeline, "w") as f:
+            json.dump(pipeline.serializeToJson(), f, indent=2)
+        print(f"管道已写入 {args.dump_pipeline}")
+        exit()
+
+    # 【修改】设备启动 (上传固件和管道) 放到后台，和舵机初始化、归中等待同时进行
+    boot = DeviceBoot(pipeline)
     servos = ServoController(PCA9685_CHANNELS, PAN_CHANNEL, TILT_CHANNEL)
     servos.center_all()
-    time.sleep(1)
-
-    with dai.Device(pipeline) as device:
-        q_rgb = device.getOutputQueue(name="rgb", maxSize=4, blocking=False)
-        q_nn = device.getOutputQueue(name="nn", maxSize=4, blocking=False)
-        frame = None
-        detections = []
-        
-        target_pan_angle = PAN_CENTER_ANGLE
-        target_tilt_angle = TILT_CENTER_ANGLE
-        
-        # 【新增】目标丢失帧数计数器
-        frames_since_target_lost = 0
-
-        print("追踪程序启动，按 'q' 退出。")
-        
-        while True:
-            in_rgb = q_rgb.tryGet()
-            in_nn = q_nn.tryGet()
+    servos_centered = time.monotonic()
+    startup.mark("舵机归中")
 
-            if in_rgb is not None:
-                frame = in_rgb.getCvFrame()
+    # 自身运动补偿和 IMU 前馈都需要知道舵机的实际角度
+    gimbal = None
+    if not args.no_ego_motion or args.imu:
+        gimbal = GimbalModel(servos.current_pan_angle, servos.current_tilt_angle)
+        servos.record_writes(gimbal)
+    stabilizer = ImuStabilizer(gimbal, args.imu_log) if args.imu else None
+    control = ControlThread(servos, args.control_rate, stabilizer)
 
-            if in_nn is not None:
-                detections = in_nn.detections
-
-            if frame is not None and len(detections) > 0:
-                # --- 如果找到了目标 ---
-                # 【修改】将丢失计数器清零
-                frames_since_target_lost = 0
-                
-                target = detections[0]
-                
-                bbox = target.xmin, target.ymin, target.xmax, target.ymax
-                target_x = int((bbox[0] + bbox[2]) * FRAME_WIDTH / 2)
-                target_y = int((bbox[1] + bbox[3]) * FRAME_HEIGHT / 2)
-
-                error_pan = target_x - (FRAME_WIDTH / 2)
-                error_tilt = target_y - (FRAME_HEIGHT / 2)
-
-                if abs(error_pan) < ERROR_DEADBAND_PIXELS: error_pan = 0
-                if abs(error_tilt) < ERROR_DEADBAND_PIXELS: error_tilt = 0
-                
-                pan_adjustment = error_pan * PAN_P_GAIN
-                tilt_adjustment = error_tilt * TILT_P_GAIN
-                
-                # 更新追踪的目标角度
-                target_pan_angle = servos.current_pan_angle - pan_adjustment
-                target_tilt_angle = servos.current_tilt_angle - tilt_adjustment
-
-                # 绘制信息
-                cv2.rectangle(frame, (int(bbox[0]*FRAME_WIDTH), int(bbox[1]*FRAME_HEIGHT)), 
-                                     (int(bbox[2]*FRAME_WIDTH), int(bbox[3]*FRAME_HEIGHT)), (255, 0, 0), 2)
-                cv2.circle(frame, (target_x, target_y), 5, (0, 255, 0), -1)
+    with boot.result() as device:
+        startup.mark("设备就绪")
+        # 设备启动通常比 SERVO_SETTLE_S 长，这里一般不需要再等
+        settle = SERVO_SETTLE_S - (time.monotonic() - servos_centered)
+        if settle > 0:
+            time.sleep(settle)
+        power = PowerManager(device, control)
+        mapper = PixelAngleMapper.from_device(device, (FRAME_WIDTH, FRAME_HEIGHT))
+        roi = None
+        if args.roi:
+            roi = RoiProjector()
+            device.getOutputQueue(name="roi", maxSize=8, blocking=False).addCallback(roi.on_roi)
+        tracker = FaceTracker(servos, control, args.estimator, args.spatial, power, mapper,
+                              saccade=not args.no_saccade, gimbal=None if args.no_ego_motion else gimbal,
+                              autotune_rule=args.autotune, roi=roi)
+        cpu_meter = CpuUsageMeter()
 
+        if stabilizer is not None:
+            q_imu = device.getOutputQueue(name="imu", maxSize=50, blocking=False)
+            q_imu.addCallback(stabilizer.on_imu)
+            # 舵机还静止在中心，等陀螺仪零偏标定完再开始控制
+            deadline = time.monotonic() + IMU_CALIBRATION_TIMEOUT_S
+            while not stabilizer.calibrated and time.monotonic() < deadline:
+                time.sleep(0.05)
+            if not stabilizer.calibrated:
+                print("警告: 没有收到足够的陀螺仪数据，IMU 前馈不会生效。")
+        control.start()
+        display = None if args.headless else DisplayThread(args.display_fps)
+        if display is not None:
+            display.start()
+
+        if args.autotune:
+            print("自动整定：请让一个人正对相机保持不动，云台会左右上下摆动，完成后自动保存增益。")
+        if args.headless:
+            print("追踪程序启动 (无头模式)，按 Ctrl+C 退出。")
+        else:
+            print("追踪程序启动，按 'q' 退出。")
+
+        sync = None
+        try:
+            if args.poll:
+                sync = run_polling(device, tracker, cpu_meter, display, config, startup)
             else:
-                # --- 如果没有找到目标 ---
-                # 【修改】将丢失计数器加一
-                frames_since_target_lost += 1
-
-            # 【修改】只有当目标持续丢失超过阈值时，才执行复位
-            if frames_since_target_lost > TARGET_LOST_THRESHOLD_FRAMES:
-                target_pan_angle = PAN_CENTER_ANGLE
-                target_tilt_angle = TILT_CENTER_ANGLE
-
-            # 平滑逻辑保持不变，它会平滑地朝向最新的 target_angle 移动
-            new_pan = servos.current_pan_angle + (target_pan_angle - servos.current_pan_angle) * SMOOTHING_FACTOR
-            new_tilt = servos.current_tilt_angle + (target_tilt_angle - servos.current_tilt_angle) * SMOOTHING_FACTOR
-            
-            servos.set_pan(new_pan)
-            servos.set_tilt(new_tilt)
-
-            if frame is not None:
-                cv2.putText(frame, f"Pan: {int(servos.current_pan_angle)} Tilt: {int(servos.current_tilt_angle)}", 
-                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                cv2.imshow("RGB Camera", frame)
-
-            if cv2.waitKey(1) == ord('q'):
-                break
-    
-    servos.center_all()
-    cv2.destroyAllWindows()
-    print("程序已退出。")
\ No newline at end of file
+                sync = run_event_driven(device, tracker, cpu_meter, display, config, startup)
+        except KeyboardInterrupt:
+            print("\n检测到手动中断。")
+        finally:
+            control.stop()
+            control.report_jitter()
+            print(f"[舵机] {servos.driver.stats()}")
+            print(f"[执行线程] {servos.actuator.stats()}")
+            if display is not None:
+                display.stop()
+                print(f"[显示] {display.stats()}")
+            print(f"[重新捕获] {tracker.search.stats()}")
+            print(f"[扫视] {tracker.saccades} 次")
+            if roi is not None:
+                print(f"[局部检测] {roi.stats()}")
+            if tracker.autotuners:
+                print("[自动整定] 实验没有完成，没有保存增益。")
+            if stabilizer is not None:
+                stabilizer.close()
+                print(f"[IMU] {stabilizer.stats()}")
+
+        mode = "轮询模式" if args.poll else "事件驱动模式"
+        if args.headless:
+            mode += ", 无头"
+        report_usage(mode, cpu_meter, sync)
+
+    # 【修改】沿轨迹平稳地回到中心，而不是一步跳过去
+    servos.move_to(PAN_CENTER_ANGLE, TILT_CENTER_ANGLE)
+    print("舵机已归中。")
+    servos.close()
+    print("程序已退出。")
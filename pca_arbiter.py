@@ -0,0 +1,275 @@
+import threading
+from pca_burst import enable_auto_increment, write_pwm
+
+# --- 1. 配置 (CONFIG) ---
+# 舵机用的 PCA9685 (地址 0x40，通道 0/1)。一块芯片只有一个预分频器，16 个通道共用同一个 PWM 频率，
+# 震动马达 (1000 Hz) 要和舵机同时使用时必须接在第二块芯片上，见 haptic_controller.HAPTIC_PCA9685_ADDRESS。
+PCA9685_ADDRESS = 0x40
+# PCA9685 的内部时钟 (Hz)，和 adafruit_pca9685 的 reference_clock_speed 默认值相同
+PCA9685_REFERENCE_CLOCK_HZ = 25000000
+# PRE_SCALE 寄存器的地址和上电默认值 (0x1E，约 200 Hz)。读到默认值说明还没有程序设置过频率
+PRESCALE_REGISTER = 0xFE
+PRESCALE_POWER_ON = 0x1E
+
+
+class PcaConflictError(RuntimeError):
+    """申请的通道已经被占用，或者同一块芯片上要求了不同的 PWM 频率。"""
+
+
+def frequency_to_prescale(frequency, reference_clock=PCA9685_REFERENCE_CLOCK_HZ):
+    """PWM 频率 -> PRE_SCALE 寄存器的值，算法和 adafruit_pca9685 的 frequency 属性相同。"""
+    return int(reference_clock / 4096.0 / frequency + 0.5) - 1
+
+
+# --- 2. 通道租约 (Channel Lease) ---
+class ChannelLease:
+    """
+    一个子系统 (舵机、震动马达) 在某块芯片上占用的几个通道。
+
+    frequency 是打开芯片时读到的实际 PWM 频率 (预分频取整后的值)，之后不再读寄存器。
+    write() 只检查通道是否属于这个租约，然后用 pca_burst.write_pwm() 写出，不会改动预分频器。
+    """
+    def __init__(self, arbiter, owner, address, channels, pca, frequency):
+        self.arbiter = arbiter
+        self.owner = owner
+        self.address = address
+        self.channels = frozenset(channels)
+        self.pca = pca
+        self.frequency = frequency
+
+    def write(self, regs_by_channel):
+        """regs_by_channel: {通道: (ON, OFF)}。返回用了几次 I2C 传输。"""
+        if not regs_by_channel.keys() <= self.channels:
+            raise PcaConflictError(f"{self.owner} 没有租用通道 {sorted(regs_by_channel.keys() - self.channels)}")
+        return write_pwm(self.pca, regs_by_channel)
+
+    def release(self):
+        self.arbiter.release(self)
+
+
+# --- 3. 进程内唯一的仲裁者 (Process-wide Arbiter) ---
+class PcaArbiter:
+    """
+    整个进程共用一个 I2C 句柄，每个地址的 PCA9685 只打开一次。
+
+    以前舵机 (50 Hz) 和 HapticController (1000 Hz) 各自新建 busio.I2C 和 PCA9685：
+    同一块芯片只有一个预分频器，后设置频率的一方会把另一方的 PWM 周期改掉，舵机的脉宽随之全部错位；
+    再次构造 PCA9685 还会复位 MODE1。现在由这里统一管理：
+
+    - lease() 按 (地址, 通道) 分配租约，通道已被占用时抛出 PcaConflictError；
+    - 芯片第一次被租用时设置频率，之后其他子系统在同一块芯片上要求不同的频率也抛出 PcaConflictError。
+      需要同时使用时，把震动马达接到第二块 PCA9685 (例如焊上 A0，地址 0x41)；
+    - 预分频器只在打开芯片时读一次、必要时写一次 (adafruit 的 frequency 设置要让芯片睡眠再重启，约 5 ms)，
+      租约的 write() 里不会再碰它。
+
+    这个仲裁者只能看到本进程里的租约。另一个程序 (例如追踪时单独运行的 haptic_controller.py)
+    用的是同一块芯片时，只能从芯片本身判断：打开芯片前先读 PRE_SCALE，既不是上电默认值、
+    也不是要求的频率，就说明别的程序正在 (或曾经) 以另一个频率使用它，这时拒绝打开而不是改写。
+    确认没有程序在用之后，可以用 `python pca_arbiter.py --reset 0x40` 恢复上电默认值。
+    """
+    def __init__(self, i2c=None, pca_class=None):
+        self._i2c = i2c
+        self.pca_class = pca_class
+        self.lock = threading.Lock()
+        # 地址 -> (PCA9685, 频率 Hz, 实际频率)
+        self.chips = {}
+        # (地址, 通道) -> 租约
+        self.leases = {}
+
+    @property
+    def i2c(self):
+        if self._i2c is None:
+            import board
+            self._i2c = board.I2C()
+        return self._i2c
+
+    def _read_prescale(self, address):
+        """不构造 PCA9685 (构造时会复位 MODE1，影响正在用这块芯片的其他程序)，直接读 PRE_SCALE。"""
+        i2c = self.i2c
+        buffer = bytearray(1)
+        while not i2c.try_lock():
+            pass
+        try:
+            i2c.writeto_then_readfrom(address, bytes([PRESCALE_REGISTER]), buffer)
+        except OSError as e:
+            # 和 adafruit 的 I2CDevice 一样，地址上没有设备时抛出 ValueError，调用方原有的提示照常生效
+            raise ValueError(f"No I2C device at address: 0x{address:02x}") from e
+        finally:
+            i2c.unlock()
+        return buffer[0]
+
+    def _open_chip(self, owner, address, frequency):
+        prescale = self._read_prescale(address)
+        if prescale not in (PRESCALE_POWER_ON, frequency_to_prescale(frequency)):
+            current = PCA9685_REFERENCE_CLOCK_HZ / 4096 / (prescale + 1)
+            raise PcaConflictError(
+                f"{owner} 需要 {frequency} Hz，但 PCA9685 0x{address:02x} 已经被设为 {current:.0f} Hz，"
+                f"可能有别的程序正在使用它：请把 {owner} 接到另一块 PCA9685；"
+                f"确认没有程序在用之后，可以运行 python pca_arbiter.py --reset 0x{address:02x} 恢复上电默认值")
+        pca_class = self.pca_class
+        if pca_class is None:
+            from adafruit_pca9685 import PCA9685
+            pca_class = PCA9685
+        pca = pca_class(self.i2c, address=address)
+        # 上一次运行已经设成同样的频率时不再重新设置
+        if prescale != frequency_to_prescale(frequency):
+            pca.frequency = frequency
+        enable_auto_increment(pca)
+        return pca, frequency, pca.frequency
+
+    def lease(self, owner, channels, frequency, address=PCA9685_ADDRESS):
+        """为 owner 租用 address 上的 channels，要求芯片工作在 frequency (Hz)。"""
+        channels = tuple(channels)
+        with self.lock:
+            for channel in channels:
+                holder = self.leases.get((address, channel))
+                if holder is not None:
+                    raise PcaConflictError(f"PCA9685 0x{address:02x} 的通道 {channel} 已经被 {holder.owner} 占用")
+            chip = self.chips.get(address)
+            if chip is None:
+                chip = self._open_chip(owner, address, frequency)
+                self.chips[address] = chip
+            pca, chip_frequency, actual_frequency = chip
+            if chip_frequency != frequency:
+                users = sorted({lease.owner for (a, _), lease in self.leases.items() if a == address})
+                raise PcaConflictError(
+                    f"{owner} 需要 {frequency} Hz，但 PCA9685 0x{address:02x} 已经由 {', '.join(users) or '其他子系统'} "
+                    f"设为 {chip_frequency} Hz；一块芯片只有一个预分频器，请把 {owner} 接到另一块 PCA9685 (例如 0x41)")
+            lease = ChannelLease(self, owner, address, channels, pca, actual_frequency)
+            for channel in channels:
+                self.leases[(address, channel)] = lease
+            return lease
+
+    def release(self, lease):
+        """归还通道。芯片保持打开，频率不变。"""
+        with self.lock:
+            for channel in lease.channels:
+                if self.leases.get((lease.address, channel)) is lease:
+                    del self.leases[(lease.address, channel)]
+
+    def describe(self):
+        with self.lock:
+            lines = []
+            for address, (_, frequency, actual) in sorted(self.chips.items()):
+                users = {}
+                for (a, channel), lease in sorted(self.leases.items()):
+                    if a == address:
+                        users.setdefault(lease.owner, []).append(channel)
+                owners = ", ".join(f"{owner} {channels}" for owner, channels in users.items()) or "无"
+                lines.append(f"PCA9685 0x{address:02x}: {frequency} Hz (实际 {actual:.2f} Hz), 通道 {owners}")
+            return "\n".join(lines)
+
+
+_arbiter = None
+_arbiter_lock = threading.Lock()
+
+
+def get_arbiter():
+    """进程内唯一的 PcaArbiter，第一次调用时创建 (I2C 句柄在第一次租用时才打开)。"""
+    global _arbiter
+    with _arbiter_lock:
+        if _arbiter is None:
+            _arbiter = PcaArbiter()
+        return _arbiter
+
+
+def reset_chip(address, i2c=None):
+    """关掉 address 上所有通道，把预分频器恢复成上电默认值。只在确认没有程序在用这块芯片时调用。"""
+    from adafruit_pca9685 import PCA9685
+    if i2c is None:
+        import board
+        i2c = board.I2C()
+    pca = PCA9685(i2c, address=address)
+    for channel in pca.channels:
+        channel.duty_cycle = 0
+    # PRE_SCALE 只能在睡眠模式 (MODE1 的 SLEEP 位) 下写入
+    pca.mode1_reg = 0x10
+    pca.prescale_reg = PRESCALE_POWER_ON
+    pca.mode1_reg = 0x00
+    pca.deinit()
+
+
+# --- 4. 主程序：不接硬件，演示租用和冲突检测 ---
+if __name__ == "__main__":
+    import sys
+
+    # python pca_arbiter.py --reset 0x40: 接着硬件，恢复芯片的上电默认频率
+    if len(sys.argv) == 3 and sys.argv[1] == "--reset":
+        address = int(sys.argv[2], 0)
+        reset_chip(address)
+        print(f"PCA9685 0x{address:02x} 已关闭所有通道，预分频器恢复为 0x{PRESCALE_POWER_ON:02x}")
+        sys.exit(0)
+
+    # 不接硬件时用一个字典代替芯片上的 PRE_SCALE 寄存器，两个"程序"共用它
+    chip_prescale = {}
+
+    class FakePCA:
+        """不接硬件的 PCA9685：记录预分频器被写了几次，I2C 写入直接丢掉。"""
+        def __init__(self, i2c, address):
+            self.address = address
+            self.mode1_reg = 0x11
+            self.prescale_writes = 0
+            self.i2c_device = self
+
+        @property
+        def prescale_reg(self):
+            return chip_prescale.get(self.address, PRESCALE_POWER_ON)
+
+        @property
+        def frequency(self):
+            return PCA9685_REFERENCE_CLOCK_HZ / 4096 / (self.prescale_reg + 1)
+
+        @frequency.setter
+        def frequency(self, frequency):
+            chip_prescale[self.address] = frequency_to_prescale(frequency)
+            self.prescale_writes += 1
+            self.mode1_reg |= 0xA0
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def write(self, buffer):
+            pass
+
+    class FakeI2C:
+        """只回答 PRE_SCALE 的读取。"""
+        def try_lock(self):
+            return True
+
+        def unlock(self):
+            pass
+
+        def writeto_then_readfrom(self, address, buffer_out, buffer_in):
+            buffer_in[0] = chip_prescale.get(address, PRESCALE_POWER_ON)
+
+    arbiter = PcaArbiter(i2c=FakeI2C(), pca_class=FakePCA)
+    servos = arbiter.lease("舵机", (0, 1), 50)
+    servos.write({0: (0, 307), 1: (0, 307)})
+    print(f"舵机租用通道 {sorted(servos.channels)}，实际频率 {servos.frequency:.2f} Hz")
+
+    for label, args in (("震动马达在同一块芯片上要求 1000 Hz", ("震动马达", (2, 3), 1000)),
+                        ("另一个子系统抢占舵机通道", ("校准", (1,), 50))):
+        try:
+            arbiter.lease(*args)
+        except PcaConflictError as e:
+            print(f"{label}: 拒绝 -> {e}")
+
+    haptics = arbiter.lease("震动马达", (2, 3), 1000, address=0x41)
+    try:
+        haptics.write({1: (0, 0)})
+    except PcaConflictError as e:
+        print(f"越权写入: 拒绝 -> {e}")
+    print(arbiter.describe())
+    print(f"预分频器写入次数: 0x40 {servos.pca.prescale_writes} 次, 0x41 {haptics.pca.prescale_writes} 次")
+
+    # 另一个程序有自己的仲裁者，看不到上面的租约，只能从芯片的 PRE_SCALE 发现冲突
+    other = PcaArbiter(i2c=FakeI2C(), pca_class=FakePCA)
+    try:
+        other.lease("震动马达 (另一个程序)", (2, 3), 1000, address=0x40)
+    except PcaConflictError as e:
+        print(f"另一个程序在舵机芯片上要求 1000 Hz: 拒绝 -> {e}")
+    other.lease("舵机 (另一个程序)", (4,), 50)
+    print(f"另一个程序以相同频率打开 0x40: 允许，0x40 的预分频器仍为 0x{chip_prescale[0x40]:02x}")
@@ -0,0 +1,126 @@
+import struct
+
+# --- 1. 配置 (CONFIG) ---
+# MODE1 寄存器的 AI 位打开后，连续写入时寄存器地址自动加 1
+MODE1_AI = 0x20
+# 通道 n 的 LEDn_ON_L, LEDn_ON_H, LEDn_OFF_L, LEDn_OFF_H 从 LED0_ON_L + 4n 开始
+LED0_ON_L = 0x06
+# ON 或 OFF 写 0x1000 (bit 12) 表示一直为高 / 一直为低
+FULL_ON = 0x1000
+FULL_OFF = 0x1000
+# 树莓派 I2C 默认 100 kHz，基准测试用它估算总线时间
+I2C_BUS_HZ = 100000
+
+
+# --- 2. 多通道一次写入 (Burst Write) ---
+def duty_to_regs(duty_cycle):
+    """16 位占空比 (0-65535) -> (ON, OFF) 计数值，特殊值的处理和 adafruit_pca9685 相同。"""
+    if duty_cycle >= 0xFFFF:
+        return FULL_ON, 0
+    if duty_cycle < 0x0010:
+        return 0, FULL_OFF
+    return 0, duty_cycle >> 4
+
+
+def enable_auto_increment(pca):
+    """
+    确认 MODE1 的自动递增位已经打开。adafruit_pca9685 设置 frequency 时会写 0xA0 (RESTART | AI)，
+    所以通常已经是打开的；这里只在初始化时读一次 MODE1。
+    """
+    mode1 = pca.mode1_reg
+    if not mode1 & MODE1_AI:
+        pca.mode1_reg = mode1 | MODE1_AI
+
+
+def write_pwm(pca, regs_by_channel):
+    """
+    写多个通道的 (ON, OFF)：编号相邻的通道合并成一次 I2C 传输，从第一个通道的 LEDn_ON_L 开始连续写。
+    返回用了几次传输。
+
+    逐个通道写 (PWMChannel.duty_cycle) 时每个通道一次传输，云台的两个轴会相差一次总线往返才更新。
+    PCA9685 默认在 STOP 时才更新输出，合并成一次传输后，这几个通道在同一时刻一起变化。
+    """
+    channels = sorted(regs_by_channel)
+    transactions = 0
+    start = 0
+    while start < len(channels):
+        end = start + 1
+        while end < len(channels) and channels[end] == channels[end - 1] + 1:
+            end += 1
+        run = channels[start:end]
+        buffer = bytearray(1 + 4 * len(run))
+        buffer[0] = LED0_ON_L + 4 * run[0]
+        for i, channel in enumerate(run):
+            struct.pack_into("<HH", buffer, 1 + 4 * i, *regs_by_channel[channel])
+        with pca.i2c_device as i2c:
+            i2c.write(buffer)
+        transactions += 1
+        start = end
+    return transactions
+
+
+def transaction_bits(data_bytes):
+    """一次写传输在总线上的位数：START + 地址字节 + 数据字节 (每字节 8 位 + ACK) + STOP。"""
+    return 1 + 9 * (1 + data_bytes) + 1
+
+
+# --- 3. 主程序：逐通道写入和一次写入的每秒更新次数 ---
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="PCA9685 多通道一次写入的基准测试")
+    parser.add_argument("--hardware", action="store_true",
+                        help="在真实的 PCA9685 上测 (会改变通道 0/1 的输出，请先断开舵机电源)")
+    parser.add_argument("--seconds", type=float, default=2.0, help="每种方式测多久")
+    args = parser.parse_args()
+
+    if args.hardware:
+        from servo_driver import lease_servos
+        # 仲裁者打开芯片时已经设好 50 Hz 并打开了自动递增
+        pca = lease_servos((0, 1)).pca
+    else:
+        class FakeBus:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def write(self, buffer):
+                pass
+
+        class FakePCA:
+            i2c_device = FakeBus()
+
+        pca = FakePCA()
+
+    def separate(regs):
+        # 和 PWMChannel.duty_cycle 一样，每个通道一次 5 字节的传输
+        for channel, value in regs.items():
+            write_pwm(pca, {channel: value})
+
+    def burst(regs):
+        write_pwm(pca, regs)
+
+    def measure(fn):
+        n = 0
+        start = time.perf_counter()
+        deadline = start + args.seconds
+        while time.perf_counter() < deadline:
+            fn({0: (0, 300 + n % 100), 1: (0, 300 + n % 50)})
+            n += 1
+        return n / (time.perf_counter() - start)
+
+    print("同时更新 pan/tilt 两个通道:")
+    for label, fn, sizes in (("逐通道写入", separate, [5, 5]), ("一次写入", burst, [9])):
+        rate = measure(fn)
+        bus_s = sum(transaction_bits(size) for size in sizes) / I2C_BUS_HZ
+        if args.hardware:
+            print(f"  {label}: {rate:7.0f} 次/秒 (实测)")
+        else:
+            print(f"  {label}: 主机端 {1e6 / rate:6.1f} 微秒/次, 总线 {bus_s * 1e6:5.0f} 微秒/次 "
+                  f"({len(sizes)} 次传输) -> 100 kHz 下最多约 {1 / (bus_s + 1 / rate):5.0f} 次/秒")
+    if not args.hardware:
+        print("估算不含每次传输的系统调用开销，实际差距更大；用 --hardware 实测。")
+        print(f"逐通道写入时两个轴相差一次传输: {transaction_bits(5) / I2C_BUS_HZ * 1e6:.0f} 微秒；一次写入时为 0")
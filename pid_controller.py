@@ -0,0 +1,278 @@
+import json
+import math
+import os
+
+# --- 1. 配置 (CONFIG) ---
+# 自动整定结果保存的位置 (和脚本放在一起)，追踪程序启动时读取
+PID_GAINS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pid_gains.json")
+# 微分项低通滤波的时间常数 (秒)。检测结果有几个像素的噪声，不滤波的微分项会让舵机抖动。
+DERIVATIVE_TAU_S = 0.05
+# 积分项最多贡献多少度的输出，防止目标长时间到不了 (例如在限位外) 时积分饱和
+INTEGRAL_LIMIT_DEG = 5.0
+# 继电器实验：输出 ±RELAY_AMPLITUDE_DEG，误差在 ±RELAY_HYSTERESIS_PIXELS 内不切换
+RELAY_AMPLITUDE_DEG = 2.0
+RELAY_HYSTERESIS_PIXELS = 4.0
+# 忽略前几个振荡周期 (还没稳定)，再用之后的几个周期求平均
+RELAY_SKIP_CYCLES = 2
+RELAY_MEASURE_CYCLES = 4
+# 整定规则: (Kp / Ku, Ti / Tu, Td / Tu)，Ti 为 None 表示不用积分项。
+# 云台本身是积分环节 (见 PID 的说明)，静止目标不需要积分项就没有稳态误差；
+# 积分项只在目标持续移动时减小滞后，代价是目标停下时会过冲。
+TUNING_RULES = {
+    # 默认：只有 P 项、不过冲。在模拟的云台上算出来的 kp ≈ 0.030，就是原来的 PAN_P_GAIN，
+    # 15 度阶跃的稳定时间 (0.6 秒) 和超调 (约 0.3 度) 也和原来一样：加大 Kp 或加 D 项只会过冲或变慢。
+    # 所以在模拟里它并不比原来的增益快；它的用处是在实机上按实测的 Ku 重新定 Kp
+    # (帧率、检测延迟、舵机和模拟不同时，0.03 不一定还是 0.4 Ku)。
+    "no_overshoot": (0.4, None, 0.0),
+    # 跟踪快速移动的目标：移动中滞后再减小约 15%，但阶跃和停下时会过冲 2-3 度
+    "tracking": (0.4, 2.0, 0.125),
+}
+DEFAULT_TUNING_RULE = "no_overshoot"
+# 整定结果对应的控制线程运动方式。云台的临界增益取决于控制线程怎样走向目标
+# (指数平滑时 Ku 约是现在按轨迹规划时的 3 倍)，运动方式变了以后旧的增益会让云台振荡，不再使用。
+ACTUATOR_MODEL = "trajectory"
+
+
+# --- 2. PID 控制器 (PID Controller) ---
+class PID:
+    """
+    单轴 PID，输入是像素误差，输出是“这一次要把目标角度从当前角度移开多少度”。
+
+    追踪程序每次都以舵机当前角度为基准设置目标 (target = current - 输出)，
+    控制线程再沿轨迹走过去，所以输出实际上决定的是舵机的转速，云台本身相当于一个积分环节。
+    只有 kp 时 (ki = kd = 0) 和原来的 PAN_P_GAIN / TILT_P_GAIN 完全一样。
+      积分项: 目标持续移动时补上跟踪滞后；有限幅，并且输出饱和时停止累积 (anti-windup)。
+      微分项: 对误差做一阶低通后再求导，抑制噪声。
+    """
+    def __init__(self, kp, ki=0.0, kd=0.0, derivative_tau=DERIVATIVE_TAU_S, integral_limit=INTEGRAL_LIMIT_DEG):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.derivative_tau = derivative_tau
+        self.integral_limit = integral_limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.last_error = None
+        self.last_time = None
+
+    def update(self, t, error, saturated=False):
+        """
+        t: 测量的时间 (秒)，error: 像素误差。
+        saturated: 上一次的目标角度已经被限位截断，这时不再朝同一方向累积积分。
+        """
+        dt = t - self.last_time if self.last_time is not None else 0.0
+        if dt > 0:
+            # 条件积分：饱和时只允许积分往回退
+            if not (saturated and error * self.integral > 0):
+                self.integral += error * dt
+                if self.ki > 0:
+                    limit = self.integral_limit / self.ki
+                    self.integral = max(-limit, min(limit, self.integral))
+            raw_derivative = (error - self.last_error) / dt
+            alpha = dt / (self.derivative_tau + dt)
+            self.derivative += (raw_derivative - self.derivative) * alpha
+        self.last_error = error
+        self.last_time = t
+        return self.kp * error + self.ki * self.integral + self.kd * self.derivative
+
+    def gains(self):
+        return {"kp": self.kp, "ki": self.ki, "kd": self.kd}
+
+
+def load_gains(axis, default_kp, path=PID_GAINS_PATH):
+    """读取某个轴 ("pan" / "tilt") 的 PID 增益；没有整定结果时只用 default_kp (等价于原来的 P 控制)。"""
+    try:
+        with open(path) as f:
+            gains = json.load(f)[axis]
+        if gains.get("actuator") != ACTUATOR_MODEL:
+            print(f"{axis} 的 PID 增益是按旧的舵机运动方式整定的，暂时只用 P 控制；请重新运行 --autotune")
+            return PID(default_kp)
+        print(f"{axis} 使用整定的 PID 增益: kp={gains['kp']:.4f} ki={gains['ki']:.4f} kd={gains['kd']:.4f}")
+        return PID(gains["kp"], gains["ki"], gains["kd"])
+    except (OSError, KeyError, ValueError):
+        return PID(default_kp)
+
+
+def save_gains(gains_by_axis, path=PID_GAINS_PATH):
+    """gains_by_axis: {"pan": {"kp":..., "ki":..., "kd":...}, "tilt": {...}}，只更新给出的轴。"""
+    try:
+        with open(path) as f:
+            existing = json.load(f)
+    except (OSError, ValueError):
+        existing = {}
+    existing.update({axis: dict(gains, actuator=ACTUATOR_MODEL) for axis, gains in gains_by_axis.items()})
+    with open(path, "w") as f:
+        json.dump(existing, f, indent=2)
+    print(f"PID 增益已写入 {path}")
+
+
+# --- 3. 继电器自动整定 (Relay Auto-tuning) ---
+class RelayAutoTuner:
+    """
+    继电器反馈实验 (Åström-Hägglund)：用 ±d 的开关输出代替控制器，
+    闭环会自己进入等幅振荡。测出振荡的幅值 a 和周期 Tu，
+    临界增益 Ku = 4d / (pi * a)，再按整定规则算出 PID 增益。
+    """
+    def __init__(self, amplitude=RELAY_AMPLITUDE_DEG, hysteresis=RELAY_HYSTERESIS_PIXELS):
+        self.amplitude = amplitude
+        self.hysteresis = hysteresis
+        self.reset()
+
+    def reset(self):
+        """丢掉已经测到的振荡，从头开始实验。目标丢失时调用：中断的时间不能算进振荡周期。"""
+        self.output = self.amplitude
+        self.switch_times = []
+        self.peak = 0.0
+        self.peaks = []
+
+    @property
+    def done(self):
+        return len(self.switch_times) > 2 * (RELAY_SKIP_CYCLES + RELAY_MEASURE_CYCLES)
+
+    def update(self, t, error):
+        """返回这一次的输出 (与 PID.update 相同的含义)。"""
+        self.peak = max(self.peak, abs(error))
+        # 误差为正 (目标在右/下) 时输出 +d，让云台朝目标转
+        if self.output < 0 and error > self.hysteresis:
+            self.switch(t, self.amplitude)
+        elif self.output > 0 and error < -self.hysteresis:
+            self.switch(t, -self.amplitude)
+        return self.output
+
+    def switch(self, t, output):
+        self.switch_times.append(t)
+        self.peaks.append(self.peak)
+        self.peak = 0.0
+        self.output = output
+
+    def result(self):
+        """返回 (Ku, Tu)：临界增益 (度/像素) 和振荡周期 (秒)。"""
+        skip = 2 * RELAY_SKIP_CYCLES
+        times = self.switch_times[skip:]
+        # 每两次切换是一个周期
+        periods = [b - a for a, b in zip(times, times[2:])]
+        tu = sum(periods) / len(periods)
+        a = sum(self.peaks[skip + 1:]) / len(self.peaks[skip + 1:])
+        ku = 4 * self.amplitude / (math.pi * a)
+        return ku, tu
+
+    def gains(self, rule=DEFAULT_TUNING_RULE):
+        """
+        按 TUNING_RULES 里的规则计算增益。没有用 Ziegler-Nichols 的表：那是给自平衡对象的，
+        用在云台这种积分对象上，“无超调”那一行在模拟里也会过冲 7 度。
+        """
+        ku, tu = self.result()
+        kp_ratio, ti_ratio, td_ratio = TUNING_RULES[rule]
+        kp = kp_ratio * ku
+        return {"kp": kp, "ki": kp / (ti_ratio * tu) if ti_ratio else 0.0, "kd": kp * td_ratio * tu}
+
+
+# --- 4. 模拟的云台 (Simulated Gimbal Axis) ---
+class SimulatedAxis:
+    """
+    用来离线整定和对比的单轴云台模型，结构和 oakd_servo_tracker.py 一样：
+    相机按帧率拍摄、检测结果延迟到达；每条检测结果让控制器算出输出，目标角度 = 当前角度 - 输出；
+    控制线程沿 trajectory 规划的轨迹走向目标，舵机按 servo_model 的速度和延迟模型转动。
+    """
+    def __init__(self, frame_rate=30.0, latency=0.07, pixels_per_degree=6.8, limits=None,
+                 control_rate=100.0, noise_pixels=0.0, seed=0):
+        import random
+        from servo_model import ServoAxisModel
+        from trajectory import AxisLimits, TRACKING_MAX_ACCEL_DEG_S2, TRACKING_MAX_SPEED_DEG_S
+        self.frame_rate = frame_rate
+        self.latency = latency
+        self.pixels_per_degree = pixels_per_degree
+        # 默认和 oakd_servo_tracker.py 的 TRACKING_LIMITS 相同
+        self.limits = limits or AxisLimits(TRACKING_MAX_SPEED_DEG_S, TRACKING_MAX_ACCEL_DEG_S2)
+        self.control_rate = control_rate
+        self.noise_pixels = noise_pixels
+        self.random = random.Random(seed)
+        self.make_servo = lambda: ServoAxisModel(0.0)
+
+    def run(self, controller, target_angle, duration):
+        """
+        controller(t, error) -> 输出 (度)；target_angle(t) -> 目标在世界坐标中的角度。
+        返回 [(t, 相机指向角度, 目标角度), ...]。
+        """
+        from trajectory import TrajectoryFollower
+        servo = self.make_servo()
+        follower = TrajectoryFollower((0.0,), self.limits)
+        command = target = 0.0
+        pending = []
+        trace = []
+        dt = 1.0 / self.control_rate
+        next_frame = 0.0
+        t = 0.0
+        while t < duration:
+            if t >= next_frame:
+                # 目标在相机右边 (目标角度 > 相机角度) 时像素误差为正
+                error = (target_angle(t) - servo.angle_at(t)) * self.pixels_per_degree
+                error += self.random.gauss(0, self.noise_pixels) if self.noise_pixels else 0.0
+                pending.append((t + self.latency, t, error))
+                next_frame += 1.0 / self.frame_rate
+            while pending and pending[0][0] <= t:
+                _, t_frame, error = pending.pop(0)
+                # 这里相机角度增大 = 朝误差为正的方向转，所以是加号
+                target = command + controller(t_frame, error)
+                follower.set_target((target,), t)
+            command = follower.sample(t)[0]
+            servo.command(t, command)
+            trace.append((t, servo.angle_at(t), target_angle(t)))
+            t += dt
+        return trace
+
+
+def step_metrics(trace, band=0.5):
+    """阶跃响应：超调 (度) 和进入并保持在 ±band 度以内的时间 (秒)。"""
+    final = trace[-1][2]
+    start = trace[0][1]
+    direction = 1.0 if final >= start else -1.0
+    overshoot = max(0.0, max((angle - final) * direction for _, angle, _ in trace))
+    settling = 0.0
+    for t, angle, target in trace:
+        if abs(angle - target) > band:
+            settling = t
+    return overshoot, settling
+
+
+# --- 5. 主程序：在模拟云台上整定并对比 ---
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="PID 继电器自动整定 (模拟云台)。实机整定用 oakd_servo_tracker.py --autotune")
+    parser.add_argument("--write", action="store_true", help=f"把模拟整定的结果写入 {PID_GAINS_PATH}")
+    parser.add_argument("--rule", choices=TUNING_RULES, default=DEFAULT_TUNING_RULE, help="整定规则")
+    parser.add_argument("--p-gain", type=float, default=0.03, help="对比用的原 P 增益，默认 0.03 (PAN_P_GAIN)")
+    args = parser.parse_args()
+
+    axis = SimulatedAxis(noise_pixels=2.0)
+    tuner = RelayAutoTuner()
+    axis.run(tuner.update, lambda t: 0.0, 20.0)
+    if not tuner.done:
+        print("继电器实验没有形成稳定的振荡，请加大 RELAY_AMPLITUDE_DEG。")
+        exit()
+    ku, tu = tuner.result()
+    gains = tuner.gains(args.rule)
+    print(f"继电器实验: Ku = {ku:.4f} 度/像素, Tu = {tu:.3f} 秒")
+    print(f"整定结果: kp={gains['kp']:.4f} ki={gains['ki']:.4f} kd={gains['kd']:.4f}")
+    if not gains["ki"] and not gains["kd"]:
+        print(f"  (只有 P 项；原 P 增益是 {args.p_gain}，两者接近时整定结果不会比原来更快)")
+
+    print("目标突然出现在 15 度处 (阶跃):")
+    for label, pid in (("原 P 控制", PID(args.p_gain)), ("整定的 PID", PID(**gains))):
+        overshoot, settling = step_metrics(axis.run(pid.update, lambda t: 15.0, 6.0))
+        print(f"  {label:>8}: 超调 {overshoot:5.2f} 度, 稳定到 ±0.5 度用时 {settling:.2f} 秒")
+
+    print("目标以 10 度/秒 匀速移动 2 秒后停下:")
+    for label, pid in (("原 P 控制", PID(args.p_gain)), ("整定的 PID", PID(**gains))):
+        trace = axis.run(pid.update, lambda t: 10.0 * min(t, 2.0), 6.0)
+        lag = max(abs(angle - target) for t, angle, target in trace if 1.0 < t < 2.0)
+        overshoot, settling = step_metrics([p for p in trace if p[0] >= 2.0])
+        print(f"  {label:>8}: 移动中最大滞后 {lag:5.2f} 度, 停下后超调 {overshoot:5.2f} 度, "
+              f"稳定用时 {settling - 2.0 if settling else 0.0:.2f} 秒")
+
+    if args.write:
+        save_gains({"pan": gains, "tilt": gains})
@@ -0,0 +1,99 @@
+import threading
+import time
+import depthai as dai
+
+# --- 1. 配置 (CONFIG) ---
+class PipelineConfig:
+    """
+    构建管道需要的参数。所有脚本用同一套参数描述自己的管道。
+    """
+    def __init__(self, preview_size=(640, 480), interleaved=True, nn_blob=None, nn_threads=2,
+                 confidence=0.5, rgb_queue_size=4, nn_queue_size=4):
+        self.preview_size = tuple(preview_size)
+        # 交错 BGR 可以直接用 frame_access.frame_view() 显示；NN 的输入需要平面格式 (False)
+        self.interleaved = interleaved
+        self.nn_blob = nn_blob
+        self.nn_threads = nn_threads
+        self.confidence = confidence
+        # 主机端输出队列的长度
+        self.rgb_queue_size = rgb_queue_size
+        self.nn_queue_size = nn_queue_size
+
+
+# --- 2. 管道构建 (Pipeline Build) ---
+def build_preview_pipeline(config):
+    """只有彩色相机预览的管道 ("rgb" 流)，用于手动控制类的脚本。"""
+    pipeline = dai.Pipeline()
+    cam_rgb = pipeline.create(dai.node.ColorCamera)
+    cam_rgb.setPreviewSize(*config.preview_size)
+    cam_rgb.setInterleaved(config.interleaved)
+    cam_rgb.setColorOrder(dai.ColorCameraProperties.ColorOrder.BGR)
+    xout_rgb = pipeline.create(dai.node.XLinkOut)
+    xout_rgb.setStreamName("rgb")
+    cam_rgb.preview.link(xout_rgb.input)
+    return pipeline
+
+
+def get_pipeline(config, builder=build_preview_pipeline, **options):
+    """
+    按 config 和 options 构建管道。所有脚本都通过这里拿管道，参数统一由 PipelineConfig 描述。
+
+    构建本身不到 1 ms，不做缓存：每个脚本在一个进程里只构建一次管道，进程内缓存没有意义；
+    depthai 2.x 又不能从 serializeToJson() 的结果重新生成 dai.Pipeline，跨进程的缓存也做不到。
+    序列化整个管道 (包括几 MB 的 NN 模型) 反而要几百毫秒，所以启动路径上不做任何序列化。
+    """
+    return builder(config, **options)
+
+
+# --- 3. 后台启动设备 (Background Device Boot) ---
+class DeviceBoot:
+    """
+    在后台线程里打开设备 (上传固件和管道通常要几秒)。
+    主线程同时去初始化舵机，需要设备时再调用 result()。
+    """
+    def __init__(self, pipeline):
+        self.device = None
+        self.error = None
+        self.thread = threading.Thread(target=self._boot, args=(pipeline,), daemon=True)
+        self.thread.start()
+
+    def _boot(self, pipeline):
+        try:
+            self.device = dai.Device(pipeline)
+        except Exception as e:
+            self.error = e
+
+    def result(self):
+        """等待设备启动完成并返回 dai.Device；启动失败时在主线程里重新抛出异常。"""
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.device
+
+
+# --- 4. 启动计时 (Startup Timing) ---
+class StartupTimer:
+    """记录从程序启动到各个阶段的时间，mark_once() 同一个阶段只记一次。"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = []
+
+    def mark(self, label):
+        self.marks.append((label, time.perf_counter() - self.start))
+
+    def mark_once(self, label):
+        """第一次记录这个阶段时返回 True。"""
+        if any(existing == label for existing, _ in self.marks):
+            return False
+        self.mark(label)
+        return True
+
+    def report(self):
+        print("[启动计时] " + ", ".join(f"{label} {elapsed:.2f}s" for label, elapsed in self.marks))
+
+
+# --- 5. 主程序：构建管道的耗时 ---
+if __name__ == "__main__":
+    start = time.perf_counter()
+    get_pipeline(PipelineConfig())
+    print(f"构建预览管道: {(time.perf_counter() - start) * 1000:.2f} ms")
@@ -0,0 +1,171 @@
+import time
+
+# --- 1. 配置 (CONFIG) ---
+# 搜索时云台转动的速度 (度/秒)
+SEARCH_SPEED_DEG_S = 40.0
+# 第一阶段：沿目标离开的方向最多追出去多少度
+DIRECTIONAL_SWEEP_DEG = 40.0
+# 第二阶段：以中心为准来回扫描的范围 (与 servo_scan.py 相同：水平 60 度，垂直 30 度)
+PAN_RANGE_OF_MOTION = 60
+TILT_RANGE_OF_MOTION = 30
+# 第二阶段每扫完一个水平来回，垂直方向换一档 (中 -> 上 -> 下)
+TILT_LEVELS = (0.0, 0.5, -0.5)
+# 整个搜索最多持续多少秒，超时后放弃 (由调用者复位到中心)
+SEARCH_TIMEOUT_S = 8.0
+
+
+# --- 2. 重新捕获搜索 (Reacquisition Search) ---
+class ReacquisitionSearch:
+    """
+    目标丢失后的非阻塞搜索图案生成器。
+
+    它不自己睡眠或循环：调用者每次处理检测结果时调用 step(now)，
+    拿到“此刻云台应该指向的角度”，所以不会阻塞检测循环。
+      阶段 1: 从丢失时的角度出发，沿目标最后的运动方向匀速追出去 DIRECTIONAL_SWEEP_DEG；
+      阶段 2: 回到 servo_scan.py 那样以中心为准的有界来回扫描，直到超时。
+    阶段 2 从阶段 1 结束的位置接着走：先以同样的速度走到扫描范围内，再从那里开始来回扫描，
+    目标角度始终连续，控制线程不会因为目标突变而全速转过画面。
+    """
+    def __init__(self, pan_center, tilt_center, pan_limits, tilt_limits):
+        self.pan_center = pan_center
+        self.tilt_center = tilt_center
+        self.pan_limits = pan_limits
+        self.tilt_limits = tilt_limits
+        self.active = False
+        # 统计
+        self.reacquire_times = []
+        self.failures = 0
+
+    def start(self, now, pan, tilt, pan_direction, tilt_direction, lost_time=None):
+        """
+        从 (pan, tilt) 开始搜索。pan_direction / tilt_direction 是 -1、0 或 1，
+        表示目标离开时云台应该往哪个方向转 (角度增大为 1)。
+        lost_time 是最后一次看到目标的时间，重新捕获用时从它开始算。
+        """
+        self.active = True
+        self.start_time = now
+        self.lost_time = now if lost_time is None else lost_time
+        self.start_pan = pan
+        self.start_tilt = tilt
+        self.pan_direction = pan_direction
+        self.tilt_direction = tilt_direction
+        # 阶段 1 的时长：沿着方向走到 DIRECTIONAL_SWEEP_DEG 或者撞到限位为止
+        if pan_direction == 0 and tilt_direction == 0:
+            self.directional_time = 0.0
+        else:
+            reach = DIRECTIONAL_SWEEP_DEG
+            if pan_direction > 0:
+                reach = min(reach, self.pan_limits[1] - pan)
+            elif pan_direction < 0:
+                reach = min(reach, pan - self.pan_limits[0])
+            self.directional_time = max(reach, 0.0) / SEARCH_SPEED_DEG_S
+        self.plan_scan_entry()
+
+    def directional_point(self, elapsed):
+        """阶段 1 开始 elapsed 秒后的角度 (未限幅)。"""
+        distance = SEARCH_SPEED_DEG_S * elapsed
+        pan = self.start_pan + self.pan_direction * distance
+        tilt = self.start_tilt + self.tilt_direction * distance * TILT_RANGE_OF_MOTION / PAN_RANGE_OF_MOTION
+        return pan, tilt
+
+    def plan_scan_entry(self):
+        """算出阶段 1 的终点、进入扫描范围的那一点，以及中间这段过渡要走多久。"""
+        half_range = PAN_RANGE_OF_MOTION / 2
+        self.sweep_end = self.clamp(*self.directional_point(self.directional_time))
+        # 阶段 1 的终点在扫描范围外时，先走到范围边上；垂直方向回到第一档 (中间)
+        self.entry_pan = max(self.pan_center - half_range, min(self.pan_center + half_range, self.sweep_end[0]))
+        tilt_speed = SEARCH_SPEED_DEG_S * TILT_RANGE_OF_MOTION / PAN_RANGE_OF_MOTION
+        self.entry_time = max(abs(self.entry_pan - self.sweep_end[0]) / SEARCH_SPEED_DEG_S,
+                              abs(self.tilt_center - self.sweep_end[1]) / tilt_speed)
+        # 从进入点朝扫描范围的另一侧扫：三角波下降段上 wave 等于进入点的那个相位
+        direction = self.pan_direction if self.pan_direction != 0 else 1
+        wave = (self.entry_pan - self.pan_center) / (direction * half_range)
+        self.entry_phase = (2 - wave) / 4
+
+    def step(self, now):
+        """返回此刻的目标角度 (pan, tilt)；搜索结束 (超时) 时返回 None。"""
+        if not self.active:
+            return None
+        elapsed = now - self.start_time
+        if elapsed > SEARCH_TIMEOUT_S:
+            self.active = False
+            self.failures += 1
+            return None
+
+        if elapsed < self.directional_time:
+            pan, tilt = self.directional_point(elapsed)
+        elif elapsed < self.directional_time + self.entry_time:
+            # 从阶段 1 的终点匀速走到扫描的进入点
+            fraction = (elapsed - self.directional_time) / self.entry_time
+            pan = self.sweep_end[0] + (self.entry_pan - self.sweep_end[0]) * fraction
+            tilt = self.sweep_end[1] + (self.tilt_center - self.sweep_end[1]) * fraction
+        else:
+            pan, tilt = self.scan_pattern(elapsed - self.directional_time - self.entry_time)
+        return self.clamp(pan, tilt)
+
+    def scan_pattern(self, t):
+        """有界扫描：水平方向做三角波，每个来回换一档垂直高度。"""
+        half_range = PAN_RANGE_OF_MOTION / 2
+        period = 4 * half_range / SEARCH_SPEED_DEG_S
+        # 从进入点开始往 pan_direction 的反方向扫，和阶段 1 结束的位置衔接
+        cycles = t / period + self.entry_phase
+        phase = cycles % 1.0
+        # 三角波: 0 -> +1 -> -1 -> 0
+        if phase < 0.25:
+            wave = phase * 4
+        elif phase < 0.75:
+            wave = 2 - phase * 4
+        else:
+            wave = phase * 4 - 4
+        direction = self.pan_direction if self.pan_direction != 0 else 1
+        pan = self.pan_center + direction * wave * half_range
+        # 每次扫到 pan_direction 一侧的端点 (wave = 1) 时换一档，垂直方向同样匀速走过去
+        sweeps = max(cycles - 0.25, 0.0)
+        index = int(sweeps)
+        level = TILT_LEVELS[index % len(TILT_LEVELS)]
+        previous = TILT_LEVELS[(index - 1) % len(TILT_LEVELS)] if index > 0 else level
+        change = (level - previous) * TILT_RANGE_OF_MOTION
+        tilt = self.tilt_center + level * TILT_RANGE_OF_MOTION
+        if change != 0:
+            tilt_speed = SEARCH_SPEED_DEG_S * TILT_RANGE_OF_MOTION / PAN_RANGE_OF_MOTION
+            remaining = abs(change) - (sweeps - index) * period * tilt_speed
+            if remaining > 0:
+                tilt -= remaining if change > 0 else -remaining
+        return pan, tilt
+
+    def clamp(self, pan, tilt):
+        pan = max(self.pan_limits[0], min(self.pan_limits[1], pan))
+        tilt = max(self.tilt_limits[0], min(self.tilt_limits[1], tilt))
+        return pan, tilt
+
+    def found(self, now):
+        """搜索过程中重新看到了目标：记录重新捕获用时。"""
+        if self.active:
+            self.reacquire_times.append(now - self.lost_time)
+            self.active = False
+
+    def stats(self):
+        n = len(self.reacquire_times)
+        if n == 0:
+            return f"重新捕获 0 次, 放弃 {self.failures} 次"
+        mean = sum(self.reacquire_times) / n
+        return (f"重新捕获 {n} 次, 平均用时 {mean:.2f} s, 最长 {max(self.reacquire_times):.2f} s, "
+                f"放弃 {self.failures} 次")
+
+
+# --- 3. 主程序：打印一次搜索的角度轨迹 ---
+if __name__ == "__main__":
+    search = ReacquisitionSearch(90.0, 54.0, (10, 170), (30, 100))
+    # 目标从画面左边离开 (云台需要往 pan 增大的方向转)
+    search.start(0.0, 100.0, 54.0, 1, 0)
+    t = 0.0
+    while True:
+        start = time.perf_counter()
+        target = search.step(t)
+        cost_us = (time.perf_counter() - start) * 1e6
+        if target is None:
+            break
+        if int(t * 10) % 5 == 0:
+            print(f"t={t:4.1f}s  pan={target[0]:6.1f}  tilt={target[1]:5.1f}  (step 用时 {cost_us:.1f} us)")
+        t += 0.1
+    print(search.stats())
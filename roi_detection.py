@@ -0,0 +1,226 @@
+import threading
+import depthai as dai
+from camera_geometry import ISP_WIDTH, ISP_HEIGHT
+
+# --- 1. 配置 (CONFIG) ---
+# 局部检测窗口在 ISP 画面上的宽度 (像素)。NN 输入 300x300，窗口 300 像素宽时 NN 看到的是原始分辨率，
+# 同样大小的脸在 NN 里是全画面模式的 1080 / 300 = 3.6 倍。
+ROI_SIZE_ISP_PIXELS = 300
+# 目标在全画面 (预览) 里宽度小于这个值 (像素) 时才切换到局部检测；更大的脸全画面就能稳定检测
+ROI_MAX_FACE_PIXELS = 40
+# 局部窗口里连续多少帧没有检测到脸，就退回全画面检测
+ROI_LOST_FRAMES = 3
+# 设备和主机最多保存多少帧的窗口信息等待对应的检测结果
+ROI_MAX_PENDING = 30
+
+
+# --- 2. 设备端选择窗口 (On-device ROI Selection) ---
+def preview_region(preview_size, isp_size=(ISP_WIDTH, ISP_HEIGHT)):
+    """预览画面在 ISP 画面中对应的区域 (x, y, 宽, 高)，单位 ISP 像素：中心裁出与预览同宽高比的区域。"""
+    scale = min(isp_size[0] / preview_size[0], isp_size[1] / preview_size[1])
+    width, height = preview_size[0] * scale, preview_size[1] * scale
+    return (isp_size[0] - width) / 2, (isp_size[1] - height) / 2, width, height
+
+
+def roi_nn_input(pipeline, cam_rgb, preview_frames, nn_input, preview_size):
+    """
+    两级检测：把 NN 的输入换成由 Script 节点选择的画面。
+
+    还没有目标、或者目标在全画面里已经足够大时，NN 照常看全画面 (preview_frames)；
+    锁定了一个小目标后，Script 按上一次的检测位置生成 ImageManipConfig，
+    让 ImageManip 从全分辨率的 ISP 画面裁出 ROI_SIZE_ISP_PIXELS 宽的窗口缩放给 NN。NN 的计算量不变。
+
+    每一帧用的是哪个窗口 (预览归一化坐标 "x y 宽 高") 通过 "roi" 流发给主机，
+    序列号和这一帧的检测结果相同，主机用 RoiProjector 把检测框换算回全画面坐标。
+    """
+    region_x, region_y, region_w, region_h = preview_region(preview_size)
+    roi_h_isp = ROI_SIZE_ISP_PIXELS * preview_size[1] / preview_size[0]
+    roi_script = pipeline.create(dai.node.Script)
+    roi_script.setScript(f"""
+ROI_W = {ROI_SIZE_ISP_PIXELS / region_w}
+ROI_H = {roi_h_isp / region_h}
+REGION = ({region_x / ISP_WIDTH}, {region_y / ISP_HEIGHT}, {region_w / ISP_WIDTH}, {region_h / ISP_HEIGHT})
+MAX_FACE = {ROI_MAX_FACE_PIXELS / preview_size[0]}
+LOST_FRAMES = {ROI_LOST_FRAMES}
+NN_W = {preview_size[0]}
+NN_H = {preview_size[1]}
+MAX_PENDING = {ROI_MAX_PENDING}
+roi = None
+last = None
+misses = 0
+crops = {{}}
+
+def update(dets):
+    global roi, last, misses
+    crop = crops.pop(dets.getSequenceNum(), None)
+    if crop is None:
+        return
+    best = None
+    best_score = None
+    for d in dets.detections:
+        cx = crop[0] + (d.xmin + d.xmax) / 2 * crop[2]
+        cy = crop[1] + (d.ymin + d.ymax) / 2 * crop[3]
+        width = (d.xmax - d.xmin) * crop[2]
+        # 优先选离上一个目标最近的脸，否则选置信度最高的
+        score = -abs(cx - last[0]) - abs(cy - last[1]) if last is not None else d.confidence
+        if best is None or score > best_score:
+            best, best_score = (cx, cy, width), score
+    if best is None:
+        misses += 1
+        if misses >= LOST_FRAMES:
+            roi = None
+            last = None
+        return
+    misses = 0
+    last = (best[0], best[1])
+    if best[2] >= MAX_FACE:
+        roi = None
+    else:
+        roi = (min(max(best[0] - ROI_W / 2, 0.0), 1.0 - ROI_W), min(max(best[1] - ROI_H / 2, 0.0), 1.0 - ROI_H))
+
+while True:
+    dets = node.io['dets'].tryGet()
+    while dets is not None:
+        update(dets)
+        dets = node.io['dets'].tryGet()
+
+    frame = node.io['preview'].get()
+    seq = frame.getSequenceNum()
+    if roi is None:
+        crop = (0.0, 0.0, 1.0, 1.0)
+        node.io['full'].send(frame)
+    else:
+        # 同一次拍摄的预览和 ISP 画面序列号相同；跳过更旧的 ISP 画面
+        isp = node.io['isp'].get()
+        while isp.getSequenceNum() < seq:
+            isp = node.io['isp'].get()
+        seq = isp.getSequenceNum()
+        crop = (roi[0], roi[1], ROI_W, ROI_H)
+        x0 = REGION[0] + crop[0] * REGION[2]
+        y0 = REGION[1] + crop[1] * REGION[3]
+        cfg = ImageManipConfig()
+        cfg.setCropRect(x0, y0, x0 + crop[2] * REGION[2], y0 + crop[3] * REGION[3])
+        cfg.setResize(NN_W, NN_H)
+        cfg.setKeepAspectRatio(False)
+        cfg.setFrameType(ImgFrame.Type.BGR888p)
+        node.io['manip_cfg'].send(cfg)
+        node.io['manip_img'].send(isp)
+
+    crops[seq] = crop
+    for old in [s for s in crops if s < seq - MAX_PENDING]:
+        del crops[old]
+    data = ("%.5f %.5f %.5f %.5f" % crop).encode()
+    buf = Buffer(len(data))
+    buf.setData(data)
+    buf.setSequenceNum(seq)
+    node.io['roi'].send(buf)
+""")
+    roi_script.inputs['preview'].setBlocking(False)
+    roi_script.inputs['preview'].setQueueSize(1)
+    # ISP 画面很大 (1920x1080 NV12)，只留最新的两帧
+    roi_script.inputs['isp'].setBlocking(False)
+    roi_script.inputs['isp'].setQueueSize(2)
+    roi_script.inputs['dets'].setBlocking(False)
+    roi_script.inputs['dets'].setQueueSize(4)
+    preview_frames.link(roi_script.inputs['preview'])
+    cam_rgb.isp.link(roi_script.inputs['isp'])
+
+    manip = pipeline.create(dai.node.ImageManip)
+    manip.setWaitForConfigInput(True)
+    manip.setMaxOutputFrameSize(preview_size[0] * preview_size[1] * 3)
+    roi_script.outputs['manip_cfg'].link(manip.inputConfig)
+    roi_script.outputs['manip_img'].link(manip.inputImage)
+
+    # 全画面和局部窗口两路都接到 NN 的输入上，每一帧只会走其中一路
+    roi_script.outputs['full'].link(nn_input)
+    manip.out.link(nn_input)
+
+    xout_roi = pipeline.create(dai.node.XLinkOut)
+    xout_roi.setStreamName("roi")
+    roi_script.outputs['roi'].link(xout_roi.input)
+    # 返回 Script 的检测结果输入，调用方把 NN 的输出接上来
+    return roi_script.inputs['dets']
+
+
+# --- 3. 主机端换算回全画面 (Host-side Projection) ---
+class RoiProjector:
+    """
+    保存 "roi" 流里每一帧的窗口，把同一序列号的检测框从窗口坐标换算到全画面 (预览) 坐标。
+    on_roi() 在 depthai 的回调线程里执行，project() 在追踪线程里执行，所以加锁。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.crops = {}
+        self.last_projected_seq = None
+        # 统计
+        self.full_frames = 0
+        self.roi_frames = 0
+        self.unmatched = 0
+
+    def on_roi(self, msg):
+        crop = tuple(float(v) for v in bytes(msg.getData()).split())
+        seq = msg.getSequenceNum()
+        with self.lock:
+            self.crops[seq] = crop
+            if len(self.crops) > ROI_MAX_PENDING:
+                del self.crops[min(self.crops)]
+
+    def project(self, msg):
+        """
+        返回换算到全画面坐标的检测结果列表；找不到这一帧的窗口信息时返回 None (这一帧应当跳过)。
+        换算直接修改消息里的检测框，同一条消息再次传入时原样返回。
+        """
+        seq = msg.getSequenceNum()
+        with self.lock:
+            crop = self.crops.pop(seq, None)
+            for old in [s for s in self.crops if s < seq]:
+                del self.crops[old]
+        if crop is None:
+            if seq == self.last_projected_seq:
+                return msg.detections
+            self.unmatched += 1
+            return None
+        self.last_projected_seq = seq
+
+        x0, y0, width, height = crop
+        detections = msg.detections
+        if width >= 1.0 and height >= 1.0:
+            self.full_frames += 1
+            return detections
+        self.roi_frames += 1
+        for d in detections:
+            d.xmin, d.xmax = x0 + d.xmin * width, x0 + d.xmax * width
+            d.ymin, d.ymax = y0 + d.ymin * height, y0 + d.ymax * height
+        return detections
+
+    def stats(self):
+        return f"全画面 {self.full_frames} 帧, 局部窗口 {self.roi_frames} 帧, 缺少窗口信息 {self.unmatched} 帧"
+
+
+# --- 4. 主程序：窗口大小和换算的说明 ---
+if __name__ == "__main__":
+    preview_size = (300, 300)
+    region_x, region_y, region_w, region_h = preview_region(preview_size)
+    zoom = region_w / ROI_SIZE_ISP_PIXELS
+    print(f"预览 {preview_size[0]}x{preview_size[1]} 对应 ISP 区域 x={region_x:.0f} y={region_y:.0f} "
+          f"{region_w:.0f}x{region_h:.0f}")
+    print(f"局部窗口 {ROI_SIZE_ISP_PIXELS} ISP 像素宽，占全画面的 {1 / zoom:.1%}，NN 里的脸放大 {zoom:.1f} 倍")
+    print(f"NN 的计算量不变，能检测到的最远距离约为全画面模式的 {zoom:.1f} 倍")
+
+    # 换算自检：窗口左上角在 (0.4, 0.3)，窗口中心的检测框应该落在窗口中心
+    projector = RoiProjector()
+    roi_w = ROI_SIZE_ISP_PIXELS / region_w
+    info = dai.Buffer()
+    info.setData(list(b"0.40000 0.30000 %.5f %.5f" % (roi_w, roi_w)))
+    info.setSequenceNum(5)
+    projector.on_roi(info)
+    detections = dai.ImgDetections()
+    face = dai.ImgDetection()
+    face.xmin, face.ymin, face.xmax, face.ymax = 0.45, 0.45, 0.55, 0.55
+    detections.detections = [face]
+    detections.setSequenceNum(5)
+    d = projector.project(detections)[0]
+    print(f"窗口中心的检测框换算到全画面: ({(d.xmin + d.xmax) / 2:.4f}, {(d.ymin + d.ymax) / 2:.4f})，"
+          f"应为 ({0.4 + roi_w / 2:.4f}, {0.3 + roi_w / 2:.4f})；宽度 {(d.xmax - d.xmin) * preview_size[0]:.1f} 像素")
+    assert projector.project(detections)[0].xmin == d.xmin, "重复传入同一条消息不应再次换算"
+    print(projector.stats())
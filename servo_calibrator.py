@@ -1,11 +1,10 @@
-import time
-from board import SCL, SDA
-import busio
-from adafruit_servokit import ServoKit
 import readchar # 需要安装一个新的库来读取单个按键
+from pca_arbiter import PcaConflictError
+from servo_driver import ActuatorThread, ServoDriver, lease_servos
+from trajectory import (AxisLimits, TrajectoryFollower, run_to, SERVO_MAX_ACCEL_DEG_S2,
+                        SERVO_MAX_JERK_DEG_S3, SERVO_MAX_SPEED_DEG_S)
 
 # --- 配置 ---
-PCA9685_CHANNELS = 16
 PAN_CHANNEL = 1   # 垂直舵机通道
 TILT_CHANNEL = 0  # 水平舵机通道
 
@@ -15,19 +14,28 @@ PAN_MAX_ANGLE = 170
 TILT_MIN_ANGLE = 40
 TILT_MAX_ANGLE = 140
 
+# 【新增】每次按键的 0.5 度也沿 S 形曲线走过去 (见 trajectory.py)。用舵机本身的限制，一步约 80 ms：
+# readchar 在走完之前不会读下一个键，限制再低的话按住不放时会明显变慢
+CALIBRATION_LIMITS = AxisLimits(SERVO_MAX_SPEED_DEG_S, SERVO_MAX_ACCEL_DEG_S2, SERVO_MAX_JERK_DEG_S3)
+
 # --- 初始化舵机 ---
+# 【修改】用 ServoDriver 代替 ServoKit (脉宽同样是 500-2500 微秒)，通过 pca_arbiter 租用通道，
+# 不再自己新建 busio.I2C
 try:
-    i2c = busio.I2C(SCL, SDA)
-    kit = ServoKit(channels=PCA9685_CHANNELS, i2c=i2c)
+    servos = ServoDriver(lease_servos((PAN_CHANNEL, TILT_CHANNEL)))
     print("PCA9685 初始化成功。")
 except ValueError:
     print("错误: 无法找到I2C设备。请运行 'sudo i2cdetect -y 1' 检查硬件连接。")
     exit()
+except PcaConflictError as e:
+    print(f"错误: {e}")
+    exit()
+actuator = ActuatorThread(servos)
+actuator.start()
 
-pan_servo = kit.servo[PAN_CHANNEL]
-tilt_servo = kit.servo[TILT_CHANNEL]
-pan_servo.set_pulse_width_range(500, 2500)
-tilt_servo.set_pulse_width_range(500, 2500)
+
+def write(angles):
+    actuator.post({PAN_CHANNEL: angles[0], TILT_CHANNEL: angles[1]})
 
 # --- 校准主程序 ---
 if __name__ == "__main__":
@@ -35,8 +43,8 @@ if __name__ == "__main__":
     pan_angle = 90.0
     tilt_angle = 90.0
     
-    pan_servo.angle = pan_angle
-    tilt_servo.angle = tilt_angle
+    write((pan_angle, tilt_angle))
+    follower = TrajectoryFollower((pan_angle, tilt_angle), CALIBRATION_LIMITS)
     
     print("\n--- 舵机校准程序 ---")
     print("使用 'w', 's' 控制垂直 (Tilt) 舵机")
@@ -68,8 +76,9 @@ if __name__ == "__main__":
         tilt_angle = max(TILT_MIN_ANGLE, min(TILT_MAX_ANGLE, tilt_angle))
         
         # 更新舵机位置
-        pan_servo.angle = pan_angle
-        tilt_servo.angle = tilt_angle
+        run_to(follower, (pan_angle, tilt_angle), write)
+
+    actuator.stop()
 
     # 退出后打印最终结果
     print("\n\n校准完成！")
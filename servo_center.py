@@ -1,16 +1,13 @@
-from adafruit_servokit import ServoKit
+from servo_driver import ServoDriver, lease_servos
 import time
 
 # 初始化
-kit = ServoKit(channels=16)
-
-# 设置脉宽 (重要！)
-kit.servo[0].set_pulse_width_range(500, 2500)
-kit.servo[1].set_pulse_width_range(500, 2500)
+# 【修改】用 ServoDriver 代替 ServoKit，脉宽同样是 500-2500 微秒 (重要！)。
+# 组装前舵机停在哪里是未知的，没有起点可以规划轨迹，所以这里仍然直接写 90 度，由舵机自己转过去
+servos = ServoDriver(lease_servos((0, 1)))
 
 # 将两个舵机都设置到90度中心位置
 print("正在将舵机归中至90度...")
-kit.servo[0].angle = 90
-kit.servo[1].angle = 90
+servos.set_angles({0: 90, 1: 90})
 time.sleep(2) # 等待舵机转动到位
 print("归中完成！现在可以断开舵机电源并开始组装。")
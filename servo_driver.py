@@ -0,0 +1,277 @@
+import threading
+import time
+from pca_arbiter import PCA9685_ADDRESS, get_arbiter
+from pca_burst import FULL_OFF
+
+# --- 1. 配置 (CONFIG) ---
+# 所有脚本用的都是同一块 PCA9685 (默认地址 0x40) 和同样的舵机脉宽
+SERVO_PWM_FREQUENCY_HZ = 50
+SERVO_MIN_PULSE_US = 500
+SERVO_MAX_PULSE_US = 2500
+SERVO_ACTUATION_RANGE_DEG = 180
+# 角度换算成整数时的分辨率：1/100 度
+ANGLE_SCALE = 100
+# 执行线程比截止时间晚醒来超过这么多 (秒) 就算错过一次
+ACTUATOR_LATE_TOLERANCE_S = 0.002
+
+
+def lease_servos(channels, address=PCA9685_ADDRESS, arbiter=None):
+    """
+    从进程内唯一的 PcaArbiter 租用舵机通道 (50 Hz)。
+    同一块芯片已经被设成别的频率 (例如震动马达的 1000 Hz) 时抛出 pca_arbiter.PcaConflictError。
+    """
+    if arbiter is None:
+        arbiter = get_arbiter()
+    return arbiter.lease("舵机", channels, SERVO_PWM_FREQUENCY_HZ, address)
+
+
+# --- 2. 合并写入的舵机驱动 (Write-coalescing Servo Driver) ---
+class ServoDriver:
+    """
+    直接写 PCA9685 的 12 位计数值，代替 ServoKit 的 servo[ch].angle。
+
+    50 Hz 下一个计数是 20ms / 4096 ≈ 4.9 微秒，500-2500 微秒对应 180 度，
+    也就是大约 0.44 度才变一个计数。控制线程的平滑、键盘循环每 10 ms 的重复写入，
+    大多数都会换算成和上一次相同的计数值。这里记住每个通道最后写入的计数值，
+    只有变化时才发起 I2C 传输，并统计省掉了多少次。
+
+    换算用预先算好的整数：和 adafruit_motor.servo 一样先算 16 位占空比再右移 4 位，
+    每次只有一次乘法和一次整除。
+
+    set_angles() 一次设置几个舵机，编号相邻的通道 (例如 pan=1, tilt=0) 合并成一次 I2C 传输，
+    两个轴同时更新，见 pca_burst.write_pwm()。
+
+    lease 是 lease_servos() 返回的通道租约，只能写租到的通道。
+    """
+    def __init__(self, lease, min_pulse=SERVO_MIN_PULSE_US, max_pulse=SERVO_MAX_PULSE_US,
+                 actuation_range=SERVO_ACTUATION_RANGE_DEG):
+        self.lease = lease
+        # 打开芯片时读到的实际频率 (预分频取整后不是正好 50 Hz)，和 adafruit_motor 的算法保持一致
+        frequency = lease.frequency
+        self.min_duty = int(min_pulse * frequency / 1000000 * 0xFFFF)
+        self.duty_range = int(max_pulse * frequency / 1000000 * 0xFFFF - self.min_duty)
+        self.actuation_range = actuation_range
+        self.scaled_range = actuation_range * ANGLE_SCALE
+        # 每个通道最后写入的计数值；None 表示还没写过
+        self.last_ticks = [None] * 16
+        # 统计：writes/skipped 按通道计，transactions 是实际的 I2C 传输次数
+        self.writes = 0
+        self.skipped = 0
+        self.transactions = 0
+
+    def angle_to_ticks(self, angle):
+        """角度 (度) -> LEDn_OFF 的 12 位计数值。"""
+        scaled = int(angle * ANGLE_SCALE + 0.5)
+        if not 0 <= scaled <= self.scaled_range:
+            raise ValueError(f"角度超出范围 0-{self.actuation_range}: {angle}")
+        return (self.min_duty + scaled * self.duty_range // self.scaled_range) >> 4
+
+    def set_angle(self, channel, angle):
+        """设置舵机角度；angle 为 None 时停止输出脉冲。返回是否真的写了 I2C。"""
+        return self.set_angles({channel: angle})
+
+    def set_angles(self, angles):
+        """
+        angles: {通道: 角度或 None}。计数值有变化的通道一起写入，相邻的通道只用一次传输。
+        返回是否真的写了 I2C。
+        """
+        changed = {}
+        for channel, angle in angles.items():
+            ticks = FULL_OFF if angle is None else self.angle_to_ticks(angle)
+            if ticks == self.last_ticks[channel]:
+                self.skipped += 1
+            else:
+                changed[channel] = (0, ticks)
+        if not changed:
+            return False
+        self.transactions += self.lease.write(changed)
+        for channel, (_, ticks) in changed.items():
+            self.last_ticks[channel] = ticks
+        self.writes += len(changed)
+        return True
+
+    def release(self, channel):
+        return self.set_angle(channel, None)
+
+    def stats(self):
+        total = self.writes + self.skipped
+        saved = self.skipped / total * 100 if total else 0.0
+        return (f"通道写入 {self.writes} 次, 省掉 {self.skipped} 次 ({saved:.1f}%), "
+                f"I2C 传输 {self.transactions} 次")
+
+
+# --- 3. 执行线程 (Actuator Thread) ---
+class ActuatorThread(threading.Thread):
+    """
+    独占 ServoDriver 的后台线程，所有 I2C 写入都在这里完成。
+
+    舵机每个 PWM 周期 (50 Hz 即 20 ms) 才读一次脉宽，比这更快的指令都会被覆盖。
+    调用方用 post() 把最新的角度放进“信箱”就立即返回，同一个通道只保留最新的值；
+    这个线程按单调时钟的截止时间每个 PWM 周期取一次信箱，用 set_angles() 一起写出去。
+    控制线程、键盘循环不会再卡在 busio.I2C 上。
+
+    on_flush(angles) 在每次写出之后调用 (在这个线程里)，angles 是这次写出的 {通道: 角度}。
+    """
+    def __init__(self, driver, period=1.0 / SERVO_PWM_FREQUENCY_HZ, on_flush=None):
+        super().__init__(daemon=True)
+        self.driver = driver
+        self.period = period
+        self.on_flush = on_flush
+        self.lock = threading.Lock()
+        self.mailbox = {}
+        self.stop_event = threading.Event()
+        # 统计
+        self.flushes = 0
+        self.bus_time_sum = 0.0
+        self.bus_time_max = 0.0
+        self.missed = 0
+        self.posted = 0
+
+    def post(self, angles):
+        """angles: {通道: 角度或 None}。不阻塞，覆盖信箱里同一通道还没写出的旧值。"""
+        with self.lock:
+            self.mailbox.update(angles)
+            self.posted += 1
+
+    def flush(self):
+        with self.lock:
+            angles, self.mailbox = self.mailbox, {}
+        if not angles:
+            return
+        start = time.perf_counter()
+        self.driver.set_angles(angles)
+        bus_time = time.perf_counter() - start
+        self.flushes += 1
+        self.bus_time_sum += bus_time
+        self.bus_time_max = max(self.bus_time_max, bus_time)
+        if self.on_flush is not None:
+            self.on_flush(angles)
+
+    def run(self):
+        deadline = time.monotonic() + self.period
+        while not self.stop_event.wait(max(0.0, deadline - time.monotonic())):
+            if time.monotonic() - deadline > ACTUATOR_LATE_TOLERANCE_S:
+                self.missed += 1
+            self.flush()
+            deadline += self.period
+            # 落后一个周期以上 (例如总线被占用很久) 时重新对齐，不连续补写
+            if deadline < time.monotonic():
+                deadline = time.monotonic() + self.period
+
+    def stop(self):
+        """停止线程，并把信箱里最后的指令 (例如退出前的归中) 写出去。"""
+        self.stop_event.set()
+        self.join()
+        self.flush()
+
+    def stats(self):
+        mean_ms = self.bus_time_sum / self.flushes * 1000 if self.flushes else 0.0
+        return (f"{1.0 / self.period:.0f} Hz, 收到指令 {self.posted} 次, 写出 {self.flushes} 次, "
+                f"总线耗时 平均 {mean_ms:.2f} ms / 最大 {self.bus_time_max * 1000:.2f} ms, 错过截止时间 {self.missed} 次")
+
+
+# --- 4. 主程序：不接硬件，统计典型用法下省掉的写入 ---
+if __name__ == "__main__":
+    import math
+    from pca_arbiter import PcaArbiter
+
+    class FakePCA:
+        """不接硬件的 PCA9685：频率按 50 Hz 的预分频计算，I2C 写入直接丢掉。"""
+        prescale = int(25000000 / 4096 / SERVO_PWM_FREQUENCY_HZ + 0.5) - 1
+        frequency = 25000000 / 4096 / (prescale + 1)
+        prescale_reg = prescale
+        mode1_reg = 0xA0
+
+        def __init__(self, i2c=None, address=None):
+            self.i2c_device = self
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def write(self, buffer):
+            pass
+
+    class FakeI2C:
+        """只回答 PRE_SCALE 的读取，值和 FakePCA 相同。"""
+        def try_lock(self):
+            return True
+
+        def unlock(self):
+            pass
+
+        def writeto_then_readfrom(self, address, buffer_out, buffer_in):
+            buffer_in[0] = FakePCA.prescale_reg
+
+    def adafruit_ticks(angle, frequency):
+        """adafruit_motor.servo 的算法，用来核对换算结果。"""
+        min_duty = int(SERVO_MIN_PULSE_US * frequency / 1000000 * 0xFFFF)
+        duty_range = int(SERVO_MAX_PULSE_US * frequency / 1000000 * 0xFFFF - min_duty)
+        return (min_duty + int(angle / SERVO_ACTUATION_RANGE_DEG * duty_range)) >> 4
+
+    def fake_driver(pca_class=FakePCA):
+        """每次用一个新的仲裁者，租用通道 0/1。"""
+        return ServoDriver(lease_servos((0, 1), arbiter=PcaArbiter(i2c=FakeI2C(), pca_class=pca_class)))
+
+    driver = fake_driver()
+    mismatched = sum(1 for a in range(0, 18001)
+                     if abs(driver.angle_to_ticks(a / 100) - adafruit_ticks(a / 100, FakePCA.frequency)) > 0)
+    print(f"和 adafruit_motor 的换算结果不同的角度 (0.01 度步长): {mismatched} / 18001")
+    print(f"一个计数约 {SERVO_ACTUATION_RANGE_DEG / (driver.duty_range >> 4):.2f} 度")
+
+    # unified_controller.py：每 10 ms 写一次，10 秒里只按了 20 次键
+    driver = fake_driver()
+    pan = tilt = 90.0
+    for i in range(1000):
+        if i % 50 == 0:
+            pan += 1.0
+        driver.set_angles({1: pan, 0: tilt})
+    print(f"键盘控制 10 秒 (每 10 ms 写一次): {driver.stats()}")
+
+    # 追踪的控制线程：100 Hz，平滑地跟随一个缓慢移动的目标
+    driver = fake_driver()
+    pan = 90.0
+    for i in range(1000):
+        target = 90.0 + 10.0 * math.sin(i / 100.0)
+        pan += (target - pan) * 0.05
+        driver.set_angle(1, pan)
+    print(f"追踪控制线程 10 秒 (100 Hz): {driver.stats()}")
+
+    n = 100000
+    start = time.perf_counter()
+    for i in range(n):
+        driver.angle_to_ticks(i % 180)
+    print(f"angle_to_ticks: {(time.perf_counter() - start) / n * 1e6:.2f} 微秒/次")
+
+    # 执行线程：模拟每次传输 1 ms 的总线，100 Hz 的控制循环直接写 vs 交给执行线程
+    class SlowPCA(FakePCA):
+        def write(self, buffer):
+            time.sleep(0.001)
+
+    def control_loop(write, seconds=2.0, rate=100.0):
+        """返回控制循环里“写舵机”这一步的最长耗时 (秒)。"""
+        pan = 90.0
+        longest = 0.0
+        deadline = time.monotonic()
+        for i in range(int(seconds * rate)):
+            target = 90.0 + 10.0 * math.sin(i / 50.0)
+            pan += (target - pan) * 0.1
+            start = time.perf_counter()
+            write({1: pan, 0: 180.0 - pan})
+            longest = max(longest, time.perf_counter() - start)
+            deadline += 1.0 / rate
+            time.sleep(max(0.0, deadline - time.monotonic()))
+        return longest
+
+    driver = fake_driver(SlowPCA)
+    longest = control_loop(driver.set_angles)
+    print(f"控制循环直接写 (100 Hz): 每周期最多阻塞 {longest * 1000:.2f} ms, {driver.stats()}")
+    driver = fake_driver(SlowPCA)
+    actuator = ActuatorThread(driver)
+    actuator.start()
+    longest = control_loop(actuator.post)
+    actuator.stop()
+    print(f"交给执行线程: 每周期最多阻塞 {longest * 1000:.3f} ms, {driver.stats()}")
+    print(f"  执行线程: {actuator.stats()}")
@@ -1,24 +1,29 @@
-from adafruit_servokit import ServoKit
+from servo_driver import ActuatorThread, ServoDriver, lease_servos
+from trajectory import AxisLimits, TrajectoryFollower, run_to
 
 # --- 请根据您的实际接线修改这里的通道号 ---
 TILT_CHANNEL = 0  # 垂直舵机 (上下)
 PAN_CHANNEL = 1   # 水平舵机 (左右)
 # -----------------------------------------
 
+# 【新增】输入新角度后不再一步跳过去，而是沿 S 形曲线平滑地转过去 (见 trajectory.py)
+MOTION_LIMITS = AxisLimits(max_speed=90.0, max_accel=600.0, max_jerk=6000.0)
+
 # 初始化PCA9685
-kit = ServoKit(channels=16)
+# 【修改】用 ServoDriver 代替 ServoKit (脉宽同样是 500-2500 微秒，确保180度运动)，
+# 写入交给执行线程
+servos = ServoDriver(lease_servos((TILT_CHANNEL, PAN_CHANNEL)))
+actuator = ActuatorThread(servos)
+actuator.start()
+
 
-# 获取舵机对象
-tilt_servo = kit.servo[TILT_CHANNEL]
-pan_servo = kit.servo[PAN_CHANNEL]
+def write(angles):
+    actuator.post({PAN_CHANNEL: angles[0], TILT_CHANNEL: angles[1]})
 
-# 设置脉宽范围以确保180度运动
-tilt_servo.set_pulse_width_range(500, 2500)
-pan_servo.set_pulse_width_range(500, 2500)
 
 # 将舵机移动到初始的90度位置
-tilt_servo.angle = 90
-pan_servo.angle = 90
+write((90, 90))
+follower = TrajectoryFollower((90, 90), MOTION_LIMITS)
 
 print("舵机手动校准工具已启动！")
 print("---------------------------------")
@@ -54,11 +59,13 @@ while True:
             continue
 
         # 控制舵机
+        # 另一个舵机的目标保持不变；run_to 会一直等到舵机走到新角度
+        pan_target, tilt_target = follower.target
         if servo_choice == 'p':
-            pan_servo.angle = angle_value
+            run_to(follower, (angle_value, tilt_target), write)
             print(f"水平舵机已移动到 {angle_value} 度。")
         elif servo_choice == 't':
-            tilt_servo.angle = angle_value
+            run_to(follower, (pan_target, angle_value), write)
             print(f"垂直舵机已移动到 {angle_value} 度。")
         else:
             print("舵机选择错误！请输入 'p' 或 't'。")
@@ -73,6 +80,6 @@ while True:
         break
 
 # 程序结束时，可以选择让舵机停留在最后位置，或者归中
-# pan_servo.angle = 90
-# tilt_servo.angle = 90
+# run_to(follower, (90, 90), write)
 # print("舵机已归中。")
+actuator.stop()
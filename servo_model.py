@@ -0,0 +1,146 @@
+import threading
+from collections import deque
+
+# --- 1. 配置 (CONFIG) ---
+# 舵机输出轴的最大转速 (度/秒)。MG996R 空载约 0.17 秒/60 度，带上云台按 300 度/秒 估计。
+SERVO_SLEW_RATE_DEG_S = 300.0
+# 从写 PCA9685 寄存器到舵机开始响应的延迟 (秒)：PWM 周期 20 ms，平均等半个周期
+SERVO_COMMAND_LATENCY_S = 0.01
+# 保留多长时间的指令历史 (秒)。检测结果的延迟一般不到 0.1 秒，2 秒足够查询。
+COMMAND_HISTORY_S = 2.0
+
+
+# --- 2. 舵机位置模型 (Servo Position Model) ---
+class ServoAxisModel:
+    """
+    根据指令历史估计单个舵机在任意时刻的实际机械角度。
+
+    舵机收到新的角度指令后，经过 SERVO_COMMAND_LATENCY_S 才开始转，
+    并以不超过 SERVO_SLEW_RATE_DEG_S 的速度转向指令角度。
+    angle_at(t) 从保存的最早状态开始，按这个模型把指令逐条“回放”到 t。
+    """
+    def __init__(self, angle, slew_rate=SERVO_SLEW_RATE_DEG_S, latency=SERVO_COMMAND_LATENCY_S,
+                 history_s=COMMAND_HISTORY_S):
+        self.slew_rate = slew_rate
+        self.latency = latency
+        self.history_s = history_s
+        # 回放的起点：anchor_time 时刻舵机位于 anchor_angle，正在转向 anchor_command
+        self.anchor_time = None
+        self.anchor_angle = angle
+        self.anchor_command = angle
+        # (生效时间, 指令角度)，生效时间 = 写入时间 + latency
+        self.commands = deque()
+
+    def command(self, t, angle):
+        """记录 t 时刻写给舵机的角度。"""
+        if self.anchor_time is None:
+            self.anchor_time = t + self.latency
+        self.commands.append((t + self.latency, angle))
+        # 太旧的指令并入起点状态，保证 angle_at() 的开销有上限
+        while self.commands and self.commands[0][0] < t - self.history_s:
+            effective, angle = self.commands.popleft()
+            self.anchor_angle = self._move(self.anchor_angle, self.anchor_command, effective - self.anchor_time)
+            self.anchor_time = effective
+            self.anchor_command = angle
+
+    def _move(self, angle, command, dt):
+        step = self.slew_rate * max(dt, 0.0)
+        if abs(command - angle) <= step:
+            return command
+        return angle + step if command > angle else angle - step
+
+    def angle_at(self, t):
+        """估计 t 时刻的机械角度。"""
+        if self.anchor_time is None or t <= self.anchor_time:
+            return self.anchor_angle
+        angle, command, last = self.anchor_angle, self.anchor_command, self.anchor_time
+        for effective, next_command in self.commands:
+            if effective > t:
+                break
+            angle = self._move(angle, command, effective - last)
+            command, last = next_command, effective
+        return self._move(angle, command, t - last)
+
+
+class GimbalModel:
+    """pan / tilt 两个轴的位置模型。控制线程写入，追踪线程查询，所以加锁。"""
+    def __init__(self, pan_angle, tilt_angle, **kwargs):
+        self.pan = ServoAxisModel(pan_angle, **kwargs)
+        self.tilt = ServoAxisModel(tilt_angle, **kwargs)
+        self.lock = threading.Lock()
+
+    def command(self, t, pan_angle=None, tilt_angle=None):
+        """记录一次写舵机；没有写的轴传 None。"""
+        with self.lock:
+            if pan_angle is not None:
+                self.pan.command(t, pan_angle)
+            if tilt_angle is not None:
+                self.tilt.command(t, tilt_angle)
+
+    def angles_at(self, t):
+        with self.lock:
+            return self.pan.angle_at(t), self.tilt.angle_at(t)
+
+
+# --- 3. 主程序：模拟云台，对比有无自身运动补偿 ---
+if __name__ == "__main__":
+    from target_filter import TargetEstimator
+    from trajectory import AxisLimits, TrajectoryFollower, TRACKING_MAX_ACCEL_DEG_S2, TRACKING_MAX_SPEED_DEG_S
+
+    control_rate = 100.0
+    frame_rate = 30.0
+    frame_latency = 0.07          # 拍摄到检测结果到达主机的延迟 (秒)
+    pixels_per_degree = 6.8       # 300x300 预览约 42 度视场
+    # 度/像素。tracker 的 P 增益是 0.03；扫视相当于 1 / pixels_per_degree ≈ 0.147
+    p_gains = (0.03, 0.1, 0.13, 0.147)
+    # 控制线程沿轨迹走向目标，限制和 oakd_servo_tracker.py 的 TRACKING_LIMITS 相同
+    limits = AxisLimits(TRACKING_MAX_SPEED_DEG_S, TRACKING_MAX_ACCEL_DEG_S2)
+    target_angle = 20.0           # 目标在世界坐标中的方向 (度)，静止不动
+
+    def simulate(p_gain, compensate):
+        plant = ServoAxisModel(0.0)    # “真实”的舵机
+        model = ServoAxisModel(0.0)    # 追踪程序里的模型 (与真实舵机参数相同)
+        estimator = TargetEstimator("kalman")
+        follower = TrajectoryFollower((0.0,), limits)
+        command = target = 0.0
+        pending = []                   # (到达主机的时间, 拍摄时间, 像素位置)
+        trace = []
+        t = 0.0
+        next_frame = 0.0
+        dt = 1.0 / control_rate
+        while t < 4.0:
+            # 相机按帧率拍摄：像素位置由目标方向和相机当时的真实角度决定 (+pan -> +px)
+            if t >= next_frame:
+                px = (plant.angle_at(t) - target_angle) * pixels_per_degree
+                pending.append((t + frame_latency, t, px))
+                next_frame += 1.0 / frame_rate
+            while pending and pending[0][0] <= t:
+                _, t_frame, px = pending.pop(0)
+                if compensate:
+                    # 换算到固定参考 (角度 0) 下的像素位置，估计器只看到目标自己的运动
+                    px -= model.angle_at(t_frame) * pixels_per_degree
+                estimator.update(t_frame, px, 0.0)
+                x, _, _, _ = estimator.predict(t)
+                if compensate:
+                    # 再换算回当前指令角度下的像素误差
+                    x += command * pixels_per_degree
+                target = command - x * p_gain
+                follower.set_target((target,), t)
+            # 控制线程：按当前时间在轨迹上取样后写舵机
+            command = follower.sample(t)[0]
+            plant.command(t, command)
+            model.command(t, command)
+            trace.append(plant.angle_at(t))
+            t += dt
+        return trace
+
+    print(f"目标静止在 {target_angle} 度，检测延迟 {frame_latency * 1000:.0f} ms，模拟 4 秒")
+    for p_gain, compensate in ((g, c) for g in p_gains for c in (False, True)):
+        trace = simulate(p_gain, compensate)
+        overshoot = max(0.0, max(trace) - target_angle)
+        # 统计来回摆动的次数：越过目标角度的次数
+        crossings = sum(1 for a, b in zip(trace, trace[1:]) if (a - target_angle) * (b - target_angle) < 0)
+        settled = [abs(a - target_angle) for a in trace[-100:]]
+        label = "有补偿" if compensate else "无补偿"
+        print(f"  P 增益 {p_gain:5.3f} {label}: 超调 {overshoot:5.2f} 度, 穿越目标 {crossings:2d} 次, "
+              f"最后 1 秒的最大误差 {max(settled):5.2f} 度")
@@ -1,5 +1,6 @@
 import time
-from adafruit_servokit import ServoKit
+from servo_driver import ActuatorThread, ServoDriver, lease_servos
+from trajectory import AxisLimits, TrajectoryFollower, run_to
 
 # --- 您可以修改这里的“魔法数字” ---
 
@@ -13,6 +14,10 @@ TILT_CHANNEL = 0  # 垂直舵机连接在PCA9685的0号通道
 TILT_CENTER_ANGLE = 90  # 垂直舵机的中心位置 (90度是平视)
 TILT_RANGE_OF_MOTION = 30  # 垂直舵机来回摆动的总范围 (比如30度)
 
+# 【新增】扫描速度：原来每 20 ms 转 1 度 (50 度/秒)，现在沿 S 形曲线以同样的最高速度扫过去，
+# 两端减速、换向时没有冲击 (见 trajectory.py)
+SCAN_LIMITS = AxisLimits(max_speed=50.0, max_accel=300.0, max_jerk=3000.0)
+
 # --- 代码主体部分 ---
 
 # 计算转动范围
@@ -23,51 +28,46 @@ tilt_min_angle = TILT_CENTER_ANGLE - (TILT_RANGE_OF_MOTION / 2)
 tilt_max_angle = TILT_CENTER_ANGLE + (TILT_RANGE_OF_MOTION / 2)
 
 # 初始化PCA9685
-kit = ServoKit(channels=16)
+# 【修改】用 ServoDriver 代替 ServoKit (脉宽同样是 500-2500 微秒，确保180度运动)，
+# 写入交给执行线程，每个 PWM 周期写一次
+servos = ServoDriver(lease_servos((PAN_CHANNEL, TILT_CHANNEL)))
+actuator = ActuatorThread(servos)
+actuator.start()
+
 
-# 获取舵机对象
-pan_servo = kit.servo[PAN_CHANNEL]
-tilt_servo = kit.servo[TILT_CHANNEL]
+def write(angles):
+    actuator.post({PAN_CHANNEL: angles[0], TILT_CHANNEL: angles[1]})
 
-# 设置脉宽范围以确保180度运动
-pan_servo.set_pulse_width_range(500, 2500)
-tilt_servo.set_pulse_width_range(500, 2500)
 
+follower = TrajectoryFollower((PAN_CENTER_ANGLE, TILT_CENTER_ANGLE), SCAN_LIMITS)
 try:
     print("舵机小范围扫描测试开始！按 Ctrl+C 退出。")
     
     # 先让舵机都回到中间位置
-    pan_servo.angle = PAN_CENTER_ANGLE
-    tilt_servo.angle = TILT_CENTER_ANGLE
+    write((PAN_CENTER_ANGLE, TILT_CENTER_ANGLE))
     time.sleep(2)
 
     while True:
         print(f"水平扫描: 从 {pan_min_angle}度 到 {pan_max_angle}度")
-        # 水平舵机从最小角度到最大角度
-        for angle in range(int(pan_min_angle), int(pan_max_angle), 1):
-            pan_servo.angle = angle
-            time.sleep(0.02) # 减慢速度，让运动更平滑
+        # 水平舵机从最小角度到最大角度 (第一次先从中间转到最小角度)，垂直舵机停在原来的角度
+        run_to(follower, (pan_min_angle, follower.target[1]), write)
+        run_to(follower, (pan_max_angle, follower.target[1]), write)
         
         # 水平舵机从最大角度回到最小角度
-        for angle in range(int(pan_max_angle), int(pan_min_angle), -1):
-            pan_servo.angle = angle
-            time.sleep(0.02)
+        run_to(follower, (pan_min_angle, follower.target[1]), write)
 
         print(f"垂直扫描: 从 {tilt_min_angle}度 到 {tilt_max_angle}度")
         # 垂直舵机从最小角度到最大角度
-        for angle in range(int(tilt_min_angle), int(tilt_max_angle), 1):
-            tilt_servo.angle = angle
-            time.sleep(0.02)
+        run_to(follower, (pan_min_angle, tilt_min_angle), write)
+        run_to(follower, (pan_min_angle, tilt_max_angle), write)
 
         # 垂直舵机从最大角度回到最小角度
-        for angle in range(int(tilt_max_angle), int(tilt_min_angle), -1):
-            tilt_servo.angle = angle
-            time.sleep(0.02)
+        run_to(follower, (pan_min_angle, tilt_min_angle), write)
 
 
 except KeyboardInterrupt:
     print("\n程序被中断。将舵机归位...")
-    pan_servo.angle = PAN_CENTER_ANGLE
-    tilt_servo.angle = TILT_CENTER_ANGLE
-    time.sleep(1)
+    # 从被打断时的位置和速度出发，平稳地回到中间
+    run_to(follower, (PAN_CENTER_ANGLE, TILT_CENTER_ANGLE), write)
+    actuator.stop()
     print("测试结束。")
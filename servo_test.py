@@ -1,57 +1,55 @@
 import time
-from adafruit_servokit import ServoKit
+from servo_driver import ServoDriver, lease_servos
+from trajectory import AxisLimits, TrajectoryFollower, run_to
+
+# 选择要控制的舵机通道
+# Channel 0 是水平转动的舵机，Channel 1 是垂直转动的舵机
+PAN_CHANNEL = 0
+TILT_CHANNEL = 1
+
+# 【修改】来回转动不再每 10 ms 手动加 1 度，而是沿 S 形曲线平滑地转过去 (见 trajectory.py)，
+# 起停时没有冲击，用时由下面的速度和加速度决定
+TEST_LIMITS = AxisLimits(max_speed=120.0, max_accel=600.0, max_jerk=6000.0)
 
 # 初始化PCA9685，默认I2C地址，16个通道
-kit = ServoKit(channels=16)
+# 【修改】用 ServoDriver 代替 ServoKit，脉宽同样是 500-2500us (DS3218舵机通常是这个范围)，
+# 可以确保舵机能转动180度
+servos = ServoDriver(lease_servos((PAN_CHANNEL, TILT_CHANNEL)))
 
-# 选择要控制的舵机通道
-# kit.servo[0] 对应 Channel 0
-# kit.servo[1] 对应 Channel 1
-pan_servo = kit.servo[0]  # 水平转动的舵机
-tilt_servo = kit.servo[1] # 垂直转动的舵机
 
-# 设置舵机的脉宽范围 (DS3218舵机通常是500-2500us)
-# 这一步很重要，可以确保舵机能转动180度
-pan_servo.set_pulse_width_range(500, 2500)
-tilt_servo.set_pulse_width_range(500, 2500)
+def write(angles):
+    servos.set_angles({PAN_CHANNEL: angles[0], TILT_CHANNEL: angles[1]})
 
+
+follower = TrajectoryFollower((90, 90), TEST_LIMITS)
 try:
     print("舵机测试开始！按 Ctrl+C 退出。")
-    
+
     # 先让舵机都回到中间位置 (90度)
-    pan_servo.angle = 90
-    tilt_servo.angle = 90
+    write((90, 90))
     time.sleep(1)
 
     print("开始来回转动...")
     while True:
-        # 水平舵机从0度转到180度
-        for angle in range(0, 180, 1):
-            pan_servo.angle = angle
-            time.sleep(0.01)
+        # 水平舵机从0度转到180度 (第一次先从中间转到0度)
+        run_to(follower, (0, 90), write)
+        run_to(follower, (180, 90), write)
         time.sleep(0.5)
-        
+
         # 水平舵机从180度转回0度
-        for angle in range(180, 0, -1):
-            pan_servo.angle = angle
-            time.sleep(0.01)
+        run_to(follower, (0, 90), write)
         time.sleep(0.5)
 
         # 垂直舵机从90度转到180度 (向上看)
-        for angle in range(90, 180, 1):
-            tilt_servo.angle = angle
-            time.sleep(0.01)
+        run_to(follower, (0, 180), write)
         time.sleep(0.5)
 
         # 垂直舵机从180度转回90度 (回到中间)
-        for angle in range(180, 90, -1):
-            tilt_servo.angle = angle
-            time.sleep(0.01)
+        run_to(follower, (0, 90), write)
         time.sleep(0.5)
 
 except KeyboardInterrupt:
     print("\n程序被中断。将舵机归位...")
-    pan_servo.angle = 90
-    tilt_servo.angle = 90
-    time.sleep(1)
+    # 从被打断时的位置和速度出发，平稳地回到中间
+    run_to(follower, (90, 90), write)
     print("测试结束。")
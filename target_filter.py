@@ -0,0 +1,213 @@
+import math
+
+# --- 1. 配置 (CONFIG) ---
+# 人脸中心位置的测量噪声 (标准差，单位：像素)。
+# 同一张静止的脸，NN 给出的 bbox 中心大约会在几个像素内跳动。
+MEASUREMENT_NOISE_PIXELS = 6.0
+# 卡尔曼滤波的过程噪声：目标加速度的谱密度 (像素^2 / 秒^3)。
+# 越大越相信“目标会突然变速”，响应越快但越抖。
+PROCESS_NOISE = 4000.0
+# alpha-beta 滤波的两个增益
+ALPHA = 0.5
+BETA = 0.1
+# 最多向前预测多少秒。检测结果太旧时，再往前外推只会放大误差。
+MAX_PREDICTION_S = 0.2
+# 两次测量间隔超过这个时间，就认为是一个新目标，滤波器重新开始
+RESET_GAP_S = 0.5
+
+
+# --- 2. 单轴估计器 (Single-axis Estimators) ---
+class ConstantVelocityKalman:
+    """
+    单轴匀速模型卡尔曼滤波器，状态是 [位置, 速度]。
+
+    update(t, z) 用时间戳为 t 的测量值 z 更新状态；
+    predict(t) 返回 t 时刻的 (位置, 位置方差)，不修改状态。
+    """
+    def __init__(self, measurement_noise=MEASUREMENT_NOISE_PIXELS, process_noise=PROCESS_NOISE):
+        self.r = measurement_noise ** 2
+        self.q = process_noise
+        self.reset()
+
+    def reset(self):
+        self.t = None
+        self.x = 0.0
+        self.v = 0.0
+        # 协方差矩阵 [[p00, p01], [p01, p11]]
+        self.p00 = self.p01 = self.p11 = 0.0
+
+    @property
+    def initialized(self):
+        return self.t is not None
+
+    def _propagate(self, dt):
+        """把状态和协方差外推 dt 秒，返回 (x, v, p00, p01, p11)。"""
+        q = self.q
+        x = self.x + self.v * dt
+        p00 = self.p00 + 2 * dt * self.p01 + dt * dt * self.p11 + q * dt ** 3 / 3
+        p01 = self.p01 + dt * self.p11 + q * dt ** 2 / 2
+        p11 = self.p11 + q * dt
+        return x, self.v, p00, p01, p11
+
+    def update(self, t, z):
+        if self.t is None or t - self.t > RESET_GAP_S:
+            # 第一次测量：位置取测量值，速度未知，给一个很大的方差
+            self.t = t
+            self.x = z
+            self.v = 0.0
+            self.p00 = self.r
+            self.p01 = 0.0
+            self.p11 = 1e6
+            return
+        dt = t - self.t
+        if dt <= 0:
+            # 同一条检测结果重复送进来，忽略
+            return
+        x, v, p00, p01, p11 = self._propagate(dt)
+        s = p00 + self.r
+        k0 = p00 / s
+        k1 = p01 / s
+        residual = z - x
+        self.x = x + k0 * residual
+        self.v = v + k1 * residual
+        self.p00 = (1 - k0) * p00
+        self.p01 = (1 - k0) * p01
+        self.p11 = p11 - k1 * p01
+        self.t = t
+
+    def predict(self, t):
+        dt = min(max(t - self.t, 0.0), MAX_PREDICTION_S)
+        x, _, p00, _, _ = self._propagate(dt)
+        return x, p00
+
+class AlphaBetaFilter:
+    """
+    单轴 alpha-beta 滤波器，接口和 ConstantVelocityKalman 相同。
+
+    它没有显式的协方差，位置方差用残差的滑动平均来估计：
+    稳态时位置估计的方差大约是 alpha * 测量方差，再加上外推带来的速度不确定性。
+    """
+    def __init__(self, alpha=ALPHA, beta=BETA, measurement_noise=MEASUREMENT_NOISE_PIXELS):
+        self.alpha = alpha
+        self.beta = beta
+        self.initial_r = measurement_noise ** 2
+        self.reset()
+
+    def reset(self):
+        self.t = None
+        self.x = 0.0
+        self.v = 0.0
+        self.residual_var = self.initial_r
+        self.sample_interval = None
+
+    @property
+    def initialized(self):
+        return self.t is not None
+
+    def update(self, t, z):
+        if self.t is None or t - self.t > RESET_GAP_S:
+            self.reset()
+            self.t = t
+            self.x = z
+            return
+        dt = t - self.t
+        if dt <= 0:
+            return
+        x = self.x + self.v * dt
+        residual = z - x
+        self.x = x + self.alpha * residual
+        self.v = self.v + self.beta / dt * residual
+        self.residual_var += 0.1 * (residual * residual - self.residual_var)
+        self.sample_interval = dt
+        self.t = t
+
+    def predict(self, t):
+        dt = min(max(t - self.t, 0.0), MAX_PREDICTION_S)
+        if self.sample_interval is None:
+            # 只有一次测量，速度完全未知
+            velocity_var = 1e6
+        else:
+            velocity_var = self.beta * self.residual_var / self.sample_interval ** 2
+        return self.x + self.v * dt, self.alpha * self.residual_var + velocity_var * dt * dt
+
+ESTIMATORS = {
+    "kalman": ConstantVelocityKalman,
+    "alphabeta": AlphaBetaFilter,
+}
+
+
+# --- 3. 二维目标估计器 (2D Target Estimator) ---
+class TargetEstimator:
+    """
+    对人脸中心的 x / y 各用一个单轴估计器。
+
+    时间戳使用设备消息的 getTimestamp() (与 dai.Clock.now() 同一个时钟)，
+    这样就能把几十毫秒前拍到的检测结果外推到发送舵机指令的时刻。
+    """
+    def __init__(self, kind="kalman"):
+        if kind not in ESTIMATORS:
+            raise ValueError(f"未知的估计器: {kind} (可选: {', '.join(ESTIMATORS)})")
+        self.x_filter = ESTIMATORS[kind]()
+        self.y_filter = ESTIMATORS[kind]()
+
+    @property
+    def initialized(self):
+        return self.x_filter.initialized
+
+    def reset(self):
+        self.x_filter.reset()
+        self.y_filter.reset()
+
+    def update(self, t, x, y):
+        self.x_filter.update(t, x)
+        self.y_filter.update(t, y)
+
+    def velocity(self):
+        """返回估计的 (x速度, y速度)，单位是 位置单位/秒。"""
+        return self.x_filter.v, self.y_filter.v
+
+    def predict(self, t):
+        """返回 (x, y, x方差, y方差)。"""
+        x, var_x = self.x_filter.predict(t)
+        y, var_y = self.y_filter.predict(t)
+        return x, y, var_x, var_y
+
+def gate_error(error, variance, n_sigma):
+    """
+    基于方差的死区：误差小于 n_sigma 倍标准差时，认为它和 0 没有区别。
+
+    替代原来固定的 ERROR_DEADBAND_PIXELS：估计越稳定，死区越小；刚看到目标、
+    估计还不可靠时，死区自动变大，避免舵机追着噪声跑。
+    """
+    if abs(error) < n_sigma * math.sqrt(variance):
+        return 0.0
+    return error
+
+
+# --- 4. 主程序：用模拟的运动人脸对比两种估计器 ---
+if __name__ == "__main__":
+    import random
+
+    random.seed(0)
+    fps = 30.0
+    latency = 0.06  # 检测结果到发指令之间的延迟
+    speed = 150.0   # 人脸在画面中移动的速度 (像素/秒)
+
+    for kind in ESTIMATORS:
+        est = TargetEstimator(kind)
+        raw_err = pred_err = 0.0
+        n = 0
+        for i in range(90):
+            t = i / fps
+            true_x = 50 + speed * t
+            est.update(t, true_x + random.gauss(0, MEASUREMENT_NOISE_PIXELS), 150.0)
+            if i < 10:
+                continue
+            # 发指令时目标的真实位置
+            truth = 50 + speed * (t + latency)
+            x, _, var_x, _ = est.predict(t + latency)
+            raw_err += abs(true_x - truth)
+            pred_err += abs(x - truth)
+            n += 1
+        print(f"{kind:>9}: 直接使用检测结果的平均误差 {raw_err / n:5.1f} px, "
+              f"预测后的平均误差 {pred_err / n:5.1f} px, 位置标准差 {math.sqrt(var_x):4.1f} px")
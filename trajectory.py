@@ -0,0 +1,286 @@
+import bisect
+import math
+from servo_model import SERVO_SLEW_RATE_DEG_S
+
+# --- 1. 配置 (CONFIG) ---
+# 舵机本身能做到的极限：速度和 servo_model 的转速模型一致，加速度、加加速度按带云台负载估计
+SERVO_MAX_SPEED_DEG_S = SERVO_SLEW_RATE_DEG_S
+SERVO_MAX_ACCEL_DEG_S2 = 3000.0
+SERVO_MAX_JERK_DEG_S3 = 60000.0
+# 追踪时用的较低限制：检测结果有噪声，每帧都会换目标，太高的加速度会让云台跟着噪声猛冲
+TRACKING_MAX_SPEED_DEG_S = 120.0
+TRACKING_MAX_ACCEL_DEG_S2 = 600.0
+# 同步几个轴时，用二分法找慢轴的限速，迭代这么多次 (精度远小于一个 PWM 计数)
+SYNC_ITERATIONS = 40
+
+
+class AxisLimits:
+    """
+    单个轴的运动限制。max_jerk 为 None 时规划梯形速度曲线 (加速度突变)，
+    否则规划 S 形曲线 (加速度按 max_jerk 连续变化，起停更柔和)。
+    """
+    def __init__(self, max_speed=SERVO_MAX_SPEED_DEG_S, max_accel=SERVO_MAX_ACCEL_DEG_S2, max_jerk=None):
+        self.max_speed = max_speed
+        self.max_accel = max_accel
+        self.max_jerk = max_jerk
+
+    def __eq__(self, other):
+        return isinstance(other, AxisLimits) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return f"AxisLimits({self.max_speed}, {self.max_accel}, {self.max_jerk})"
+
+
+# --- 2. 单轴速度曲线 (Single-axis Profile) ---
+class AxisProfile:
+    """
+    由若干段“加加速度恒定”的运动拼成的单轴轨迹。segments 是 [(时长, 段起点的加速度, 加加速度), ...]，
+    梯形曲线的每一段加加速度都是 0。sample(t) 对任意 t 求位置和速度，所以可以按任意控制频率取样。
+    """
+    def __init__(self, start, velocity, segments, end):
+        self.end = end
+        # 每段起点的 (时间, 位置, 速度, 加速度, 加加速度)
+        self.knots = []
+        t, p, v = 0.0, start, velocity
+        for duration, a, j in segments:
+            if duration <= 0.0:
+                continue
+            self.knots.append((t, p, v, a, j))
+            p += v * duration + a * duration ** 2 / 2 + j * duration ** 3 / 6
+            v += a * duration + j * duration ** 2 / 2
+            t += duration
+        self.duration = t
+        self.times = [knot[0] for knot in self.knots]
+
+    def sample(self, t):
+        """t 秒 (从曲线起点算) 时的 (位置, 速度)。t 超过 duration 后停在终点。"""
+        if t >= self.duration:
+            return self.end, 0.0
+        t0, p, v, a, j = self.knots[max(0, bisect.bisect_right(self.times, t) - 1)]
+        dt = max(0.0, t - t0)
+        return (p + v * dt + a * dt ** 2 / 2 + j * dt ** 3 / 6,
+                v + a * dt + j * dt ** 2 / 2)
+
+
+def _trapezoid(distance, velocity, max_speed, accel):
+    """
+    从速度 velocity (>= 0，且来得及在 distance 内停下) 出发，正方向走 distance 后停下的梯形曲线段。
+    先加速 (或速度超过限速时先减速) 到峰值速度，匀速，再减速到 0。
+    """
+    if velocity > max_speed:
+        peak = max_speed
+        segments = [((velocity - peak) / accel, -accel, 0.0)]
+        covered = (velocity ** 2 - peak ** 2) / (2 * accel)
+    else:
+        peak = min(max_speed, math.sqrt((2 * accel * distance + velocity ** 2) / 2))
+        segments = [((peak - velocity) / accel, accel, 0.0)]
+        covered = (peak ** 2 - velocity ** 2) / (2 * accel)
+    covered += peak ** 2 / (2 * accel)
+    if peak > 0.0:
+        segments.append((max(0.0, distance - covered) / peak, 0.0, 0.0))
+    segments.append((peak / accel, -accel, 0.0))
+    return segments
+
+
+def _s_curve(distance, max_speed, accel, jerk):
+    """从静止出发、正方向走 distance 后停下的 7 段 S 形曲线。加速和减速对称。"""
+    # 峰值速度：限速能在距离内走完就用限速，否则按加速段 + 减速段正好等于 distance 解出来
+    peak = max_speed
+    if peak >= accel ** 2 / jerk:
+        if peak * (peak / accel + accel / jerk) > distance:
+            peak = (-accel ** 2 / jerk + math.sqrt(accel ** 4 / jerk ** 2 + 4 * accel * distance)) / 2
+    if peak < accel ** 2 / jerk:
+        # 加速度来不及到 accel 就要开始减小：加速段只有加加速度和减加速度两段
+        peak = min(peak, (distance / 2 * math.sqrt(jerk)) ** (2.0 / 3.0))
+        ramp, hold = math.sqrt(peak / jerk), 0.0
+    else:
+        ramp, hold = accel / jerk, peak / accel - accel / jerk
+    top = jerk * ramp
+    cruise = (distance - peak * (2 * ramp + hold)) / peak if peak > 0.0 else 0.0
+    return [(ramp, 0.0, jerk), (hold, top, 0.0), (ramp, top, -jerk), (max(0.0, cruise), 0.0, 0.0),
+            (ramp, 0.0, -jerk), (hold, -top, 0.0), (ramp, -top, jerk)]
+
+
+def plan_axis(start, end, limits, start_velocity=0.0, speed_cap=None):
+    """
+    规划单轴从 start (当前速度 start_velocity) 到 end 并停下的最短时间曲线，不超调。
+    speed_cap 进一步限制峰值速度，用来把快轴拉长到和慢轴同时到达。
+
+    S 形曲线只用于从静止出发；运动中途换目标时按梯形曲线规划 (速度连续，加速度在换目标的瞬间可能突变)。
+    当前速度背离目标、或者已经来不及在目标前停下时，先按最大加速度停下，再从停下的位置重新规划。
+    """
+    accel = limits.max_accel
+    max_speed = limits.max_speed if speed_cap is None else min(limits.max_speed, speed_cap)
+    direction = 1.0 if end >= start else -1.0
+    distance = abs(end - start)
+    velocity = start_velocity * direction
+    if velocity < 0.0 or velocity ** 2 > 2 * accel * distance * (1 + 1e-9):
+        # 先停下：停下的位置可能已经越过目标，余下的部分反方向走回来
+        stop_time = abs(start_velocity) / accel
+        stop_accel = -math.copysign(accel, start_velocity)
+        stop_position = start + start_velocity * stop_time / 2
+        rest = plan_axis(stop_position, end, limits, 0.0, speed_cap)
+        segments = [(stop_time, stop_accel, 0.0)] + _segments(rest)
+        return AxisProfile(start, start_velocity, segments, end)
+    if velocity == 0.0 and limits.max_jerk is not None:
+        segments = _s_curve(distance, max_speed, accel, limits.max_jerk)
+    else:
+        segments = _trapezoid(distance, velocity, max_speed, accel)
+    return AxisProfile(start, start_velocity, [(d, a * direction, j * direction) for d, a, j in segments], end)
+
+
+def _segments(profile):
+    """把 AxisProfile 还原成 [(时长, 加速度, 加加速度), ...]，用于拼接。"""
+    ends = profile.times[1:] + [profile.duration]
+    return [(t_end - t0, a, j) for (t0, _, _, a, j), t_end in zip(profile.knots, ends)]
+
+
+# --- 3. 多轴同步轨迹 (Synchronized Trajectory) ---
+class Trajectory:
+    """
+    几个轴 (pan, tilt) 同时出发、同时到达的轨迹。
+
+    先按各自的限制规划最短时间曲线，总时长取最慢的轴；其余的轴用二分法降低峰值速度，
+    拉长到同样的时长。这样斜向移动时两个轴一起停下，而不是先到一个再等另一个。
+
+    时间用调用方的时钟 (time.perf_counter() 或 time.monotonic())，start_time 是轨迹的起点。
+    """
+    def __init__(self, start, end, limits, start_velocity=None, start_time=0.0):
+        start = tuple(start)
+        self.target = tuple(end)
+        if isinstance(limits, AxisLimits):
+            limits = (limits,) * len(start)
+        if start_velocity is None:
+            start_velocity = (0.0,) * len(start)
+        self.limits = tuple(limits)
+        self.start_time = start_time
+        self.offsets = [0.0] * len(start)
+        self.profiles = [plan_axis(*axis) for axis in zip(start, self.target, self.limits, start_velocity)]
+        self.duration = max(profile.duration for profile in self.profiles)
+        for i, profile in enumerate(self.profiles):
+            if 0.0 < profile.duration < self.duration:
+                self.profiles[i] = self._stretch(start[i], self.target[i], self.limits[i], start_velocity[i])
+
+    def _stretch(self, start, end, limits, velocity):
+        """找到让这个轴正好用 self.duration 走完的峰值速度。"""
+        low, high = 0.0, limits.max_speed
+        profile = None
+        for _ in range(SYNC_ITERATIONS):
+            cap = (low + high) / 2
+            candidate = plan_axis(start, end, limits, velocity, cap)
+            if candidate.duration > self.duration:
+                low = cap
+            else:
+                high, profile = cap, candidate
+        return profile if profile is not None else plan_axis(start, end, limits, velocity)
+
+    def shift(self, deltas):
+        """整条轨迹 (包括终点) 平移 deltas，速度不变。用于叠加 IMU 前馈这类直接的角度修正。"""
+        self.offsets = [offset + delta for offset, delta in zip(self.offsets, deltas)]
+        self.target = tuple(target + delta for target, delta in zip(self.target, deltas))
+
+    def sample(self, now):
+        """now 时刻每个轴的 (位置元组, 速度元组)。"""
+        t = now - self.start_time
+        positions, velocities = [], []
+        for profile, offset in zip(self.profiles, self.offsets):
+            p, v = profile.sample(t)
+            positions.append(p + offset)
+            velocities.append(v)
+        return tuple(positions), tuple(velocities)
+
+    def done(self, now):
+        return now - self.start_time >= self.duration
+
+
+# --- 4. 跟随不断变化的目标 (Trajectory Follower) ---
+class TrajectoryFollower:
+    """
+    保存当前的轨迹；目标变化时从当前的位置和速度重新规划，运动始终连续。
+    追踪的控制线程每一帧都可能给出新目标，手动控制每按一次键给一个新目标；
+    两者都按自己的频率调用 sample()，和执行线程写舵机的频率无关。
+    """
+    def __init__(self, angles, limits):
+        self.limits = limits
+        self.trajectory = Trajectory(angles, angles, limits)
+
+    @property
+    def target(self):
+        return self.trajectory.target
+
+    def set_target(self, angles, now, limits=None):
+        """目标或限制有变化时才重新规划。返回是否重新规划了。"""
+        limits = self.limits if limits is None else limits
+        angles = tuple(angles)
+        if angles == self.trajectory.target and limits == self.limits:
+            return False
+        positions, velocities = self.trajectory.sample(now)
+        self.limits = limits
+        self.trajectory = Trajectory(positions, angles, limits, velocities, now)
+        return True
+
+    def shift(self, deltas):
+        self.trajectory.shift(deltas)
+
+    def sample(self, now):
+        return self.trajectory.sample(now)[0]
+
+    def done(self, now):
+        return self.trajectory.done(now)
+
+
+def run_to(follower, angles, write, rate_hz=50.0):
+    """阻塞地沿轨迹走到 angles，每 1/rate_hz 秒调用一次 write(位置元组)。用于程序退出前的归中。"""
+    import time
+    period = 1.0 / rate_hz
+    now = time.monotonic()
+    follower.set_target(angles, now)
+    deadline = now
+    while True:
+        now = time.monotonic()
+        write(follower.sample(now))
+        if follower.done(now):
+            return
+        deadline += period
+        time.sleep(max(0.0, deadline - time.monotonic()))
+
+
+# --- 5. 主程序：和原来的指数平滑、一步跳过去的对比 ---
+if __name__ == "__main__":
+    trapezoid = AxisLimits(SERVO_MAX_SPEED_DEG_S, SERVO_MAX_ACCEL_DEG_S2)
+    s_curve = AxisLimits(SERVO_MAX_SPEED_DEG_S, SERVO_MAX_ACCEL_DEG_S2, SERVO_MAX_JERK_DEG_S3)
+
+    def check(trajectory, rate_hz, limits):
+        """按 rate_hz 取样，返回 (到达时间, 超调, 最大速度, 最大加速度)。"""
+        dt = 1.0 / rate_hz
+        start, _ = trajectory.sample(0.0)
+        samples = [trajectory.sample(i * dt) for i in range(int(trajectory.duration * rate_hz) + 3)]
+        overshoot = max(max(0.0, (p - target) * math.copysign(1.0, target - s))
+                        for positions, _ in samples
+                        for p, target, s in zip(positions, trajectory.target, start))
+        speed = max(abs(v) for _, velocities in samples for v in velocities)
+        accel = max(abs(b - a) / dt for (_, va), (_, vb) in zip(samples, samples[1:]) for a, b in zip(va, vb))
+        return trajectory.duration, overshoot, speed, accel
+
+    print("pan 90 -> 150 度、tilt 90 -> 70 度的斜向移动:")
+    for label, limits in (("梯形", trapezoid), ("S 形", s_curve)):
+        trajectory = Trajectory((90.0, 90.0), (150.0, 70.0), limits)
+        for rate in (30.0, 50.0, 100.0, 250.0):
+            duration, overshoot, speed, accel = check(trajectory, rate, limits)
+            print(f"  {label} {rate:5.0f} Hz 取样: 用时 {duration:.3f}s, 超调 {overshoot:.4f} 度, "
+                  f"最大速度 {speed:5.1f} 度/秒, 最大加速度 {accel:6.0f} 度/秒²")
+        pan_done = min(t / 1000 for t in range(2000) if abs(trajectory.sample(t / 1000)[0][0] - 150.0) < 0.05)
+        tilt_done = min(t / 1000 for t in range(2000) if abs(trajectory.sample(t / 1000)[0][1] - 70.0) < 0.05)
+        print(f"  {label}: pan 到位 {pan_done:.3f}s, tilt 到位 {tilt_done:.3f}s (同步)")
+
+    # 指数平滑 (时间常数 0.2 秒) 进入 0.5 度以内需要 ln(60 / 0.5) * 0.2 秒
+    print(f"原来的指数平滑 (0.2s 时间常数) 走 60 度、进入 0.5 度以内: {math.log(60 / 0.5) * 0.2:.3f}s；"
+          f"STEP_SIZE 一步跳过去时舵机以 {SERVO_MAX_SPEED_DEG_S:.0f} 度/秒的最大速度硬停")
+
+    # 运动中换目标：速度连续，不超调新的目标
+    follower = TrajectoryFollower((90.0, 90.0), trapezoid)
+    follower.set_target((150.0, 90.0), 0.0)
+    follower.set_target((120.0, 100.0), 0.1)
+    _, velocities = follower.trajectory.sample(0.1)
+    print(f"0.1s 时改目标: 新轨迹起点速度 pan {velocities[0]:.1f} 度/秒 (与旧轨迹一致)，"
+          f"{follower.trajectory.duration:.3f}s 后到达 {follower.sample(1.0)}")
@@ -1,11 +1,16 @@
 import cv2
-import depthai as dai
-from adafruit_servokit import ServoKit
 import time
 import sys
 import select
 import tty
 import termios
+from frame_access import frame_view
+from pipeline_factory import DeviceBoot, PipelineConfig, StartupTimer, get_pipeline
+from pca_arbiter import PcaConflictError
+from servo_driver import ActuatorThread, ServoDriver, lease_servos
+from trajectory import AxisLimits, TrajectoryFollower, run_to
+
+startup = StartupTimer()
 
 # --- 您可以修改这里的“魔法数字” ---
 TILT_CHANNEL = 0  # 垂直舵机 (上下)
@@ -13,30 +18,41 @@ PAN_CHANNEL = 1   # 水平舵机 (左右)
 TILT_CENTER_ANGLE = 90.0
 PAN_CENTER_ANGLE = 90.0
 STEP_SIZE = 1.0
+# 【新增】舵机的运动限制：每次按键不再一步跳 STEP_SIZE 度，而是沿 S 形曲线平滑地走过去
+# (见 trajectory.py)。两个轴同时到达，速度与主循环的频率无关。
+MOTION_MAX_SPEED_DEG_S = 90.0
+MOTION_MAX_ACCEL_DEG_S2 = 600.0
+MOTION_MAX_JERK_DEG_S3 = 6000.0
 # -----------------------------------------
 
+# --- 初始化OAK-D相机 ---
+# 【修改】管道由 pipeline_factory 统一构建，设备在后台启动，和舵机初始化同时进行。
+# 相机直接输出交错 BGR，用 frame_view() 零拷贝显示。
+print("正在初始化OAK-D相机 (后台启动)...")
+config = PipelineConfig(preview_size=(640, 480), interleaved=True)
+boot = DeviceBoot(get_pipeline(config))
+
 # --- 初始化舵机 ---
 print("正在初始化PCA9685舵机控制器...")
-kit = ServoKit(channels=16)
-tilt_servo = kit.servo[TILT_CHANNEL]
-pan_servo = kit.servo[PAN_CHANNEL]
-tilt_servo.set_pulse_width_range(500, 2500)
-pan_servo.set_pulse_width_range(500, 2500)
+# 【修改】用 ServoDriver 代替 ServoKit：主循环每 10 ms 都会设置角度，计数值没变化时不写 I2C。
+# 写入由执行线程每 20 ms (一个 PWM 周期) 完成一次，主循环只把最新角度放进信箱，不会卡在 I2C 上。
+try:
+    servos = ServoDriver(lease_servos((TILT_CHANNEL, PAN_CHANNEL)))
+except ValueError:
+    print("错误: 无法找到I2C设备。请运行 'sudo i2cdetect -y 1' 检查硬件连接。")
+    exit()
+except PcaConflictError as e:
+    print(f"错误: {e}")
+    exit()
+actuator = ActuatorThread(servos)
+actuator.start()
 current_tilt_angle = TILT_CENTER_ANGLE
 current_pan_angle = PAN_CENTER_ANGLE
-tilt_servo.angle = current_tilt_angle
-pan_servo.angle = current_pan_angle
+actuator.post({TILT_CHANNEL: current_tilt_angle, PAN_CHANNEL: current_pan_angle})
+follower = TrajectoryFollower((current_pan_angle, current_tilt_angle),
+                              AxisLimits(MOTION_MAX_SPEED_DEG_S, MOTION_MAX_ACCEL_DEG_S2, MOTION_MAX_JERK_DEG_S3))
 print("舵机已归中。")
-
-# --- 初始化OAK-D相机 ---
-print("正在初始化OAK-D相机...")
-pipeline = dai.Pipeline()
-cam_rgb = pipeline.create(dai.node.ColorCamera)
-cam_rgb.setPreviewSize(640, 480)
-cam_rgb.setInterleaved(False)
-xout_rgb = pipeline.create(dai.node.XLinkOut)
-xout_rgb.setStreamName("rgb")
-cam_rgb.preview.link(xout_rgb.input)
+startup.mark("舵机归中")
 
 # --- 这是一个用来检查是否有键盘输入的函数 (非阻塞) ---
 def isData():
@@ -58,15 +74,18 @@ try:
     print("---------------------------------")
     print("请直接按键，无需回车。")
 
-    # 连接并启动设备
-    with dai.Device(pipeline) as device:
-        q_rgb = device.getOutputQueue(name="rgb", maxSize=4, blocking=False)
+    # 等待后台启动的设备
+    with boot.result() as device:
+        startup.mark("设备就绪")
+        q_rgb = device.getOutputQueue(name="rgb", maxSize=config.rgb_queue_size, blocking=False)
 
         while True:
             # 1. 处理视频流
             in_rgb = q_rgb.tryGet()
             if in_rgb is not None:
-                frame = in_rgb.getCvFrame()
+                frame = frame_view(in_rgb)
+                if startup.mark_once("第一帧画面"):
+                    startup.report()
                 cv2.imshow("OAK-D 一体化控制台", frame)
             
             # 必须要有这行，即使时间很短，它负责处理窗口的刷新
@@ -96,9 +115,11 @@ try:
 
                 print(f"指令: Pan={current_pan_angle:.1f}, Tilt={current_tilt_angle:.1f}")
 
-            # 3. 更新舵机角度
-            pan_servo.angle = current_pan_angle
-            tilt_servo.angle = current_tilt_angle
+            # 3. 更新舵机角度：目标变化时重新规划轨迹，每次循环按当前时间在轨迹上取样
+            now = time.monotonic()
+            follower.set_target((current_pan_angle, current_tilt_angle), now)
+            pan, tilt = follower.sample(now)
+            actuator.post({PAN_CHANNEL: pan, TILT_CHANNEL: tilt})
             
             # 短暂延时，避免CPU占用过高
             time.sleep(0.01)
@@ -106,8 +127,11 @@ try:
 finally:
     # 程序退出时，恢复终端的设置，非常重要！
     termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
-    # 归中舵机
-    pan_servo.angle = PAN_CENTER_ANGLE
-    tilt_servo.angle = TILT_CENTER_ANGLE
+    # 归中舵机：沿轨迹平稳地回到中心
+    run_to(follower, (PAN_CENTER_ANGLE, TILT_CENTER_ANGLE),
+           lambda angles: actuator.post({PAN_CHANNEL: angles[0], TILT_CHANNEL: angles[1]}))
+    actuator.stop()
     cv2.destroyAllWindows()
+    print(f"[舵机] {servos.stats()}")
+    print(f"[执行线程] {actuator.stats()}")
     print("\n程序已退出，舵机已归中。")
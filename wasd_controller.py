@@ -1,8 +1,10 @@
 import time
 import sys
+import select
 import tty
 import termios
-from adafruit_servokit import ServoKit
+from servo_driver import ActuatorThread, ServoDriver, lease_servos
+from trajectory import AxisLimits, TrajectoryFollower, run_to
 
 # --- 您可以修改这里的“魔法数字” ---
 TILT_CHANNEL = 0  # 垂直舵机 (上下)
@@ -14,30 +16,30 @@ PAN_CENTER_ANGLE = 90.0
 
 # 每次按键，舵机转动的角度 (步进大小)
 STEP_SIZE = 1.0
+# 【新增】舵机的运动限制：每次按键不再一步跳 STEP_SIZE 度，而是沿 S 形曲线平滑地走过去
+# (见 trajectory.py)，和 unified_controller.py 相同
+MOTION_MAX_SPEED_DEG_S = 90.0
+MOTION_MAX_ACCEL_DEG_S2 = 600.0
+MOTION_MAX_JERK_DEG_S3 = 6000.0
 # -----------------------------------------
 
 # --- 初始化舵机 ---
-kit = ServoKit(channels=16)
-tilt_servo = kit.servo[TILT_CHANNEL]
-pan_servo = kit.servo[PAN_CHANNEL]
-tilt_servo.set_pulse_width_range(500, 2500)
-pan_servo.set_pulse_width_range(500, 2500)
+# 【修改】用 ServoDriver 代替 ServoKit (脉宽同样是 500-2500 微秒)，通过 pca_arbiter 租用通道。
+# 写入由执行线程每 20 ms 完成一次，键盘循环只把最新角度放进信箱。
+servos = ServoDriver(lease_servos((TILT_CHANNEL, PAN_CHANNEL)))
+actuator = ActuatorThread(servos)
+actuator.start()
 
 current_tilt_angle = TILT_CENTER_ANGLE
 current_pan_angle = PAN_CENTER_ANGLE
-tilt_servo.angle = current_tilt_angle
-pan_servo.angle = current_pan_angle
+actuator.post({TILT_CHANNEL: current_tilt_angle, PAN_CHANNEL: current_pan_angle})
+follower = TrajectoryFollower((current_pan_angle, current_tilt_angle),
+                              AxisLimits(MOTION_MAX_SPEED_DEG_S, MOTION_MAX_ACCEL_DEG_S2, MOTION_MAX_JERK_DEG_S3))
 
-# --- 这是一个用来读取单个字符的函数 ---
-def getch():
-    fd = sys.stdin.fileno()
-    old_settings = termios.tcgetattr(fd)
-    try:
-        tty.setraw(sys.stdin.fileno())
-        ch = sys.stdin.read(1)
-    finally:
-        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-    return ch
+# --- 这是一个用来检查是否有键盘输入的函数 (非阻塞) ---
+# 【修改】原来的 getch() 会一直阻塞到下一次按键，轨迹就没法在两次按键之间继续往前走
+def isData():
+    return select.select([sys.stdin], [], [], 0) == ([sys.stdin], [], [])
 
 # --- 主程序 ---
 print("WASD 实时舵机控制器已启动！(逻辑修正版)")
@@ -49,9 +51,23 @@ print("     [Q] - 退出")
 print("---------------------------------")
 print("请直接按键，无需回车。")
 
+# 保存终端的旧设置，设置为“原始模式”，这样可以立刻读取到按键
+old_settings = termios.tcgetattr(sys.stdin)
+tty.setcbreak(sys.stdin.fileno())
+
 while True:
     try:
-        key = getch().lower()
+        # 更新舵机角度：目标变化时重新规划轨迹，每次循环按当前时间在轨迹上取样
+        now = time.monotonic()
+        follower.set_target((current_pan_angle, current_tilt_angle), now)
+        pan, tilt = follower.sample(now)
+        actuator.post({PAN_CHANNEL: pan, TILT_CHANNEL: tilt})
+
+        if not isData():
+            # 短暂延时，避免CPU占用过高
+            time.sleep(0.01)
+            continue
+        key = sys.stdin.read(1).lower()
 
         if key == 'q':
             print("\n正在退出...")
@@ -84,15 +100,16 @@ while True:
         current_pan_angle = max(0, min(180, current_pan_angle))
         current_tilt_angle = max(0, min(180, current_tilt_angle))
 
-        # 发送指令
-        pan_servo.angle = current_pan_angle
-        tilt_servo.angle = current_tilt_angle
-
     except KeyboardInterrupt:
         print("\n程序被中断。退出。")
         break
 
-# 退出时归中
-pan_servo.angle = PAN_CENTER_ANGLE
-tilt_servo.angle = TILT_CENTER_ANGLE
+# 程序退出时，恢复终端的设置，非常重要！
+termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
+# 退出时归中：沿轨迹平稳地回到中心
+run_to(follower, (PAN_CENTER_ANGLE, TILT_CENTER_ANGLE),
+       lambda angles: actuator.post({PAN_CHANNEL: angles[0], TILT_CHANNEL: angles[1]}))
+actuator.stop()
+print(f"[舵机] {servos.stats()}")
+print(f"[执行线程] {actuator.stats()}")
 print("舵机已归中。")